@@ -1,24 +1,47 @@
 """
 Punto de entrada de la aplicación FastAPI.
 
-Configura la aplicación, incluye los routers y define el endpoint
-de health check para Docker/Kubernetes.
+Configura la aplicación, incluye los routers y define los endpoints
+de health check para Docker/Kubernetes y de métricas para Prometheus.
+
+La capa HTTP es asíncrona de punta a punta (asyncpg + Redis asyncio con
+pools compartidos), así un solo proceso uvicorn atiende miles de
+solicitudes sin agotar el threadpool.
 """
 
 import logging
+from contextlib import asynccontextmanager
 
-import redis
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from opentelemetry.trace import SpanKind
 from sqlalchemy import text
 
 from api.routes.sire import router as sire_router
 from api.schemas import HealthResponse
 from core.config import settings
-from core.database import SessionSync
+from core.database import dispose_async_engine, get_async_sessionmaker
+from core.eventos import cerrar_difusor
 from core.init_db import init_database
+from core.metrics import generar_metricas
+from core.redis_client import close_redis_async, get_redis_async
+from core.tracing import configurar_tracing, extraer_contexto, tracer
 
 logger = logging.getLogger(__name__)
 
+
+# ---------------------------------------------------------------------------
+# Ciclo de vida: inicialización de la BD al arrancar y cierre de los pools
+# asíncronos (asyncpg y Redis) al apagar
+# ---------------------------------------------------------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_database()
+    yield
+    await dispose_async_engine()
+    await cerrar_difusor()
+    await close_redis_async()
+
+
 # ---------------------------------------------------------------------------
 # Creación de la aplicación FastAPI
 # ---------------------------------------------------------------------------
@@ -32,12 +55,45 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
+
 # ---------------------------------------------------------------------------
-# Inicialización de la base de datos al arrancar
+# Trazas distribuidas: un span SERVER por solicitud, hijo del traceparent
+# recibido (si el orquestador lo envía). Middleware ASGI puro para no sumar
+# la sobrecarga de BaseHTTPMiddleware; solo se instala con OTEL_ENABLED.
 # ---------------------------------------------------------------------------
-init_database()
+class TrazaMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            k.decode("latin-1"): v.decode("latin-1")
+            for k, v in scope.get("headers", [])
+        }
+        with tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}",
+            context=extraer_contexto(headers),
+            kind=SpanKind.SERVER,
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        ) as s:
+            async def enviar(message):
+                if message["type"] == "http.response.start":
+                    s.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, enviar)
+
+
+if settings.OTEL_ENABLED:
+    configurar_tracing("api")
+    app.add_middleware(TrazaMiddleware)
 
 # ---------------------------------------------------------------------------
 # Inclusión de routers
@@ -60,13 +116,13 @@ app.include_router(sire_router)
         "dependencia falla."
     ),
 )
-def health_check():
+async def health_check():
     """
     Endpoint de health check para Docker/Kubernetes.
 
     Realiza chequeos básicos de conectividad con:
-    - PostgreSQL (SELECT 1)
-    - Redis (PING)
+    - PostgreSQL (SELECT 1) usando el pool asíncrono
+    - Redis (PING) usando el pool asíncrono
 
     Returns:
         dict: Estado general y chequeos individuales.
@@ -75,9 +131,8 @@ def health_check():
 
     # ---- Check PostgreSQL ----
     try:
-        session = SessionSync()
-        session.execute(text("SELECT 1"))
-        session.close()
+        async with get_async_sessionmaker()() as session:
+            await session.execute(text("SELECT 1"))
         health_status["checks"]["database"] = "ok"
         logger.debug("Health check - Database: ok")
     except Exception as e:
@@ -88,13 +143,7 @@ def health_check():
 
     # ---- Check Redis ----
     try:
-        r = redis.from_url(
-            settings.REDIS_URL,
-            socket_connect_timeout=3,
-            decode_responses=True,
-        )
-        r.ping()
-        r.close()
+        await get_redis_async().ping()
         health_status["checks"]["redis"] = "ok"
         logger.debug("Health check - Redis: ok")
     except Exception as e:
@@ -103,4 +152,18 @@ def health_check():
         health_status["status"] = "degraded"
         logger.warning("Health check - Redis: %s", error_msg)
 
-    return health_status
\ No newline at end of file
+    return health_status
+
+
+# ---------------------------------------------------------------------------
+# Endpoint de métricas Prometheus
+# ---------------------------------------------------------------------------
+@app.get(
+    "/metrics",
+    tags=["Health"],
+    include_in_schema=False,
+)
+def metrics():
+    """Expone las métricas del proceso (o de todos, en modo multiproceso)."""
+    contenido, content_type = generar_metricas()
+    return Response(content=contenido, media_type=content_type)
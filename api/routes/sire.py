@@ -4,17 +4,67 @@ Endpoints de la API para operaciones SIRE.
 Define el endpoint POST /api/v1/sire/descargar que recibe las solicitudes
 del orquestador, valida los datos, crea el registro de operación en BD
 y encola la tarea en Celery.
+
+También expone POST /api/v1/sire/backfill para encargar rangos de períodos
+de varios RUCs en una sola llamada, y GET /api/v1/sire/backfill/{id} para
+consultar su avance.
+
+Para que el orquestador no dependa solo del webhook, GET
+/api/v1/sire/operaciones[/{id}] consulta el estado de las operaciones, y
+/esperar (long-poll) y /eventos (SSE) notifican los cambios a partir del
+pub/sub de Redis (ver core/eventos.py).
+
+Todos los endpoints son async y usan la fábrica de sesiones asíncrona
+compartida (asyncpg): no ocupan hilos del threadpool mientras esperan a la
+BD o a Redis.
 """
 
+import asyncio
+import base64
+import json
 import logging
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
-from api.schemas import DescargarRequest, DescargarResponse
-from core.database import get_session_sync
+from api.schemas import (
+    BackfillProgresoResponse,
+    BackfillRequest,
+    BackfillResponse,
+    DescargarRequest,
+    DescargarResponse,
+    EventoOperacionResponse,
+    OperacionDetalleResponse,
+    OperacionResponse,
+    OperacionesPaginaResponse,
+)
+from core.database import get_async_sessionmaker, get_session_async
+from core.eventos import (
+    EventosNoDisponiblesError,
+    siguiente_cambio,
+    suscripcion_operacion,
+)
+from core.tracing import anotar
 from models.otras_credenciales import OtraCredencial
-from models.operaciones import SireOperacion, EstadoOperacion
+from models.operaciones import (
+    ESTADOS_FINALES,
+    EstadoOperacion,
+    SireBackfill,
+    SireOperacion,
+    SireOperacionEvento,
+)
+from workers.sire_backfill import (
+    consulta_conteo_por_estado,
+    resumir_progreso_backfill,
+    task_planificar_backfill_sire,
+)
 from workers.sire_tasks import task_solicitar_descarga_sire
 
 logger = logging.getLogger(__name__)
@@ -33,9 +83,9 @@ router = APIRouter(prefix="/api/v1/sire", tags=["SIRE"])
         "Retorna inmediatamente con HTTP 202 Accepted."
     ),
 )
-def descargar_propuesta(
+async def descargar_propuesta(
     request: DescargarRequest,
-    session: Session = Depends(get_session_sync),
+    session: AsyncSession = Depends(get_session_async),
 ):
     """
     Encola una tarea de descarga de propuesta SIRE.
@@ -58,14 +108,16 @@ def descargar_propuesta(
     )
 
     cred = (
-        session.query(OtraCredencial)
-        .filter(
-            OtraCredencial.ruc == int(request.ruc),
-            OtraCredencial.tipo == "APISUNAT",
-            OtraCredencial.notas == "SIRE",
+        await session.execute(
+            select(OtraCredencial)
+            .where(
+                OtraCredencial.ruc == int(request.ruc),
+                OtraCredencial.tipo == "APISUNAT",
+                OtraCredencial.notas == "SIRE",
+            )
+            .limit(1)
         )
-        .first()
-    )
+    ).scalar_one_or_none()
 
     if not cred:
         logger.warning(
@@ -91,11 +143,17 @@ def descargar_propuesta(
         periodo=request.periodo,
         tipo_operacion=request.tipo,
         estado=EstadoOperacion.PENDING,
-        log="Operación creada. Encolando tarea en Celery...",
     )
     session.add(operacion)
-    session.commit()
-    session.refresh(operacion)
+    await session.flush()
+    session.add(
+        SireOperacionEvento(
+            operacion_id=operacion.id,
+            estado=EstadoOperacion.PENDING,
+            mensaje="Operación creada. Encolando tarea en Celery...",
+        )
+    )
+    await session.commit()
 
     logger.info(
         "Operación %s creada para RUC %s, periodo %s, tipo %s",
@@ -103,7 +161,10 @@ def descargar_propuesta(
     )
 
     # ---- Paso 3: Encolar tarea en Celery ----
-    task_solicitar_descarga_sire.delay(
+    anotar({"sire.operacion_id": operacion.id, "sire.ruc": request.ruc})
+    # La publicación al broker es bloqueante: se delega al threadpool
+    await run_in_threadpool(
+        task_solicitar_descarga_sire.delay,
         ruc=int(request.ruc),
         periodo=request.periodo,
         tipo=request.tipo,
@@ -120,4 +181,343 @@ def descargar_propuesta(
         status="accepted",
         job_id=str(operacion.id),
         message="Tarea de descarga encolada correctamente",
-    )
\ No newline at end of file
+    )
+
+@router.post(
+    "/backfill",
+    status_code=202,
+    response_model=BackfillResponse,
+    summary="Encola un backfill de propuestas SIRE por rango de períodos",
+    description=(
+        "Registra un backfill para varios RUCs y un rango de períodos. "
+        "La planificación (expansión del rango, omisión de lo ya descargado "
+        "y validación de credenciales) se hace en Celery. "
+        "Retorna inmediatamente con HTTP 202 Accepted."
+    ),
+)
+async def crear_backfill(
+    request: BackfillRequest,
+    session: AsyncSession = Depends(get_session_async),
+):
+    """
+    Encola un backfill de propuestas SIRE.
+
+    Args:
+        request: RUCs, rango de períodos, tipos y webhook_url.
+        session: Sesión de BD (inyectada por FastAPI).
+
+    Returns:
+        BackfillResponse con backfill_id y estado "accepted".
+    """
+    backfill = SireBackfill(
+        rucs=",".join(request.rucs),
+        periodo_inicio=request.periodo_inicio,
+        periodo_fin=request.periodo_fin,
+        tipos=",".join(request.tipos),
+        webhook_url=request.webhook_url,
+        forzar=request.forzar,
+        estado=EstadoOperacion.PENDING,
+        log="Backfill creado. Encolando planificación...",
+    )
+    session.add(backfill)
+    await session.commit()
+
+    logger.info(
+        "Backfill %s creado: %d RUC(s), %s-%s, tipos=%s",
+        backfill.id, len(request.rucs),
+        request.periodo_inicio, request.periodo_fin, backfill.tipos,
+    )
+
+    await run_in_threadpool(
+        task_planificar_backfill_sire.delay, backfill_id=backfill.id
+    )
+
+    return BackfillResponse(
+        status="accepted",
+        backfill_id=str(backfill.id),
+        message="Backfill encolado correctamente",
+    )
+
+
+@router.get(
+    "/backfill/{backfill_id}",
+    response_model=BackfillProgresoResponse,
+    summary="Consulta el avance de un backfill",
+    description=(
+        "Retorna el total de operaciones planificadas, las omitidas y el "
+        "conteo de operaciones por estado."
+    ),
+)
+async def obtener_backfill(
+    backfill_id: int,
+    session: AsyncSession = Depends(get_session_async),
+):
+    """
+    Consulta el avance de un backfill.
+
+    Raises:
+        HTTPException 404: Si el backfill no existe.
+    """
+    backfill = await session.get(SireBackfill, backfill_id)
+    if not backfill:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No existe el backfill {backfill_id}",
+        )
+
+    filas = (await session.execute(consulta_conteo_por_estado(backfill.id))).all()
+    return BackfillProgresoResponse(**resumir_progreso_backfill(backfill, filas))
+
+
+# ---------------------------------------------------------------------------
+# Consulta de operaciones
+# ---------------------------------------------------------------------------
+# Estados tras los cuales la operación ya no cambia (S3_UPLOADED aún pasa
+# a WEBHOOK_SENT)
+_ESTADOS_SIN_CAMBIOS = tuple(
+    e for e in ESTADOS_FINALES if e != EstadoOperacion.S3_UPLOADED
+)
+
+
+def _codificar_cursor(operacion: SireOperacion) -> str:
+    """Cursor opaco (created_at, id) de la última fila de la página."""
+    crudo = json.dumps([operacion.created_at.isoformat(), operacion.id])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor: str) -> tuple:
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        creado, operacion_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return datetime.fromisoformat(creado), int(operacion_id)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Cursor inválido") from e
+
+
+async def _leer_operacion(operacion_id: int) -> OperacionResponse:
+    """
+    Lee una operación con una sesión propia y breve: long-poll y SSE no
+    retienen una conexión de BD mientras esperan en Redis.
+    """
+    async with get_async_sessionmaker()() as session:
+        operacion = await session.get(SireOperacion, operacion_id)
+        if not operacion:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No existe la operación {operacion_id}",
+            )
+        return OperacionResponse.model_validate(operacion)
+
+
+async def _suscribir(pila: AsyncExitStack, operacion_id: int):
+    """
+    Abre la suscripción a la operación dentro de `pila`.
+
+    Raises:
+        HTTPException 503: Sin Redis o sin cupo de suscripciones (con Retry-After).
+    """
+    try:
+        return await pila.enter_async_context(suscripcion_operacion(operacion_id))
+    except EventosNoDisponiblesError as e:
+        logger.warning("Suscripción a la operación %s rechazada: %s", operacion_id, e)
+        raise HTTPException(
+            status_code=503,
+            detail="Seguimiento de operaciones no disponible, reintente más tarde",
+            headers={"Retry-After": str(e.retry_after)},
+        ) from e
+
+
+@router.get(
+    "/operaciones",
+    response_model=OperacionesPaginaResponse,
+    summary="Lista operaciones SIRE con filtros",
+    description=(
+        "Filtra por RUC, período, tipo, estado y rango de fechas. Ordena de "
+        "la más reciente a la más antigua con paginación por cursor "
+        "(keyset): pasar 'siguiente_cursor' de la respuesta como 'cursor'."
+    ),
+)
+async def listar_operaciones(
+    ruc: Optional[str] = Query(None, pattern=r"^\d{11}$"),
+    periodo: Optional[str] = Query(None, pattern=r"^\d{6}$"),
+    tipo: Optional[str] = Query(None, pattern=r"^(ventas|compras)$"),
+    estado: Optional[EstadoOperacion] = None,
+    desde: Optional[datetime] = Query(None, description="created_at >= desde"),
+    hasta: Optional[datetime] = Query(None, description="created_at < hasta"),
+    actualizado_desde: Optional[datetime] = Query(
+        None, description="updated_at >= actualizado_desde"
+    ),
+    cursor: Optional[str] = None,
+    limite: int = Query(50, ge=1, le=200),
+    session: AsyncSession = Depends(get_session_async),
+):
+    """
+    Lista operaciones con paginación por cursor.
+
+    Las consultas usan los índices (ruc, periodo, tipo_operacion, created_at)
+    y (estado, updated_at) creados en core/init_db.py.
+
+    Raises:
+        HTTPException 400: Si el cursor no es válido.
+    """
+    query = select(SireOperacion)
+    if ruc:
+        query = query.where(SireOperacion.ruc == int(ruc))
+    if periodo:
+        query = query.where(SireOperacion.periodo == periodo)
+    if tipo:
+        query = query.where(SireOperacion.tipo_operacion == tipo)
+    if estado:
+        query = query.where(SireOperacion.estado == estado)
+    if desde:
+        query = query.where(SireOperacion.created_at >= desde)
+    if hasta:
+        query = query.where(SireOperacion.created_at < hasta)
+    if actualizado_desde:
+        query = query.where(SireOperacion.updated_at >= actualizado_desde)
+    if cursor:
+        query = query.where(
+            tuple_(SireOperacion.created_at, SireOperacion.id)
+            < tuple_(*_decodificar_cursor(cursor))
+        )
+
+    filas = (
+        await session.execute(
+            query.order_by(SireOperacion.created_at.desc(), SireOperacion.id.desc())
+            .limit(limite + 1)
+        )
+    ).scalars().all()
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+
+    return OperacionesPaginaResponse(
+        items=[OperacionResponse.model_validate(op) for op in filas],
+        siguiente_cursor=_codificar_cursor(filas[-1]) if hay_mas else None,
+    )
+
+
+@router.get(
+    "/operaciones/{operacion_id}",
+    response_model=OperacionDetalleResponse,
+    summary="Consulta el estado y el historial de una operación",
+)
+async def obtener_operacion(
+    operacion_id: int,
+    session: AsyncSession = Depends(get_session_async),
+):
+    """
+    Consulta el estado de una operación.
+
+    Raises:
+        HTTPException 404: Si la operación no existe.
+    """
+    operacion = await session.get(SireOperacion, operacion_id)
+    if not operacion:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No existe la operación {operacion_id}",
+        )
+
+    eventos = (
+        await session.execute(
+            select(SireOperacionEvento)
+            .where(
+                SireOperacionEvento.operacion_id == operacion_id,
+                # Acota la búsqueda a las particiones desde la creación
+                SireOperacionEvento.created_at >= operacion.created_at,
+            )
+            .order_by(SireOperacionEvento.created_at, SireOperacionEvento.id)
+        )
+    ).scalars().all()
+    return OperacionDetalleResponse(
+        **OperacionResponse.model_validate(operacion).model_dump(),
+        eventos=[EventoOperacionResponse.model_validate(e) for e in eventos],
+    )
+
+
+@router.get(
+    "/operaciones/{operacion_id}/esperar",
+    response_model=OperacionResponse,
+    summary="Long-poll: espera un cambio de estado de la operación",
+    description=(
+        "Retorna en cuanto el estado de la operación sea distinto de "
+        "'estado' (el último conocido por el cliente) o, si no se indica, "
+        "en el próximo cambio. Al vencer 'timeout' retorna el estado actual."
+    ),
+)
+async def esperar_operacion(
+    operacion_id: int,
+    estado: Optional[EstadoOperacion] = None,
+    timeout: int = Query(25, ge=1, le=60),
+):
+    """
+    Long-poll sobre el estado de una operación.
+
+    Raises:
+        HTTPException 404: Si la operación no existe.
+        HTTPException 503: Si no se puede seguir la operación.
+    """
+    async with AsyncExitStack() as pila:
+        cola = await _suscribir(pila, operacion_id)
+        actual = await _leer_operacion(operacion_id)
+        if estado is not None and actual.estado != estado.value:
+            return actual
+
+        cambio = await siguiente_cambio(cola, timeout)
+        if cambio is None:
+            return actual
+    return await _leer_operacion(operacion_id)
+
+
+@router.get(
+    "/operaciones/{operacion_id}/eventos",
+    summary="SSE: flujo de cambios de estado de la operación",
+    description=(
+        "Server-Sent Events. Envía el estado actual y luego un evento "
+        "'estado' por cada cambio, hasta que la operación termina o vence "
+        "'timeout'."
+    ),
+)
+async def eventos_operacion(
+    operacion_id: int,
+    timeout: int = Query(300, ge=1, le=1800),
+):
+    """
+    Flujo SSE de una operación.
+
+    Raises:
+        HTTPException 404: Si la operación no existe.
+        HTTPException 503: Si no se puede seguir la operación.
+    """
+    # Validar existencia y suscribir antes de abrir el stream (para
+    # responder 404 o 503 en lugar de cortarlo)
+    await _leer_operacion(operacion_id)
+    pila = AsyncExitStack()
+    cola = await _suscribir(pila, operacion_id)
+
+    async def flujo():
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + timeout
+        async with pila:
+            actual = await _leer_operacion(operacion_id)
+            yield f"event: estado\ndata: {actual.model_dump_json()}\n\n"
+
+            while actual.estado not in _ESTADOS_SIN_CAMBIOS:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    return
+                cambio = await siguiente_cambio(cola, min(restante, 15))
+                if cambio is None:
+                    # Comentario SSE para mantener viva la conexión
+                    yield ": keep-alive\n\n"
+                    continue
+                actual = await _leer_operacion(operacion_id)
+                yield f"event: estado\ndata: {actual.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        flujo(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Libera la suscripción aunque el flujo nunca llegue a iterarse
+        background=BackgroundTask(pila.aclose),
+    )
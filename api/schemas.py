@@ -6,9 +6,48 @@ No confundir con api_clients/sire/schemas.py (esquemas del cliente SUNAT).
 """
 
 import re
+from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+
+from core.config import settings
+
+
+# ---------------------------------------------------------------------------
+# Validaciones compartidas
+# ---------------------------------------------------------------------------
+def _validar_ruc(v: str) -> str:
+    """Valida que el RUC tenga exactamente 11 dígitos numéricos."""
+    if not re.match(r"^\d{11}$", v):
+        raise ValueError("RUC debe tener exactamente 11 dígitos numéricos")
+    return v
+
+
+def _validar_periodo(v: str) -> str:
+    """Valida que el período sea AAAAMM con año y mes válidos."""
+    if not re.match(r"^\d{6}$", v):
+        raise ValueError("Período debe tener formato AAAAMM (6 dígitos)")
+
+    año = int(v[:4])
+    mes = int(v[4:6])
+
+    if año < 2000 or año > 2100:
+        raise ValueError("Año fuera de rango (debe estar entre 2000 y 2100)")
+    if mes < 1 or mes > 12:
+        raise ValueError("Mes debe estar entre 01 y 12")
+
+    return v
+
+
+def _validar_tipo(v: str) -> str:
+    """Valida que el tipo sea 'ventas' o 'compras'."""
+    if not v or not v.strip():
+        raise ValueError("Tipo no puede estar vacío")
+    tipo = v.strip().lower()
+    if tipo not in ("ventas", "compras"):
+        raise ValueError("Tipo debe ser 'ventas' o 'compras'")
+    return tipo
 
 
 class DescargarRequest(BaseModel):
@@ -46,37 +85,19 @@ class DescargarRequest(BaseModel):
     @classmethod
     def validar_ruc(cls, v: str) -> str:
         """Valida que el RUC tenga exactamente 11 dígitos numéricos."""
-        if not re.match(r"^\d{11}$", v):
-            raise ValueError("RUC debe tener exactamente 11 dígitos numéricos")
-        return v
+        return _validar_ruc(v)
 
     @field_validator("periodo")
     @classmethod
     def validar_periodo(cls, v: str) -> str:
         """Valida que el período sea AAAAMM con año y mes válidos."""
-        if not re.match(r"^\d{6}$", v):
-            raise ValueError("Período debe tener formato AAAAMM (6 dígitos)")
-
-        año = int(v[:4])
-        mes = int(v[4:6])
-
-        if año < 2000 or año > 2100:
-            raise ValueError("Año fuera de rango (debe estar entre 2000 y 2100)")
-        if mes < 1 or mes > 12:
-            raise ValueError("Mes debe estar entre 01 y 12")
-
-        return v
+        return _validar_periodo(v)
 
     @field_validator("tipo")
     @classmethod
     def validar_tipo(cls, v: str) -> str:
         """Valida que el tipo sea 'ventas' o 'compras'."""
-        if not v or not v.strip():
-            raise ValueError("Tipo no puede estar vacío")
-        tipo = v.strip().lower()
-        if tipo not in ("ventas", "compras"):
-            raise ValueError("Tipo debe ser 'ventas' o 'compras'")
-        return tipo
+        return _validar_tipo(v)
 
 
 class DescargarResponse(BaseModel):
@@ -107,4 +128,206 @@ class HealthResponse(BaseModel):
         checks: Diccionario con el estado de cada dependencia.
     """
     status: str
-    checks: dict
\ No newline at end of file
+    checks: dict
+
+
+class BackfillRequest(BaseModel):
+    """
+    Request para POST /api/v1/sire/backfill.
+
+    Attributes:
+        rucs: RUCs a procesar (11 dígitos cada uno).
+        periodo_inicio: Primer período del rango (AAAAMM, inclusive).
+        periodo_fin: Último período del rango (AAAAMM, inclusive).
+        tipos: Libros a descargar; por defecto ventas y compras.
+        webhook_url: URL del orquestador para notificar cada operación.
+        forzar: Si es True, vuelve a descargar períodos ya descargados.
+    """
+    rucs: list[str] = Field(
+        ...,
+        min_length=1,
+        description="RUCs de los contribuyentes (11 dígitos)",
+        examples=[["12345678901"]],
+    )
+    periodo_inicio: str = Field(
+        ...,
+        description="Período inicial en formato AAAAMM",
+        examples=["202301"],
+    )
+    periodo_fin: str = Field(
+        ...,
+        description="Período final en formato AAAAMM",
+        examples=["202512"],
+    )
+    tipos: list[str] = Field(
+        default_factory=lambda: ["ventas", "compras"],
+        min_length=1,
+        description='Tipos de libro: "ventas" y/o "compras"',
+    )
+    webhook_url: Optional[str] = Field(
+        None,
+        description="URL del orquestador para notificar cada resultado",
+        examples=["https://orquestador/api/webhooks/sire"],
+    )
+    forzar: bool = Field(
+        False,
+        description="Volver a descargar períodos que ya fueron descargados",
+    )
+
+    @field_validator("rucs")
+    @classmethod
+    def validar_rucs(cls, v: list[str]) -> list[str]:
+        """Valida cada RUC y elimina duplicados preservando el orden."""
+        return list(dict.fromkeys(_validar_ruc(ruc) for ruc in v))
+
+    @field_validator("periodo_inicio", "periodo_fin")
+    @classmethod
+    def validar_periodo(cls, v: str) -> str:
+        """Valida que el período sea AAAAMM con año y mes válidos."""
+        return _validar_periodo(v)
+
+    @field_validator("tipos")
+    @classmethod
+    def validar_tipos(cls, v: list[str]) -> list[str]:
+        """Valida cada tipo y elimina duplicados preservando el orden."""
+        return list(dict.fromkeys(_validar_tipo(tipo) for tipo in v))
+
+    @model_validator(mode="after")
+    def validar_rango(self) -> "BackfillRequest":
+        """Valida que el rango sea creciente y no exceda el máximo permitido."""
+        if self.periodo_inicio > self.periodo_fin:
+            raise ValueError("periodo_inicio debe ser menor o igual a periodo_fin")
+
+        meses = (
+            (int(self.periodo_fin[:4]) - int(self.periodo_inicio[:4])) * 12
+            + int(self.periodo_fin[4:6]) - int(self.periodo_inicio[4:6]) + 1
+        )
+        if meses > settings.SIRE_BACKFILL_MAX_PERIODOS:
+            raise ValueError(
+                f"El rango abarca {meses} períodos; el máximo es "
+                f"{settings.SIRE_BACKFILL_MAX_PERIODOS}"
+            )
+        return self
+
+
+class BackfillResponse(BaseModel):
+    """
+    Respuesta de POST /api/v1/sire/backfill (HTTP 202 Accepted).
+
+    Attributes:
+        status: Siempre "accepted".
+        backfill_id: ID del backfill para consultar su avance.
+        message: Mensaje informativo.
+    """
+    status: str = "accepted"
+    backfill_id: str = Field(..., description="ID del backfill en BD")
+    message: str = "Backfill encolado correctamente"
+
+
+class BackfillProgresoResponse(BaseModel):
+    """
+    Avance de un backfill (GET /api/v1/sire/backfill/{id}).
+
+    Attributes:
+        backfill_id: ID del backfill.
+        estado: PENDING (planificando), PROCESSING, COMPLETED o ERROR.
+        total_operaciones: Operaciones creadas por el planificador.
+        omitidas: Combinaciones omitidas (ya descargadas o sin credenciales).
+        finalizadas: Operaciones en un estado final.
+        pendientes: Operaciones en PENDING o PROCESSING.
+        porcentaje: Porcentaje de operaciones finalizadas.
+        por_estado: Conteo de operaciones por estado.
+        log: Resumen del planificador.
+    """
+    backfill_id: str
+    estado: str
+    total_operaciones: int
+    omitidas: int
+    finalizadas: int
+    pendientes: int
+    porcentaje: float
+    por_estado: dict
+    log: Optional[str] = None
+
+
+class OperacionResponse(BaseModel):
+    """
+    Estado de una operación SIRE (GET /api/v1/sire/operaciones/{id}).
+
+    Attributes:
+        id: ID de la operación.
+        ruc: RUC del contribuyente.
+        periodo: Período AAAAMM.
+        tipo_operacion: "ventas" o "compras".
+        estado: Estado actual (ver EstadoOperacion).
+        ticket: Ticket SUNAT, si ya se solicitó.
+        s3_url: URI del archivo, si ya se subió.
+        digest: SHA-256 del ZIP descargado.
+        backfill_id: Backfill al que pertenece, si aplica.
+        created_at: Fecha de creación.
+        updated_at: Fecha del último cambio.
+    """
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    ruc: str
+    periodo: str
+    tipo_operacion: str
+    estado: str
+    ticket: Optional[str] = None
+    s3_url: Optional[str] = None
+    digest: Optional[str] = None
+    backfill_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    @field_validator("ruc", mode="before")
+    @classmethod
+    def ruc_como_texto(cls, v) -> str:
+        return str(v)
+
+    @field_validator("estado", mode="before")
+    @classmethod
+    def estado_como_texto(cls, v) -> str:
+        return getattr(v, "value", v)
+
+
+class EventoOperacionResponse(BaseModel):
+    """
+    Evento del historial de una operación.
+
+    Attributes:
+        estado: Estado al que pasó la operación.
+        mensaje: Detalle de la transición (ticket, URL, error...).
+        created_at: Momento del evento.
+    """
+    model_config = ConfigDict(from_attributes=True)
+
+    estado: str
+    mensaje: Optional[str] = None
+    created_at: datetime
+
+    @field_validator("estado", mode="before")
+    @classmethod
+    def estado_como_texto(cls, v) -> str:
+        return getattr(v, "value", v)
+
+
+class OperacionDetalleResponse(OperacionResponse):
+    """
+    Operación con su historial de eventos, del más antiguo al más reciente.
+    """
+    eventos: list[EventoOperacionResponse] = []
+
+
+class OperacionesPaginaResponse(BaseModel):
+    """
+    Página de operaciones (GET /api/v1/sire/operaciones).
+
+    Attributes:
+        items: Operaciones de la página, de la más reciente a la más antigua.
+        siguiente_cursor: Cursor para pedir la página siguiente, o None si
+                          no hay más resultados.
+    """
+    items: list[OperacionResponse]
+    siguiente_cursor: Optional[str] = None
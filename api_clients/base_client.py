@@ -3,61 +3,54 @@ Cliente base resiliente para APIs de SUNAT.
 
 Provee:
 - Cliente HTTPX asíncrono con timeout configurable.
-- Reintentos automáticos con backoff exponencial ante errores 5xx, timeout y conexión.
+- Reintentos según política por familia de endpoints, con presupuesto por
+  operación, tope de la flota y cobertura (hedging) opcional
+  (ver api_clients/retry_policy.py).
 - Caché de tokens en Redis para compartir entre workers de Celery.
-- Refresco automático de token ante error 401.
+- Refresco automático de token ante error 401 (un solo intento,
+  compartido entre las solicitudes concurrentes del cliente).
+- Circuit breaker compartido en Redis por familia de endpoints
+  (ver api_clients/circuit_breaker.py).
 - Manejo de reportes vacíos (EmptyReportError).
+- Métricas de latencia por endpoint, refrescos de token y aciertos de la
+  caché de tokens (ver core/metrics.py).
+- Spans OpenTelemetry por llamada e intento HTTP (ver core/tracing.py).
 """
 
+import asyncio
 import logging
+import time
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 
 import httpx
-import redis
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    retry_if_exception_type,
-    before_sleep_log,
-)
+from opentelemetry.trace import SpanKind
 
+from api_clients.circuit_breaker import (
+    SunatCircuitOpenError,
+    es_fallo_upstream,
+    get_circuit_breaker,
+)
+from api_clients.retry_policy import (
+    RetryBudget,
+    RetryPolicy,
+    autorizar_reintento,
+    flota_permite_reintento,
+    obtener_politica,
+    registrar_solicitud,
+)
 from core.config import settings
+from core.metrics import (
+    SUNAT_HEDGES,
+    SUNAT_LATENCIA,
+    SUNAT_REFRESCOS_TOKEN,
+    SUNAT_TOKEN_CACHE,
+)
+from core.redis_client import get_redis as _get_redis
+from core.tracing import span
 
 logger = logging.getLogger(__name__)
 
-# ---------------------------------------------------------------------------
-# Conexión Redis síncrona (funciona tanto en FastAPI como en Celery workers)
-# ---------------------------------------------------------------------------
-_redis_client: Optional[redis.Redis] = None
-
-
-def _get_redis() -> redis.Redis:
-    """Obtiene conexión Redis síncrona (singleton)."""
-    global _redis_client
-    if _redis_client is None:
-        _redis_client = redis.from_url(
-            settings.REDIS_URL,
-            decode_responses=True,
-            socket_connect_timeout=3,
-        )
-    return _redis_client
-
-
-# ---------------------------------------------------------------------------
-# Configuración de reintentos para SUNAT
-# ---------------------------------------------------------------------------
-sunat_retry = retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=2, max=10),
-    retry=retry_if_exception_type(
-        (httpx.HTTPStatusError, httpx.TimeoutException, httpx.ConnectError)
-    ),
-    before_sleep=before_sleep_log(logger, logging.WARNING),
-    reraise=True,
-)
-
 
 # ---------------------------------------------------------------------------
 # Excepciones personalizadas
@@ -77,6 +70,16 @@ class SunatAuthError(Exception):
     pass
 
 
+class SunatTokenRefreshError(SunatAuthError):
+    """
+    Falló el refresco del token tras un 401. El fallo ya quedó registrado en
+    el circuito de 'seguridad'; no se cuenta en la familia de la solicitud.
+    """
+    def __init__(self, causa: BaseException):
+        self.causa = causa
+        super().__init__(f"No se pudo refrescar el token: {causa}")
+
+
 # ---------------------------------------------------------------------------
 # Base client
 # ---------------------------------------------------------------------------
@@ -91,26 +94,50 @@ class BaseSunatAPIClient(ABC):
     """
 
     BASE_URL: str = ""
+    FAMILIA_AUTH: str = "seguridad"  # Familia del circuit breaker para el token
 
-    def __init__(self, ruc: str, username: str, password: str):
+    def __init__(
+        self,
+        ruc: str,
+        username: str,
+        password: str,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        """
+        Args:
+            http_client: Cliente HTTPX compartido (su pool de conexiones).
+                         Si se indica, el cliente no lo crea ni lo cierra.
+        """
         self.ruc = ruc
         self.username = username
         self.password = password
         self._access_token: Optional[str] = None
-        self._client: Optional[httpx.AsyncClient] = None
+        self._client: Optional[httpx.AsyncClient] = http_client
+        self._cliente_propio = http_client is None
+        self._presupuesto = RetryBudget()
+        self._lock_token = asyncio.Lock()
+
+    def reiniciar_presupuesto_reintentos(self):
+        """
+        Inicia un nuevo presupuesto de reintentos. Los flujos que atienden
+        varias operaciones con un mismo cliente (backfill) lo llaman por
+        cada operación.
+        """
+        self._presupuesto = RetryBudget()
 
     # ---- context managers -------------------------------------------------
 
     async def __aenter__(self):
-        self._client = httpx.AsyncClient(
-            base_url=self.BASE_URL,
-            timeout=settings.SUNAT_API_TIMEOUT,
-        )
+        if self._cliente_propio:
+            self._client = httpx.AsyncClient(
+                base_url=self.BASE_URL,
+                timeout=settings.SUNAT_API_TIMEOUT,
+            )
         await self._ensure_token()
         return self
 
     async def __aexit__(self, *args):
-        if self._client:
+        if self._client and self._cliente_propio:
             await self._client.aclose()
 
     # ---- token management (síncrono, compatible con Celery workers) -------
@@ -118,7 +145,9 @@ class BaseSunatAPIClient(ABC):
     def _get_cached_token(self) -> Optional[str]:
         """Obtiene token desde Redis cache (síncrono)."""
         r = _get_redis()
-        return r.get(f"sire:token:{self.ruc}")
+        token = r.get(f"sire:token:{self.ruc}")
+        SUNAT_TOKEN_CACHE.labels(resultado="hit" if token else "miss").inc()
+        return token
 
     def _set_cached_token(self, token: str):
         """Guarda token en Redis con TTL (síncrono)."""
@@ -134,6 +163,20 @@ class BaseSunatAPIClient(ABC):
         r = _get_redis()
         r.delete(f"sire:token:{self.ruc}")
 
+    @property
+    def token(self) -> Optional[str]:
+        """Token vigente del cliente (None si aún no se obtuvo)."""
+        return self._access_token
+
+    async def obtener_token(self) -> str:
+        """
+        Token vigente: el que ya tiene el cliente, el de la caché en Redis
+        o uno nuevo de SUNAT (a través del circuito de 'seguridad').
+        """
+        if not self._access_token:
+            await self._ensure_token()
+        return self._access_token
+
     async def _ensure_token(self):
         """Asegura que tenemos un token válido, usando caché Redis si es posible."""
         cached = self._get_cached_token()
@@ -141,10 +184,33 @@ class BaseSunatAPIClient(ABC):
             self._access_token = cached
             logger.debug("Token obtenido desde Redis cache para RUC %s", self.ruc)
         else:
-            self._access_token = await self._authenticate()
+            self._access_token = await self._authenticate_con_circuito()
             self._set_cached_token(self._access_token)
             logger.debug("Token generado y cacheado en Redis para RUC %s", self.ruc)
 
+    async def _authenticate_con_circuito(self) -> str:
+        """
+        Ejecuta _authenticate a través del circuito y la política de
+        reintentos de la familia 'seguridad'.
+        """
+        with span("sunat.authenticate", {"sunat.ruc": self.ruc}):
+            return await self._ejecutar_con_politica(
+                self.FAMILIA_AUTH, self._authenticate_medido
+            )
+
+    async def _authenticate_medido(self) -> str:
+        """_authenticate con su latencia registrada bajo el endpoint 'token'."""
+        inicio = time.perf_counter()
+        status = "error"
+        try:
+            token = await self._authenticate()
+            status = "ok"
+            return token
+        finally:
+            SUNAT_LATENCIA.labels(endpoint="token", status=status).observe(
+                time.perf_counter() - inicio
+            )
+
     @abstractmethod
     async def _authenticate(self) -> str:
         """
@@ -155,7 +221,18 @@ class BaseSunatAPIClient(ABC):
 
     # ---- request core -----------------------------------------------------
 
-    @sunat_retry
+    def _familia_endpoint(self, endpoint: str) -> str:
+        """
+        Familia de endpoints a la que pertenece una URL, para el circuit breaker.
+        Las subclases la refinan según sus endpoints.
+        """
+        return "default"
+
+    @staticmethod
+    def _nombre_endpoint(endpoint: str) -> str:
+        """Etiqueta de métricas para una URL: su último segmento de ruta."""
+        return endpoint.rstrip("/").rsplit("/", 1)[-1].split("?", 1)[0] or "raiz"
+
     async def _make_request(
         self,
         method: str,
@@ -166,8 +243,16 @@ class BaseSunatAPIClient(ABC):
         Método central para todas las llamadas HTTP a SUNAT.
 
         - Incluye header de autorización automáticamente.
-        - Reintenta ante 5xx, timeout y errores de conexión (hasta 3 veces).
-        - Si recibe 401, refresca el token y reintenta una vez.
+        - Reintenta según la política de la familia del endpoint
+          (ver api_clients/retry_policy.py).
+        - Si recibe 401, refresca el token (un intento) y repite la
+          solicitud una vez. Si el refresco falla se levanta
+          SunatTokenRefreshError sin más reintentos.
+        - Si el circuito de la familia está abierto, levanta
+          SunatCircuitOpenError sin llamar a SUNAT.
+        - Con `receptor=...` el cuerpo se recibe en streaming (ver _recibir):
+          un reintento tras un corte a mitad del cuerpo pide solo lo que
+          falta y no se usa cobertura (dos descargas al mismo receptor).
         """
         if not self._client:
             raise RuntimeError(
@@ -175,24 +260,253 @@ class BaseSunatAPIClient(ABC):
             )
 
         headers = kwargs.pop("headers", {})
-        headers["Authorization"] = f"Bearer {self._access_token}"
+        en_streaming = kwargs.get("receptor") is not None
+
+        async def enviar() -> httpx.Response:
+            return await self._enviar_autenticado(method, endpoint, headers, **kwargs)
+
+        familia = self._familia_endpoint(endpoint)
+        with span("sunat.request", {
+            "http.method": method,
+            "sunat.endpoint": self._nombre_endpoint(endpoint),
+            "sunat.familia": familia,
+            "sunat.ruc": self.ruc,
+        }):
+            return await self._ejecutar_con_politica(
+                familia, enviar, permitir_cobertura=not en_streaming
+            )
 
-        response = await self._client.request(
-            method, endpoint, headers=headers, **kwargs
-        )
+    async def _enviar_autenticado(
+        self,
+        method: str,
+        endpoint: str,
+        headers: dict,
+        **kwargs,
+    ) -> httpx.Response:
+        """Envía una solicitud con el token vigente, refrescándolo ante 401."""
+        token = self._access_token
+        headers = {**headers, "Authorization": f"Bearer {token}"}
+
+        response = await self._solicitar(method, endpoint, headers, **kwargs)
 
         # Si el token expiró → refrescamos y reintentamos 1 vez
         if response.status_code == 401:
             logger.warning(
                 "Token expirado para RUC %s. Refrescando...", self.ruc
             )
-            self._invalidate_cached_token()
-            self._access_token = await self._authenticate()
-            self._set_cached_token(self._access_token)
+            await self._refrescar_token(rechazado=token)
             headers["Authorization"] = f"Bearer {self._access_token}"
-            response = await self._client.request(
-                method, endpoint, headers=headers, **kwargs
-            )
+            response = await self._solicitar(method, endpoint, headers, **kwargs)
 
         response.raise_for_status()
-        return response
\ No newline at end of file
+        return response
+
+    async def _refrescar_token(self, rechazado: Optional[str]):
+        """
+        Renueva el token rechazado con un 401.
+
+        Es un único intento, sin política de reintentos propia: ya corre
+        dentro del bucle de _ejecutar_con_politica de la solicitud. Las
+        solicitudes concurrentes del cliente (cobertura) comparten el
+        refresco: la que llega después de otra que ya lo renovó usa ese token.
+
+        Raises:
+            SunatCircuitOpenError: Si el circuito de 'seguridad' está abierto.
+            SunatTokenRefreshError: Si SUNAT no entregó el token.
+        """
+        async with self._lock_token:
+            if self._access_token != rechazado:
+                return
+
+            SUNAT_REFRESCOS_TOKEN.inc()
+            self._invalidate_cached_token()
+            circuito = get_circuit_breaker(self.FAMILIA_AUTH)
+            circuito.verificar()
+            registrar_solicitud(self.FAMILIA_AUTH)
+            try:
+                with span("sunat.authenticate", {"sunat.ruc": self.ruc}):
+                    token = await self._authenticate_medido()
+            except Exception as exc:
+                if es_fallo_upstream(exc):
+                    circuito.registrar_fallo()
+                else:
+                    circuito.registrar_respuesta()
+                raise SunatTokenRefreshError(exc) from exc
+
+            circuito.registrar_exito()
+            self._access_token = token
+            self._set_cached_token(token)
+
+    async def _solicitar(
+        self,
+        method: str,
+        endpoint: str,
+        headers: dict,
+        receptor=None,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        Una solicitud HTTP a SUNAT con su latencia registrada por endpoint
+        y un span CLIENT por intento.
+        """
+        inicio = time.perf_counter()
+        status = "error"
+        try:
+            with span(
+                f"HTTP {method}",
+                {"http.method": method, "sunat.endpoint": self._nombre_endpoint(endpoint)},
+                kind=SpanKind.CLIENT,
+            ) as s:
+                if receptor is None:
+                    response = await self._client.request(
+                        method, endpoint, headers=headers, **kwargs
+                    )
+                else:
+                    response = await self._recibir(
+                        receptor, method, endpoint, headers, **kwargs
+                    )
+                s.set_attribute("http.status_code", response.status_code)
+            status = str(response.status_code)
+            return response
+        except asyncio.CancelledError:
+            # Solicitud de cobertura descartada: no es latencia de SUNAT
+            status = None
+            raise
+        finally:
+            if status is not None:
+                SUNAT_LATENCIA.labels(
+                    endpoint=self._nombre_endpoint(endpoint), status=status
+                ).observe(time.perf_counter() - inicio)
+
+    async def _recibir(
+        self,
+        receptor,
+        method: str,
+        endpoint: str,
+        headers: dict,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        Solicitud en streaming: el cuerpo se entrega por trozos a `receptor`
+        en lugar de cargarse en memoria.
+
+        El receptor implementa:
+        - cabeceras_reanudacion() -> dict: Range/If-Range si ya tiene bytes
+          de un intento anterior (la conexión se cortó a mitad del cuerpo).
+        - iniciar(response): antes del cuerpo de una respuesta 2xx; con 206
+          continúa donde quedó, con 200 debe empezar de cero.
+        - escribir(chunk: bytes).
+
+        Las respuestas de error se leen completas y se devuelven como en
+        _solicitar (401 → refresco de token, resto → raise_for_status).
+        """
+        headers = {**headers, **receptor.cabeceras_reanudacion()}
+        async with self._client.stream(
+            method, endpoint, headers=headers, **kwargs
+        ) as response:
+            if response.is_success:
+                receptor.iniciar(response)
+                async for chunk in response.aiter_bytes():
+                    receptor.escribir(chunk)
+            else:
+                await response.aread()
+        return response
+
+    async def _ejecutar_con_politica(
+        self,
+        familia: str,
+        llamada: Callable[[], Awaitable],
+        permitir_cobertura: bool = True,
+    ):
+        """
+        Ejecuta una llamada a SUNAT aplicando circuito y política de reintentos.
+
+        Cada intento pasa por el circuit breaker de la familia. Un fallo se
+        reintenta solo si la política lo permite (idempotencia, máximo de
+        intentos), si la flota no superó su tope de reintentos y si queda
+        presupuesto en la operación. Con permitir_cobertura=False no se
+        lanzan solicitudes de cobertura aunque la política las defina.
+        """
+        politica = obtener_politica(familia)
+        circuito = get_circuit_breaker(familia)
+        intento = 1
+
+        while True:
+            circuito.verificar()
+            registrar_solicitud(familia, es_reintento=intento > 1)
+            try:
+                if permitir_cobertura:
+                    resultado = await self._con_cobertura(familia, politica, llamada)
+                else:
+                    resultado = await llamada()
+            except (SunatCircuitOpenError, SunatTokenRefreshError):
+                # El refresco fallido ya se contó en el circuito de 'seguridad'
+                raise
+            except Exception as exc:
+                if es_fallo_upstream(exc):
+                    circuito.registrar_fallo()
+                else:
+                    circuito.registrar_respuesta()
+                if not autorizar_reintento(
+                    familia, politica, self._presupuesto, exc, intento
+                ):
+                    raise
+                espera = politica.espera(intento)
+                logger.warning(
+                    "Reintentando '%s' para RUC %s en %.1fs (intento %d/%d): %s",
+                    familia, self.ruc, espera, intento + 1,
+                    politica.max_intentos, exc,
+                )
+                await asyncio.sleep(espera)
+                intento += 1
+                continue
+
+            circuito.registrar_exito()
+            return resultado
+
+    async def _con_cobertura(
+        self,
+        familia: str,
+        politica: RetryPolicy,
+        llamada: Callable[[], Awaitable],
+    ):
+        """
+        Ejecuta la llamada; si la política define hedge_despues y la respuesta
+        tarda más que eso, lanza una segunda solicitud idéntica y retorna la
+        primera que responda con éxito. La cobertura consume presupuesto de
+        reintentos y respeta el tope de la flota.
+        """
+        if not politica.hedge_despues or not politica.idempotente:
+            return await llamada()
+
+        primera = asyncio.ensure_future(llamada())
+        hechas, _ = await asyncio.wait({primera}, timeout=politica.hedge_despues)
+        if (
+            hechas
+            or not flota_permite_reintento(familia)
+            or not self._presupuesto.consumir()
+        ):
+            return await primera
+
+        registrar_solicitud(familia, es_reintento=True)
+        segunda = asyncio.ensure_future(llamada())
+        pendientes = {primera, segunda}
+        ultimo_error: Optional[BaseException] = None
+
+        try:
+            while pendientes:
+                hechas, pendientes = await asyncio.wait(
+                    pendientes, return_when=asyncio.FIRST_COMPLETED
+                )
+                for tarea in hechas:
+                    if tarea.exception() is None:
+                        SUNAT_HEDGES.labels(
+                            familia=familia,
+                            ganador="original" if tarea is primera else "cobertura",
+                        ).inc()
+                        return tarea.result()
+                    ultimo_error = tarea.exception()
+            raise ultimo_error
+        finally:
+            for tarea in pendientes:
+                tarea.cancel()
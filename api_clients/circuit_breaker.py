@@ -0,0 +1,233 @@
+"""
+Circuit breaker compartido (Redis) para los endpoints de SUNAT.
+
+Cuando SUNAT está caído, cada tarea agotaba sus reintentos contra un upstream
+muerto. El circuito corta esas llamadas a nivel de toda la flota:
+
+- CLOSED:    las llamadas pasan. Los fallos de upstream (5xx, 429, timeout,
+             error de conexión) se cuentan en una ventana deslizante de
+             SUNAT_CIRCUITO_VENTANA segundos (sorted set por instante).
+- OPEN:      al superar el umbral, ninguna llamada pasa hasta que termine el
+             enfriamiento. Se levanta SunatCircuitOpenError sin tocar SUNAT.
+- HALF_OPEN: terminado el enfriamiento, solo unas pocas "sondas" pasan.
+             Cualquier respuesta de SUNAT (éxito o error 4xx) cierra el
+             circuito; un fallo de upstream lo vuelve a abrir.
+
+El estado vive en Redis por familia de endpoints (seguridad, propuesta,
+estado, descarga), así todos los workers ven lo mismo. Si Redis no está
+disponible el circuito no bloquea (fail-open). Cada transición es un
+script Lua, atómico frente a los demás workers.
+"""
+
+import logging
+import time
+import uuid
+from typing import Optional
+
+import httpx
+import redis
+
+from core.config import settings
+from core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+
+class SunatCircuitOpenError(Exception):
+    """
+    Se levanta cuando el circuito de una familia de endpoints está abierto.
+    La llamada no se realizó; se puede reintentar tras retry_after segundos.
+    """
+    def __init__(self, familia: str, retry_after: int):
+        self.familia = familia
+        self.retry_after = retry_after
+        super().__init__(
+            f"Circuito SUNAT '{familia}' abierto. Reintentar en {retry_after}s."
+        )
+
+
+def es_fallo_upstream(exc: BaseException) -> bool:
+    """Indica si la excepción refleja que SUNAT no está respondiendo bien."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(exc, (httpx.TimeoutException, httpx.TransportError))
+
+
+# Cada transición es un script Lua: la lectura del estado y su cambio son
+# atómicos aunque varios workers registren resultados a la vez.
+#
+# KEYS[1] = estado (hash), KEYS[2] = sondas
+# ARGV[1] = ahora (s), ARGV[2] = máximo de sondas, ARGV[3] = enfriamiento (s)
+# Retorna 0 si la llamada pasa, o los segundos a esperar si no.
+_VERIFICAR_SCRIPT = """
+local estado = redis.call('HGET', KEYS[1], 'estado')
+if not estado or estado == 'CLOSED' then
+    return 0
+end
+local abierto_hasta = tonumber(redis.call('HGET', KEYS[1], 'abierto_hasta') or '0')
+local ahora = tonumber(ARGV[1])
+if ahora < abierto_hasta then
+    return math.max(1, math.floor(abierto_hasta - ahora))
+end
+if estado ~= 'HALF_OPEN' then
+    redis.call('HSET', KEYS[1], 'estado', 'HALF_OPEN')
+end
+local sondas = redis.call('INCR', KEYS[2])
+if sondas == 1 then
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+end
+if sondas > tonumber(ARGV[2]) then
+    return math.max(1, math.floor(tonumber(ARGV[3]) / 4))
+end
+return 0
+"""
+
+# KEYS[1] = estado, KEYS[2] = fallos, KEYS[3] = sondas
+# ARGV = estados desde los que se cierra el circuito
+# Retorna 1 si lo cerró.
+_CERRAR_SCRIPT = """
+local estado = redis.call('HGET', KEYS[1], 'estado')
+for _, desde in ipairs(ARGV) do
+    if estado == desde then
+        redis.call('DEL', KEYS[1], KEYS[2], KEYS[3])
+        return 1
+    end
+end
+return 0
+"""
+
+# KEYS[1] = estado, KEYS[2] = fallos, KEYS[3] = sondas
+# ARGV[1] = ahora (s), ARGV[2] = umbral, ARGV[3] = ventana (s),
+# ARGV[4] = enfriamiento (s), ARGV[5] = id único del fallo
+# Retorna {1 si lo abrió, fallos en la ventana}.
+_FALLO_SCRIPT = """
+local estado = redis.call('HGET', KEYS[1], 'estado')
+local ahora, ventana = tonumber(ARGV[1]), tonumber(ARGV[3])
+redis.call('ZADD', KEYS[2], ahora, ARGV[5])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ahora - ventana)
+redis.call('EXPIRE', KEYS[2], math.ceil(ventana))
+local fallos = redis.call('ZCARD', KEYS[2])
+if estado == 'HALF_OPEN' or (estado ~= 'OPEN' and fallos >= tonumber(ARGV[2])) then
+    local enfriamiento = tonumber(ARGV[4])
+    redis.call('HSET', KEYS[1], 'estado', 'OPEN',
+               'abierto_hasta', tostring(ahora + enfriamiento))
+    -- La clave se autodestruye si nadie vuelve a consultarla
+    redis.call('EXPIRE', KEYS[1], enfriamiento * 10)
+    redis.call('DEL', KEYS[3])
+    return {1, fallos}
+end
+return {0, fallos}
+"""
+
+
+class CircuitBreaker:
+    """Circuit breaker de una familia de endpoints con estado en Redis."""
+
+    KEY_PREFIX = "sunat:circuito"
+
+    def __init__(self, familia: str):
+        self.familia = familia
+        self.umbral = settings.SUNAT_CIRCUITO_UMBRAL_FALLOS
+        self.ventana = settings.SUNAT_CIRCUITO_VENTANA
+        self.enfriamiento = settings.SUNAT_CIRCUITO_ENFRIAMIENTO
+        self.max_sondas = settings.SUNAT_CIRCUITO_SONDAS
+
+        base = f"{self.KEY_PREFIX}:{familia}"
+        self._key_estado = base
+        self._key_fallos = f"{base}:fallos"
+        self._key_sondas = f"{base}:sondas"
+
+    # ---- consulta ---------------------------------------------------------
+
+    def estado(self) -> dict:
+        """Retorna el estado actual del circuito (para health/diagnóstico)."""
+        try:
+            r = get_redis()
+            data = r.hgetall(self._key_estado)
+            fallos = r.zcount(self._key_fallos, time.time() - self.ventana, "+inf")
+        except redis.RedisError as e:
+            logger.warning("Circuito '%s': Redis no disponible (%s)", self.familia, e)
+            return {"estado": CLOSED, "fallos": 0, "abierto_hasta": None}
+        return {
+            "estado": data.get("estado", CLOSED),
+            "fallos": fallos,
+            "abierto_hasta": float(data["abierto_hasta"]) if data.get("abierto_hasta") else None,
+        }
+
+    def verificar(self):
+        """
+        Verifica si se puede llamar a SUNAT. Terminado el enfriamiento pasa
+        el circuito a HALF_OPEN y cuenta la llamada como sonda.
+
+        Raises:
+            SunatCircuitOpenError: Si el circuito está abierto o si está
+                                   semiabierto y ya no quedan sondas.
+        """
+        try:
+            retry_after = get_redis().eval(
+                _VERIFICAR_SCRIPT, 2, self._key_estado, self._key_sondas,
+                time.time(), self.max_sondas, self.enfriamiento,
+            )
+        except redis.RedisError as e:
+            logger.warning("Circuito '%s': Redis no disponible (%s)", self.familia, e)
+            return
+        if retry_after:
+            raise SunatCircuitOpenError(self.familia, int(retry_after))
+
+    # ---- registro de resultados -------------------------------------------
+
+    def registrar_exito(self):
+        """Cierra el circuito si estaba abierto o semiabierto (SUNAT respondió)."""
+        self._cerrar((OPEN, HALF_OPEN), "SUNAT respondió")
+
+    def registrar_respuesta(self):
+        """
+        Registra un error que no es de upstream (4xx, respuesta inválida):
+        SUNAT respondió, así que una sonda en HALF_OPEN cierra el circuito.
+        Fuera de HALF_OPEN no cambia nada.
+        """
+        self._cerrar((HALF_OPEN,), "la sonda obtuvo respuesta de SUNAT")
+
+    def _cerrar(self, desde: tuple, motivo: str):
+        try:
+            cerrado = get_redis().eval(
+                _CERRAR_SCRIPT, 3, self._key_estado, self._key_fallos, self._key_sondas,
+                *desde,
+            )
+        except redis.RedisError as e:
+            logger.warning("Circuito '%s': Redis no disponible (%s)", self.familia, e)
+            return
+        if cerrado:
+            logger.info("Circuito '%s' → CLOSED (%s)", self.familia, motivo)
+
+    def registrar_fallo(self):
+        """Cuenta un fallo de upstream y abre el circuito si corresponde."""
+        try:
+            abierto, fallos = get_redis().eval(
+                _FALLO_SCRIPT, 3, self._key_estado, self._key_fallos, self._key_sondas,
+                time.time(), self.umbral, self.ventana, self.enfriamiento, uuid.uuid4().hex,
+            )
+        except redis.RedisError as e:
+            logger.warning("Circuito '%s': Redis no disponible (%s)", self.familia, e)
+            return
+        if abierto:
+            logger.error(
+                "Circuito '%s' → OPEN por %ds (%d fallos en %ds)",
+                self.familia, self.enfriamiento, fallos, self.ventana,
+            )
+
+
+_circuitos: dict = {}
+
+
+def get_circuit_breaker(familia: Optional[str]) -> CircuitBreaker:
+    """Retorna el circuit breaker de una familia (una instancia por proceso)."""
+    familia = familia or "default"
+    if familia not in _circuitos:
+        _circuitos[familia] = CircuitBreaker(familia)
+    return _circuitos[familia]
@@ -0,0 +1,220 @@
+"""
+Políticas de reintento para las llamadas a SUNAT.
+
+Reemplaza a los decoradores tenacity anidados (hasta 9 intentos por llamada)
+por una sola capa de decisión en BaseSunatAPIClient._make_request:
+
+- Política por familia de endpoints (máx. intentos, backoff, idempotencia,
+  cobertura/hedging). Configurable con SUNAT_RETRY_POLITICAS.
+- Presupuesto de reintentos por operación (RetryBudget): una operación no
+  puede gastar más de N reintentos sumando todas sus llamadas.
+- Tope de reintentos de la flota: si en el último minuto los reintentos
+  superan SUNAT_RETRY_RATIO_FLOTA de las solicitudes, se deja de reintentar
+  (contadores compartidos en Redis).
+- Idempotencia: las llamadas con efectos (token POST, solicitud de
+  propuesta que genera un ticket) solo se reintentan si la solicitud no
+  llegó a enviarse (error de conexión) o SUNAT la rechazó sin procesarla
+  (429/503).
+"""
+
+import logging
+import random
+import time
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import httpx
+import redis
+
+from core.config import settings
+from core.metrics import SUNAT_REINTENTOS, SUNAT_REINTENTOS_DENEGADOS
+from core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Política de reintentos de una familia de endpoints.
+
+    Attributes:
+        max_intentos: Intentos totales (1 = sin reintentos).
+        espera_base: Segundos de espera antes del primer reintento.
+        espera_max: Tope de la espera exponencial.
+        idempotente: Si repetir la llamada no tiene efectos en SUNAT.
+        hedge_despues: Si se indica, tras estos segundos sin respuesta se
+                       lanza una segunda solicitud en paralelo y se usa la
+                       primera que responda. Solo para llamadas idempotentes.
+    """
+    max_intentos: int = 3
+    espera_base: float = 1.0
+    espera_max: float = 8.0
+    idempotente: bool = True
+    hedge_despues: Optional[float] = None
+
+    def espera(self, intento: int) -> float:
+        """Backoff exponencial con jitter completo para el intento dado."""
+        tope = min(self.espera_max, self.espera_base * (2 ** (intento - 1)))
+        return random.uniform(0, tope)
+
+
+# Políticas por defecto por familia (ver SireClient.FAMILIAS)
+POLITICAS_POR_DEFECTO = {
+    "seguridad": RetryPolicy(max_intentos=2, idempotente=False),
+    "propuesta": RetryPolicy(max_intentos=2, idempotente=False),
+    "estado": RetryPolicy(max_intentos=3, hedge_despues=3.0),
+    "descarga": RetryPolicy(max_intentos=3, espera_base=2.0, espera_max=10.0),
+    "default": RetryPolicy(),
+}
+
+# Errores en los que la solicitud no llegó a SUNAT: siempre seguros de repetir
+_ERRORES_SIN_ENVIO = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+_STATUS_SIN_PROCESAR = (429, 503)
+
+
+def obtener_politica(familia: str) -> RetryPolicy:
+    """
+    Retorna la política de una familia aplicando los overrides de
+    SUNAT_RETRY_POLITICAS, ej: {"estado": {"max_intentos": 2, "hedge_despues": 2.5}}.
+    """
+    base = POLITICAS_POR_DEFECTO.get(familia, POLITICAS_POR_DEFECTO["default"])
+    override = settings.SUNAT_RETRY_POLITICAS.get(familia)
+    return replace(base, **override) if override else base
+
+
+def motivo_reintento(exc: BaseException, politica: RetryPolicy) -> Optional[str]:
+    """
+    Indica si el error es reintentable según la política.
+
+    Returns:
+        str: Motivo del reintento ("conexion", "timeout", "http_503", ...),
+             o None si no se debe reintentar.
+    """
+    if isinstance(exc, _ERRORES_SIN_ENVIO):
+        return "conexion"
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        # 429 y 503 indican que SUNAT rechazó la solicitud sin procesarla
+        if status in _STATUS_SIN_PROCESAR or (
+            politica.idempotente and status >= 500
+        ):
+            return f"http_{status}"
+        return None
+    if not politica.idempotente:
+        return None
+    if isinstance(exc, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(exc, httpx.TransportError):
+        return "transporte"
+    return None
+
+
+class RetryBudget:
+    """Presupuesto de reintentos de una operación (todas sus llamadas)."""
+
+    def __init__(self, reintentos: Optional[int] = None):
+        self.disponibles = (
+            settings.SUNAT_RETRY_PRESUPUESTO_OPERACION
+            if reintentos is None else reintentos
+        )
+
+    def consumir(self) -> bool:
+        """Consume un reintento. Retorna False si el presupuesto se agotó."""
+        if self.disponibles <= 0:
+            return False
+        self.disponibles -= 1
+        return True
+
+
+# ---------------------------------------------------------------------------
+# Contadores de la flota (Redis, ventana por minuto)
+# ---------------------------------------------------------------------------
+_KEY_PREFIX = "sunat:reintentos"
+
+
+def _claves_minuto(familia: str, minuto: int) -> tuple:
+    base = f"{_KEY_PREFIX}:{familia}:{minuto}"
+    return f"{base}:solicitudes", f"{base}:reintentos"
+
+
+def registrar_solicitud(familia: str, es_reintento: bool = False):
+    """Cuenta una solicitud (y si es reintento) en el minuto actual."""
+    minuto = int(time.time() // 60)
+    key_solicitudes, key_reintentos = _claves_minuto(familia, minuto)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.incr(key_solicitudes)
+        pipe.expire(key_solicitudes, 180)
+        if es_reintento:
+            pipe.incr(key_reintentos)
+            pipe.expire(key_reintentos, 180)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.debug("No se pudo registrar solicitud en Redis: %s", e)
+
+
+def ratio_reintentos_flota(familia: str) -> tuple:
+    """
+    Retorna (solicitudes, reintentos) de la flota en el minuto actual y el
+    anterior para la familia.
+    """
+    minuto = int(time.time() // 60)
+    claves = [*_claves_minuto(familia, minuto), *_claves_minuto(familia, minuto - 1)]
+    try:
+        valores = [int(v or 0) for v in get_redis().mget(claves)]
+    except redis.RedisError as e:
+        logger.debug("No se pudo leer contadores de reintentos: %s", e)
+        return 0, 0
+    return valores[0] + valores[2], valores[1] + valores[3]
+
+
+def flota_permite_reintento(familia: str) -> bool:
+    """
+    Verifica el tope de reintentos de la flota. Con poco tráfico (menos de
+    SUNAT_RETRY_MIN_SOLICITUDES_FLOTA) siempre se permite.
+    """
+    solicitudes, reintentos = ratio_reintentos_flota(familia)
+    if solicitudes < settings.SUNAT_RETRY_MIN_SOLICITUDES_FLOTA:
+        return True
+    return reintentos / solicitudes < settings.SUNAT_RETRY_RATIO_FLOTA
+
+
+def autorizar_reintento(
+    familia: str,
+    politica: RetryPolicy,
+    presupuesto: RetryBudget,
+    exc: BaseException,
+    intento: int,
+) -> bool:
+    """
+    Decide si se reintenta una llamada fallida y registra la métrica.
+
+    Args:
+        familia: Familia de endpoints.
+        politica: Política de la familia.
+        presupuesto: Presupuesto de la operación en curso.
+        exc: Error de la llamada.
+        intento: Número del intento que falló (1 = primero).
+    """
+    motivo = motivo_reintento(exc, politica)
+    if motivo is None:
+        causa = "no_reintentable"
+    elif intento >= politica.max_intentos:
+        causa = "max_intentos"
+    elif not flota_permite_reintento(familia):
+        causa = "flota"
+    elif not presupuesto.consumir():
+        causa = "presupuesto"
+    else:
+        SUNAT_REINTENTOS.labels(familia=familia, motivo=motivo).inc()
+        return True
+
+    if motivo is not None:
+        SUNAT_REINTENTOS_DENEGADOS.labels(familia=familia, causa=causa).inc()
+        if causa in ("flota", "presupuesto"):
+            logger.warning(
+                "Reintento denegado (%s) para familia '%s': %s",
+                causa, familia, exc,
+            )
+    return False
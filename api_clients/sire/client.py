@@ -10,15 +10,16 @@ Basado en el código legacy probado en driver_sunat/automation/sire/sire_client.
 
 import logging
 import re
+import time
 from typing import Optional
 
 import httpx
 
-from api_clients.base_client import (
-    BaseSunatAPIClient,
-    sunat_retry,
-)
-from api_clients.sire.schemas import DownloadResponse, TicketStatus
+from api_clients.base_client import BaseSunatAPIClient
+from api_clients.sire.estados import estado_en_proceso, parsear_pagina, parsear_registro
+from api_clients.sire.schemas import DownloadResponse, ParametrosDescarga, TicketStatus
+from core.config import settings
+from core.metrics import SIRE_DESCARGA_BYTES, SIRE_DESCARGA_THROUGHPUT
 
 logger = logging.getLogger(__name__)
 
@@ -49,10 +50,10 @@ class SireClient(BaseSunatAPIClient):
     """
 
     # ------------------------------------------------------------------
-    # URLs base de SUNAT
+    # URLs base de SUNAT (configurables para pruebas de carga)
     # ------------------------------------------------------------------
-    BASE_URL_SEGURIDAD = "https://api-seguridad.sunat.gob.pe"
-    BASE_URL_SIRE = "https://api-sire.sunat.gob.pe"
+    BASE_URL_SEGURIDAD = settings.SUNAT_BASE_URL_SEGURIDAD
+    BASE_URL_SIRE = settings.SUNAT_BASE_URL_SIRE
 
     # ------------------------------------------------------------------
     # Mapeo de libros SIRE por tipo
@@ -69,6 +70,7 @@ class SireClient(BaseSunatAPIClient):
         client_secret: str,
         user_sol: str,
         clave_sol: str,
+        http_client: Optional[httpx.AsyncClient] = None,
     ):
         """
         Inicializa el cliente SIRE.
@@ -79,17 +81,37 @@ class SireClient(BaseSunatAPIClient):
             client_secret: Corresponde a oc.contrasena (de otras_credenciales).
             user_sol: Corresponde a e.usuario_sol (de entities).
             clave_sol: Corresponde a e.clave_sol (de entities).
+            http_client: Cliente HTTPX compartido entre varios SireClient
+                         (ver driver_sunat.automation.sire.sire_client).
         """
         super().__init__(
             ruc=ruc,
             username=client_id,
             password=client_secret,
+            http_client=http_client,
         )
         self.client_id = client_id
         self.client_secret = client_secret
         self.user_sol = user_sol
         self.clave_sol = clave_sol
 
+    # ------------------------------------------------------------------
+    # Familias de endpoints (circuit breaker)
+    # ------------------------------------------------------------------
+    FAMILIAS = {
+        "exportapropuesta": "propuesta",
+        "exportacioncomprobantepropuesta": "propuesta",
+        "consultaestadotickets": "estado",
+        "archivoreporte": "descarga",
+    }
+
+    def _familia_endpoint(self, endpoint: str) -> str:
+        """Agrupa las URLs de SIRE en propuesta, estado y descarga."""
+        for fragmento, familia in self.FAMILIAS.items():
+            if endpoint.endswith(fragmento):
+                return familia
+        return "sire"
+
     # ------------------------------------------------------------------
     # Autenticación OAuth2 real (NO el placeholder /auth)
     # ------------------------------------------------------------------
@@ -137,7 +159,6 @@ class SireClient(BaseSunatAPIClient):
     # ------------------------------------------------------------------
     # Solicitar descarga de propuesta
     # ------------------------------------------------------------------
-    @sunat_retry
     async def solicitar_descarga_propuesta(
         self, periodo: str, tipo: str
     ) -> str:
@@ -189,7 +210,6 @@ class SireClient(BaseSunatAPIClient):
     # ------------------------------------------------------------------
     # Consultar estado de ticket
     # ------------------------------------------------------------------
-    @sunat_retry
     async def consultar_estado_ticket(
         self, ticket: str, periodo: str
     ) -> TicketStatus:
@@ -208,6 +228,35 @@ class SireClient(BaseSunatAPIClient):
         Returns:
             TicketStatus con estado normalizado.
         """
+        data = await self.consultar_estado_ticket_json(ticket, periodo)
+
+        # Validar respuesta
+        registros = data.get("registros")
+        if not registros:
+            logger.debug(
+                "Ticket %s: respuesta sin registros, asumiendo PROCESANDO",
+                ticket,
+            )
+            return estado_en_proceso(ticket, "Sin registros en respuesta")
+
+        # Parsear solo el ticket consultado (índice numTicket → registro)
+        estado = parsear_pagina(registros, (ticket,)).get(str(ticket))
+        if estado is None:
+            logger.debug(
+                "Ticket %s no encontrado en registros, asumiendo PROCESANDO",
+                ticket,
+            )
+            return estado_en_proceso(ticket, "Ticket no encontrado en respuesta")
+
+        return estado
+
+    async def consultar_estado_ticket_json(self, ticket: str, periodo: str) -> dict:
+        """
+        Respuesta JSON de consultaestadotickets para un ticket, sin parsear.
+
+        Es la base de consultar_estado_ticket; se expone para los
+        consumidores que leen el JSON de SUNAT directamente (paquete legacy).
+        """
         logger.debug("Consultando estado del ticket %s", ticket)
 
         libro = "rvierce"  # Libro combinado para consulta de estado
@@ -224,156 +273,110 @@ class SireClient(BaseSunatAPIClient):
         }
 
         response = await self._make_request("GET", url, params=params)
-        data = response.json()
-
-        # Validar respuesta
-        registros = data.get("registros")
-        if not registros:
-            logger.debug(
-                "Ticket %s: respuesta sin registros, asumiendo PROCESANDO",
-                ticket,
-            )
-            return TicketStatus(
-                ticket=ticket,
-                cod_estado="",
-                des_estado="Sin registros en respuesta",
-                status="PROCESANDO",
-            )
+        return response.json()
 
-        # Buscar el ticket específico en la lista
-        ticket_info = None
-        for registro in registros:
-            if str(registro.get("numTicket")) == str(ticket):
-                ticket_info = registro
-                break
+    # ------------------------------------------------------------------
+    # Consultar estados de tickets por rango de períodos
+    # ------------------------------------------------------------------
+    async def consultar_estados_tickets(
+        self,
+        per_ini: str,
+        per_fin: str,
+        tickets: Optional[set] = None,
+    ) -> dict:
+        """
+        Consulta en bloque el estado de los tickets de un rango de períodos.
 
-        if not ticket_info:
-            logger.debug(
-                "Ticket %s no encontrado en registros, asumiendo PROCESANDO",
-                ticket,
-            )
-            return TicketStatus(
-                ticket=ticket,
-                cod_estado="",
-                des_estado="Ticket no encontrado en respuesta",
-                status="PROCESANDO",
-            )
+        Usa consultaestadotickets sin numTicket y con perIni/perFin abarcando
+        el rango, recorriendo las páginas necesarias. Así un backfill de
+        N períodos consulta su avance con unas pocas llamadas en lugar de
+        una por ticket.
 
-        detalle = ticket_info.get("detalleTicket", {})
-        cod_estado = detalle.get("codEstadoEnvio", "")
-        des_estado = detalle.get("desEstadoEnvio", "")
+        Args:
+            per_ini: Período inicial en formato AAAAMM.
+            per_fin: Período final en formato AAAAMM.
+            tickets: Tickets de interés. Si se indica, se deja de paginar
+                     en cuanto se encontraron todos.
 
-        logger.debug(
-            "Ticket %s: cod_estado=%s, des_estado=%s",
-            ticket, cod_estado, des_estado,
+        Returns:
+            dict: numTicket → TicketStatus con los tickets encontrados.
+        """
+        libro = "rvierce"
+        url = (
+            f"{self.BASE_URL_SIRE}/v1/contribuyente/migeigv/libros/"
+            f"{libro}/gestionprocesosmasivos/web/masivo/consultaestadotickets"
         )
+        por_pagina = settings.SIRE_ESTADO_POR_PAGINA
+        pendientes = {str(t) for t in tickets} if tickets else None
+        estados = {}
+        page = 1
+
+        while True:
+            params = {
+                "perIni": per_ini,
+                "perFin": per_fin,
+                "page": page,
+                "perPage": por_pagina,
+            }
+            response = await self._make_request("GET", url, params=params)
+            data = response.json()
+            registros = data.get("registros") or []
 
-        # Mapear estado SUNAT a status normalizado
-        if cod_estado == "06":  # Terminado
-            archivo_reporte_lista = ticket_info.get("archivoReporte")
-            if not archivo_reporte_lista:
-                logger.error(
-                    "Ticket %s: listo pero sin archivoReporte", ticket
-                )
-                return TicketStatus(
-                    ticket=ticket,
-                    cod_estado=cod_estado,
-                    des_estado=des_estado,
-                    status="ERROR",
-                    mensaje="Ticket listo pero sin sección archivoReporte",
-                )
-
-            archivo_info = archivo_reporte_lista[0]
-            nom_archivo = archivo_info.get("nomArchivoReporte", "")
-
-            # Detectar reporte vacío (por nombre o metadata)
-            es_vacio = (
-                "sin datos" in nom_archivo.lower()
-                or "vacio" in nom_archivo.lower()
-                or "no contiene" in nom_archivo.lower()
-            )
+            # Una sola pasada por página, solo sobre los tickets pendientes
+            encontrados = parsear_pagina(registros, pendientes)
+            estados.update(encontrados)
+            if pendientes is not None:
+                pendientes.difference_update(encontrados)
 
-            if es_vacio:
-                return TicketStatus(
-                    ticket=ticket,
-                    cod_estado=cod_estado,
-                    des_estado=des_estado,
-                    status="SIN_DATOS",
-                    mensaje="El reporte se generó correctamente pero no contiene registros.",
-                )
-
-            # Extraer parámetros de descarga (preservando el typo 'Achivo' de la API)
-            download_params = {
-                "nomArchivoReporte": nom_archivo,
-                "codTipoArchivoReporte": archivo_info.get(
-                    "codTipoAchivoReporte"  # ← Typo intencional de la API
-                ),
-                "codLibro": ticket_info.get(
-                    "codLibro",
-                    "140400" if "rvie" in nom_archivo.lower() else "080100",
-                ),
-                "perTributario": ticket_info.get("perTributario"),
-                "codProceso": ticket_info.get("codProceso", "10"),
-                "numTicket": ticket,
-            }
+            if pendientes is not None and not pendientes:
+                break
 
-            # Validar parámetros esenciales
-            if not all(download_params.values()):
-                logger.error(
-                    "Ticket %s: parámetros de descarga incompletos: %s",
-                    ticket, download_params,
-                )
-                return TicketStatus(
-                    ticket=ticket,
-                    cod_estado=cod_estado,
-                    des_estado=des_estado,
-                    status="ERROR",
-                    mensaje="Parámetros de descarga incompletos",
-                )
-
-            return TicketStatus(
-                ticket=ticket,
-                cod_estado=cod_estado,
-                des_estado=des_estado,
-                status="LISTO",
-                mensaje="Reporte listo para descargar",
-                parametros_descarga=download_params,
-            )
+            total = (data.get("paginacion") or {}).get("totalRegistros")
+            if len(registros) < por_pagina or (
+                total is not None and page * por_pagina >= int(total)
+            ):
+                break
+            page += 1
 
-        elif cod_estado == "04":  # Error
-            return TicketStatus(
-                ticket=ticket,
-                cod_estado=cod_estado,
-                des_estado=des_estado,
-                status="ERROR",
-                mensaje=f"SUNAT reportó error: {des_estado}",
-            )
+        logger.debug(
+            "Estados consultados para %s-%s: %d tickets en %d página(s)",
+            per_ini, per_fin, len(estados), page,
+        )
+        return estados
 
-        else:  # 01, 02, 03, 05 - En proceso
-            return TicketStatus(
-                ticket=ticket,
-                cod_estado=cod_estado,
-                des_estado=des_estado,
-                status="PROCESANDO",
-            )
+    # ------------------------------------------------------------------
+    # Parseo de registros de consultaestadotickets (ver estados.py)
+    # ------------------------------------------------------------------
+    _parsear_registro = staticmethod(parsear_registro)
 
     # ------------------------------------------------------------------
     # Descargar archivo
     # ------------------------------------------------------------------
-    @sunat_retry
-    async def descargar_archivo(self, download_params: dict) -> DownloadResponse:
+    async def descargar_archivo(self, download_params, receptor=None) -> DownloadResponse:
         """
         Descarga el archivo ZIP del reporte SIRE.
 
-        IMPORTANTE: Retorna los bytes en memoria. NADA DE DISCO.
+        Dos modos:
+        - Sin receptor: retorna los bytes en memoria, sin tocar disco.
+        - Con receptor (p. ej. ZipDownloadFile, en
+          driver_sunat/automation/sire/descarga.py): el archivo se recibe en
+          streaming en él (ver BaseSunatAPIClient._recibir), normalmente a
+          disco, y la respuesta no trae contenido. Un corte a mitad de la
+          descarga se retoma con Range.
 
         Args:
-            download_params: Parámetros obtenidos de consultar_estado_ticket
-                             cuando status == 'LISTO'.
+            download_params: ParametrosDescarga obtenidos de
+                             consultar_estado_ticket cuando status == 'LISTO'
+                             (o el dict equivalente con los nombres de SUNAT).
+            receptor: Destino del streaming. Debe rechazar en iniciar() una
+                      respuesta JSON.
 
         Returns:
-            DownloadResponse con contenido en bytes o indicando reporte vacío.
+            DownloadResponse con contenido en bytes (o sin él, con receptor)
+            o indicando reporte vacío.
         """
+        if isinstance(download_params, ParametrosDescarga):
+            download_params = download_params.como_params()
         logger.debug("Descargando archivo con params: %s", download_params)
 
         libro = "rvierce"
@@ -382,13 +385,18 @@ class SireClient(BaseSunatAPIClient):
             f"{libro}/gestionprocesosmasivos/web/masivo/archivoreporte"
         )
 
-        response = await self._make_request("GET", url, params=download_params)
+        inicio = time.perf_counter()
+        response = await self._make_request(
+            "GET", url, params=download_params, receptor=receptor
+        )
+        duracion = time.perf_counter() - inicio
 
         # Validar que SUNAT no devolvió JSON de error con HTTP 200
         content_type = response.headers.get("Content-Type", "")
-        contenido = response.content
+        contenido = None if receptor is not None else response.content
+        tamano = receptor.recibidos if receptor is not None else len(contenido)
 
-        if "application/json" in content_type:
+        if receptor is None and "application/json" in content_type:
             error_body = response.text[:500]
             logger.error(
                 "SUNAT devolvió JSON en lugar del archivo: %s", error_body
@@ -399,11 +407,15 @@ class SireClient(BaseSunatAPIClient):
 
         nom_archivo = download_params.get("nomArchivoReporte", "desconocido")
 
+        SIRE_DESCARGA_BYTES.inc(tamano)
+        if tamano and duracion > 0:
+            SIRE_DESCARGA_THROUGHPUT.observe(tamano / duracion)
+
         # ZIP vacío típicamente pesa ~22 bytes (firma EoCd)
-        if not contenido or len(contenido) < 50:
+        if tamano < 50:
             logger.warning(
                 "Archivo descargado está vacío o es mínimo (%d bytes): %s",
-                len(contenido) if contenido else 0,
+                tamano,
                 nom_archivo,
             )
             return DownloadResponse(
@@ -425,7 +437,7 @@ class SireClient(BaseSunatAPIClient):
 
         logger.info(
             "Archivo descargado exitosamente: %s, tamaño: %d bytes",
-            nom_archivo_final, len(contenido),
+            nom_archivo_final, tamano,
         )
         return DownloadResponse(
             ticket=download_params.get("numTicket", "desconocido"),
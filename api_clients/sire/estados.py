@@ -0,0 +1,190 @@
+"""
+Parseo de las respuestas de consultaestadotickets de SUNAT.
+
+Una página de consultaestadotickets trae una lista 'registros' con un
+registro por ticket. En lugar de recorrer la lista una vez por ticket
+consultado, la página se procesa en una sola pasada:
+
+- indexar_registros: numTicket → registro (un dict por respuesta).
+- parsear_pagina: numTicket → TicketStatus de todos los tickets de la
+  página (o solo de los indicados).
+
+Lo usan SireClient (consultar_estado_ticket, consultar_estados_tickets) y
+la tarea legacy driver_sunat.automation.sire.sire_status_task.
+"""
+
+import logging
+import sys
+from typing import Iterable, Optional
+
+from api_clients.sire.schemas import EstadoTicket, ParametrosDescarga, TicketStatus
+
+logger = logging.getLogger(__name__)
+
+
+def indexar_registros(registros: Optional[list]) -> dict:
+    """
+    Índice numTicket → registro de una respuesta. Si un ticket aparece más
+    de una vez se conserva el primer registro (como la búsqueda lineal).
+    """
+    indice = {}
+    for registro in registros or ():
+        indice.setdefault(str(registro.get("numTicket")), registro)
+    return indice
+
+
+def parsear_pagina(
+    registros: Optional[list],
+    tickets: Optional[Iterable] = None,
+) -> dict:
+    """
+    Convierte una página de registros en TicketStatus, en una sola pasada.
+
+    Args:
+        registros: Lista 'registros' de la respuesta de SUNAT.
+        tickets: Si se indica, solo se parsean esos tickets.
+
+    Returns:
+        dict: numTicket → TicketStatus de los tickets encontrados.
+    """
+    indice = indexar_registros(registros)
+    if tickets is not None:
+        claves = (str(t) for t in tickets)
+        indice = {t: indice[t] for t in claves if t in indice}
+    return {
+        ticket: parsear_registro(ticket, registro)
+        for ticket, registro in indice.items()
+    }
+
+
+def estado_en_proceso(ticket: str, motivo: str) -> TicketStatus:
+    """TicketStatus PROCESANDO para un ticket ausente de la respuesta."""
+    return TicketStatus(
+        ticket=ticket,
+        cod_estado="",
+        des_estado=motivo,
+        status=EstadoTicket.PROCESANDO,
+    )
+
+
+def _codigo(valor) -> str:
+    """Códigos y descripciones de SUNAT: se repiten en cada ticket, se internan."""
+    return sys.intern(valor) if isinstance(valor, str) else valor
+
+
+def parsear_registro(ticket: str, ticket_info: dict) -> TicketStatus:
+    """
+    Convierte un registro de consultaestadotickets en TicketStatus.
+
+    Args:
+        ticket: Número de ticket.
+        ticket_info: Registro de SUNAT correspondiente al ticket.
+
+    Returns:
+        TicketStatus con estado normalizado.
+    """
+    detalle = ticket_info.get("detalleTicket", {})
+    cod_estado = _codigo(detalle.get("codEstadoEnvio", ""))
+    des_estado = _codigo(detalle.get("desEstadoEnvio", ""))
+
+    logger.debug(
+        "Ticket %s: cod_estado=%s, des_estado=%s",
+        ticket, cod_estado, des_estado,
+    )
+
+    # Mapear estado SUNAT a status normalizado
+    if cod_estado == "06":  # Terminado
+        archivo_reporte_lista = ticket_info.get("archivoReporte")
+        if not archivo_reporte_lista:
+            logger.error(
+                "Ticket %s: listo pero sin archivoReporte", ticket
+            )
+            return TicketStatus(
+                ticket=ticket,
+                cod_estado=cod_estado,
+                des_estado=des_estado,
+                status=EstadoTicket.ERROR,
+                mensaje="Ticket listo pero sin sección archivoReporte",
+            )
+
+        archivo_info = archivo_reporte_lista[0]
+        nom_archivo = archivo_info.get("nomArchivoReporte", "")
+
+        # Detectar reporte vacío (por nombre o metadata)
+        nom_minusculas = nom_archivo.lower()
+        es_vacio = (
+            "sin datos" in nom_minusculas
+            or "vacio" in nom_minusculas
+            or "no contiene" in nom_minusculas
+        )
+
+        if es_vacio:
+            return TicketStatus(
+                ticket=ticket,
+                cod_estado=cod_estado,
+                des_estado=des_estado,
+                status=EstadoTicket.SIN_DATOS,
+                mensaje="El reporte se generó correctamente pero no contiene registros.",
+            )
+
+        # Extraer parámetros de descarga (preservando el typo 'Achivo' de la API)
+        parametros = ParametrosDescarga(
+            nom_archivo_reporte=nom_archivo,
+            cod_tipo_archivo_reporte=_codigo(
+                archivo_info.get("codTipoAchivoReporte")  # ← Typo intencional de la API
+            ),
+            cod_libro=_codigo(ticket_info.get(
+                "codLibro",
+                "140400" if "rvie" in nom_minusculas else "080100",
+            )),
+            per_tributario=_codigo(ticket_info.get("perTributario")),
+            cod_proceso=_codigo(ticket_info.get("codProceso", "10")),
+            num_ticket=ticket,
+        )
+
+        # Validar parámetros esenciales
+        if not (
+            nom_archivo
+            and parametros.cod_tipo_archivo_reporte
+            and parametros.cod_libro
+            and parametros.per_tributario
+            and parametros.cod_proceso
+            and ticket
+        ):
+            logger.error(
+                "Ticket %s: parámetros de descarga incompletos: %s",
+                ticket, parametros,
+            )
+            return TicketStatus(
+                ticket=ticket,
+                cod_estado=cod_estado,
+                des_estado=des_estado,
+                status=EstadoTicket.ERROR,
+                mensaje="Parámetros de descarga incompletos",
+            )
+
+        return TicketStatus(
+            ticket=ticket,
+            cod_estado=cod_estado,
+            des_estado=des_estado,
+            status=EstadoTicket.LISTO,
+            mensaje="Reporte listo para descargar",
+            parametros_descarga=parametros,
+        )
+
+    elif cod_estado == "04":  # Error
+        return TicketStatus(
+            ticket=ticket,
+            cod_estado=cod_estado,
+            des_estado=des_estado,
+            status=EstadoTicket.ERROR,
+            mensaje=f"SUNAT reportó error: {des_estado}",
+        )
+
+    else:  # 01, 02, 03, 05 - En proceso
+        return TicketStatus(
+            ticket=ticket,
+            cod_estado=cod_estado,
+            des_estado=des_estado,
+            status=EstadoTicket.PROCESANDO,
+        )
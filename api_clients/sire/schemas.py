@@ -1,12 +1,57 @@
 """
-Esquemas Pydantic para las operaciones del cliente SIRE.
+Representaciones internas de las operaciones del cliente SIRE.
+
+Un barrido de estados puede mantener miles de tickets en memoria, así que
+estas estructuras son dataclasses con __slots__ (sin __dict__ por
+instancia ni validación en cada construcción) y los códigos repetidos se
+comparten: el estado normalizado es un enum y los códigos de SUNAT se
+internan al parsear (ver estados.py).
+
+Son estructuras internas de los clientes y workers: no se exponen por
+HTTP ni tienen un modelo equivalente en api/schemas.py.
 """
 
-from pydantic import BaseModel
+import enum
+from dataclasses import dataclass
 from typing import Optional
 
 
-class TicketStatus(BaseModel):
+class EstadoTicket(str, enum.Enum):
+    """Estado normalizado de un ticket de SUNAT."""
+    PROCESANDO = "PROCESANDO"
+    LISTO = "LISTO"
+    ERROR = "ERROR"
+    SIN_DATOS = "SIN_DATOS"
+
+    def __str__(self) -> str:
+        # Etiquetas de métricas y mensajes con el valor, no "EstadoTicket.X"
+        return self.value
+
+
+@dataclass(slots=True)
+class ParametrosDescarga:
+    """Parámetros de archivoreporte de un ticket terminado."""
+    nom_archivo_reporte: str
+    cod_tipo_archivo_reporte: str
+    cod_libro: str
+    per_tributario: str
+    cod_proceso: str
+    num_ticket: str
+
+    def como_params(self) -> dict:
+        """Query params de archivoreporte con los nombres de SUNAT."""
+        return {
+            "nomArchivoReporte": self.nom_archivo_reporte,
+            "codTipoArchivoReporte": self.cod_tipo_archivo_reporte,
+            "codLibro": self.cod_libro,
+            "perTributario": self.per_tributario,
+            "codProceso": self.cod_proceso,
+            "numTicket": self.num_ticket,
+        }
+
+
+@dataclass(slots=True)
+class TicketStatus:
     """
     Estado de un ticket de descarga consultado en SUNAT.
 
@@ -18,12 +63,13 @@ class TicketStatus(BaseModel):
     ticket: str
     cod_estado: str         # Código real de SUNAT: "01"-"06", "04"=error
     des_estado: str         # Descripción del estado
-    status: str             # Normalizado: "PROCESANDO", "LISTO", "ERROR", "SIN_DATOS"
+    status: EstadoTicket    # Normalizado: PROCESANDO, LISTO, ERROR, SIN_DATOS
     mensaje: Optional[str] = None
-    parametros_descarga: Optional[dict] = None
+    parametros_descarga: Optional[ParametrosDescarga] = None
 
 
-class DownloadResponse(BaseModel):
+@dataclass(slots=True)
+class DownloadResponse:
     """
     Respuesta de una descarga de archivo.
 
@@ -34,4 +80,4 @@ class DownloadResponse(BaseModel):
     contenido: Optional[bytes] = None
     es_vacio: bool = False
     mensaje: Optional[str] = None
-    nom_archivo: Optional[str] = None
\ No newline at end of file
+    nom_archivo: Optional[str] = None
@@ -0,0 +1,114 @@
+"""
+Semáforo distribuido por RUC sobre Redis.
+
+SUNAT rechaza tickets paralelos del mismo contribuyente con el mismo token.
+Este semáforo limita cuántas tareas pueden hablar con SUNAT a la vez para un
+mismo RUC, compartido entre todos los workers de Celery.
+
+Implementación:
+- Un sorted set por RUC (sire:semaforo:{ruc}) cuyos miembros son "leases"
+  (UUID) y cuyo score es el instante de expiración.
+- La adquisición es atómica (script Lua): purga leases vencidos y agrega uno
+  nuevo solo si hay cupo.
+- Los leases expiran solos, así un worker caído no deja el RUC bloqueado.
+
+La adquisición NUNCA espera: si no hay cupo retorna None y la tarea debe
+diferirse (re-encolarse con countdown) para no bloquear al worker.
+"""
+
+import logging
+import random
+import time
+import uuid
+from typing import Optional
+
+from core.config import settings
+from core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] = clave del semáforo
+# ARGV[1] = ahora (ms), ARGV[2] = expiración del lease (ms),
+# ARGV[3] = límite, ARGV[4] = lease, ARGV[5] = TTL de la clave (ms)
+_ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], ARGV[5])
+    return 1
+end
+return 0
+"""
+
+
+class RucConcurrencyLimiter:
+    """
+    Semáforo distribuido que limita la concurrencia hacia SUNAT por RUC.
+
+    Uso::
+
+        limiter = RucConcurrencyLimiter()
+        lease = limiter.acquire(ruc)
+        if lease is None:
+            # diferir la tarea
+            ...
+        try:
+            ...
+        finally:
+            limiter.release(ruc, lease)
+    """
+
+    KEY_PREFIX = "sire:semaforo"
+
+    def __init__(self, limit: Optional[int] = None, ttl: Optional[int] = None):
+        self.limit = limit or settings.SIRE_MAX_CONCURRENCIA_POR_RUC
+        self.ttl = ttl or settings.SIRE_SEMAFORO_TTL
+        self._redis = get_redis()
+        self._acquire_script = self._redis.register_script(_ACQUIRE_SCRIPT)
+
+    def _key(self, ruc) -> str:
+        return f"{self.KEY_PREFIX}:{ruc}"
+
+    def acquire(self, ruc, ttl: Optional[int] = None) -> Optional[str]:
+        """
+        Intenta ocupar un cupo del RUC sin esperar.
+
+        Args:
+            ruc: RUC del contribuyente.
+            ttl: Segundos de vida del lease (por defecto SIRE_SEMAFORO_TTL).
+                 Debe cubrir la duración de la tarea que lo usa.
+
+        Returns:
+            str: Identificador del lease, o None si no hay cupo.
+        """
+        ttl = ttl or self.ttl
+        lease = uuid.uuid4().hex
+        ahora_ms = int(time.time() * 1000)
+        obtenido = self._acquire_script(
+            keys=[self._key(ruc)],
+            args=[ahora_ms, ahora_ms + ttl * 1000, self.limit, lease, ttl * 1000],
+        )
+        if not obtenido:
+            logger.debug("Semáforo RUC %s sin cupo (límite %d)", ruc, self.limit)
+            return None
+
+        logger.debug("Semáforo RUC %s: lease %s adquirido", ruc, lease)
+        return lease
+
+    def release(self, ruc, lease: Optional[str]):
+        """Libera un lease. Es idempotente."""
+        if lease:
+            self._redis.zrem(self._key(ruc), lease)
+            logger.debug("Semáforo RUC %s: lease %s liberado", ruc, lease)
+
+
+def calcular_espera_diferimiento(diferimientos: int) -> int:
+    """
+    Segundos a esperar antes de re-encolar una tarea diferida.
+
+    Backoff exponencial acotado por SIRE_SEMAFORO_ESPERA_MAX con jitter,
+    para que las tareas de un mismo RUC no se despierten todas juntas.
+    """
+    base = settings.SIRE_SEMAFORO_ESPERA_BASE * (2 ** min(diferimientos, 6))
+    espera = min(base, settings.SIRE_SEMAFORO_ESPERA_MAX)
+    return max(1, int(random.uniform(espera / 2, espera)))
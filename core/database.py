@@ -14,6 +14,15 @@ SessionSync = sessionmaker(bind=engine_sync)
 
 # Motor asíncrono (para FastAPI) - lazy, solo se crea si se necesita
 _async_engine = None
+_async_sessionmaker = None
+
+
+def _async_url(url: str) -> str:
+    """Convierte la URL de PostgreSQL al driver asyncpg."""
+    for prefijo in ("postgresql+psycopg2://", "postgresql+psycopg://", "postgresql://"):
+        if url.startswith(prefijo):
+            return "postgresql+asyncpg://" + url[len(prefijo):]
+    return url
 
 
 def _get_async_engine():
@@ -22,18 +31,43 @@ def _get_async_engine():
     if _async_engine is None:
         from sqlalchemy.ext.asyncio import create_async_engine
 
-        async_url = settings.DATABASE_URL.replace(
-            "postgresql://", "postgresql+asyncpg://"
-        )
         _async_engine = create_async_engine(
-            async_url,
+            _async_url(settings.DATABASE_URL),
             pool_pre_ping=True,
-            pool_size=5,
-            max_overflow=10,
+            pool_size=settings.DB_ASYNC_POOL_SIZE,
+            max_overflow=settings.DB_ASYNC_MAX_OVERFLOW,
+            pool_timeout=settings.DB_ASYNC_POOL_TIMEOUT,
         )
     return _async_engine
 
 
+def get_async_sessionmaker():
+    """
+    Fábrica de sesiones asíncronas compartida por todo el proceso.
+
+    expire_on_commit=False: tras el commit los atributos siguen disponibles
+    sin otra ida a la BD (en async no hay lazy loading implícito).
+    """
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_sessionmaker = async_sessionmaker(
+            bind=_get_async_engine(),
+            expire_on_commit=False,
+        )
+    return _async_sessionmaker
+
+
+async def dispose_async_engine():
+    """Cierra el pool asíncrono (shutdown de FastAPI)."""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_sessionmaker = None
+
+
 def get_session_sync():
     """Generador de sesión síncrona. Ideal para workers de Celery."""
     session = SessionSync()
@@ -45,10 +79,5 @@ def get_session_sync():
 
 async def get_session_async():
     """Generador de sesión asíncrona. Ideal para endpoints FastAPI."""
-    from sqlalchemy.ext.asyncio import AsyncSession
-    from sqlalchemy.orm import sessionmaker
-
-    engine = _get_async_engine()
-    async_session = sessionmaker(bind=engine, class_=AsyncSession)
-    async with async_session() as session:
+    async with get_async_sessionmaker()() as session:
         yield session
@@ -0,0 +1,242 @@
+"""
+Cambios de estado de las operaciones SIRE vía Redis pub/sub.
+
+Cada vez que una operación cambia de estado (workers._actualizar_estado y
+las actualizaciones en bloque del backfill) se publica un mensaje en el
+canal de la operación. Los endpoints de long-poll y SSE de la API esperan
+ese mensaje en lugar de consultar la BD en bucle.
+
+Cada proceso de la API tiene un único suscriptor (DifusorEventos) con su
+propia conexión Redis, suscrito a todos los canales de operación, que
+reparte los mensajes a colas asyncio en memoria. Así los clientes
+abiertos no ocupan conexiones del pool de comandos ni de /health. Si
+Redis no responde o se supera EVENTOS_MAX_SUSCRIPCIONES, la suscripción
+levanta EventosNoDisponiblesError (la API responde 503).
+
+La publicación es best-effort: si Redis falla, la BD sigue siendo la fuente
+de verdad y los clientes lo verán en la siguiente consulta.
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+import redis
+
+from core.config import settings
+from core.redis_client import get_redis, get_redis_pubsub
+
+logger = logging.getLogger(__name__)
+
+CANAL_PREFIX = "sire:operacion"
+
+
+def canal_operacion(operacion_id: int) -> str:
+    """Canal pub/sub de una operación."""
+    return f"{CANAL_PREFIX}:{operacion_id}"
+
+
+def publicar_cambio_estado(
+    operacion_ids: Iterable[int],
+    estado: str,
+    ticket: Optional[str] = None,
+    s3_url: Optional[str] = None,
+):
+    """
+    Publica el nuevo estado de una o varias operaciones (síncrono, workers).
+
+    Args:
+        operacion_ids: IDs de las operaciones actualizadas.
+        estado: Nuevo estado (valor de EstadoOperacion).
+        ticket: Ticket SUNAT, si cambió.
+        s3_url: URL del archivo, si cambió.
+    """
+    ids = list(operacion_ids)
+    if not ids:
+        return
+
+    momento = datetime.now(timezone.utc).isoformat()
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for operacion_id in ids:
+            mensaje = {"id": operacion_id, "estado": estado, "timestamp": momento}
+            if ticket is not None:
+                mensaje["ticket"] = ticket
+            if s3_url is not None:
+                mensaje["s3_url"] = s3_url
+            pipe.publish(canal_operacion(operacion_id), json.dumps(mensaje))
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("No se pudo publicar cambio de estado %s: %s", ids, e)
+
+
+class EventosNoDisponiblesError(Exception):
+    """No se puede abrir una suscripción (Redis caído o sin cupo)."""
+
+    def __init__(self, motivo: str, retry_after: int = 5):
+        self.retry_after = retry_after
+        super().__init__(motivo)
+
+
+class DifusorEventos:
+    """
+    Suscriptor pub/sub compartido por todo el proceso.
+
+    Una tarea de fondo escucha sire:operacion:* y deja cada mensaje en las
+    colas registradas para esa operación. Las colas guardan solo el último
+    aviso pendiente: quien espera vuelve a leer la BD, así que varios
+    cambios seguidos se pueden fusionar en uno.
+    """
+
+    ESPERA_CONEXION = 5      # segundos que una suscripción espera al suscriptor
+    REINTENTO_MAX = 30       # tope del backoff de reconexión
+
+    def __init__(self, max_suscripciones: int):
+        self.max_suscripciones = max_suscripciones
+        self._colas: dict = {}
+        self._total = 0
+        self._conectado = asyncio.Event()
+        self._tarea: Optional[asyncio.Task] = None
+        self.loop = asyncio.get_running_loop()
+
+    def iniciar(self):
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._escuchar())
+
+    async def cerrar(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+        self._tarea = None
+
+    async def registrar(self, operacion_id: int) -> asyncio.Queue:
+        """
+        Registra una cola para la operación, ya suscrita en Redis.
+
+        Raises:
+            EventosNoDisponiblesError: Sin cupo o sin conexión a Redis.
+        """
+        if self._total >= self.max_suscripciones:
+            raise EventosNoDisponiblesError(
+                f"Se alcanzó el máximo de {self.max_suscripciones} suscripciones"
+            )
+        self.iniciar()
+        try:
+            await asyncio.wait_for(self._conectado.wait(), self.ESPERA_CONEXION)
+        except asyncio.TimeoutError:
+            raise EventosNoDisponiblesError("Redis pub/sub no disponible") from None
+
+        cola = asyncio.Queue(maxsize=1)
+        self._colas.setdefault(operacion_id, set()).add(cola)
+        self._total += 1
+        return cola
+
+    def liberar(self, operacion_id: int, cola: asyncio.Queue):
+        colas = self._colas.get(operacion_id)
+        if colas is None or cola not in colas:
+            return
+        colas.discard(cola)
+        self._total -= 1
+        if not colas:
+            del self._colas[operacion_id]
+
+    def _entregar(self, colas, mensaje: dict):
+        for cola in colas:
+            try:
+                cola.put_nowait(mensaje)
+            except asyncio.QueueFull:
+                pass  # ya tiene un aviso pendiente
+
+    async def _escuchar(self):
+        espera = 1
+        patron = f"{CANAL_PREFIX}:*"
+        while True:
+            pubsub = get_redis_pubsub().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(patron)
+                self._conectado.set()
+                espera = 1
+                # Lo publicado mientras no había suscripción se perdió:
+                # se avisa a todos para que vuelvan a leer la BD.
+                for colas in list(self._colas.values()):
+                    self._entregar(colas, {})
+
+                async for mensaje in pubsub.listen():
+                    if mensaje.get("type") != "pmessage":
+                        continue
+                    try:
+                        operacion_id = int(mensaje["channel"].rsplit(":", 1)[1])
+                        datos = json.loads(mensaje["data"])
+                    except (TypeError, ValueError, IndexError):
+                        continue
+                    colas = self._colas.get(operacion_id)
+                    if colas:
+                        self._entregar(colas, datos)
+            except Exception as e:
+                self._conectado.clear()
+                logger.warning("Suscriptor de eventos sin Redis (%s); reintento en %ds", e, espera)
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, self.REINTENTO_MAX)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except redis.RedisError:
+                    pass
+
+
+_difusor: Optional[DifusorEventos] = None
+
+
+def get_difusor() -> DifusorEventos:
+    """Retorna el suscriptor compartido del event loop actual."""
+    global _difusor
+    if _difusor is None or _difusor.loop is not asyncio.get_running_loop():
+        _difusor = DifusorEventos(settings.EVENTOS_MAX_SUSCRIPCIONES)
+    return _difusor
+
+
+async def cerrar_difusor():
+    """Detiene el suscriptor compartido (shutdown de FastAPI)."""
+    global _difusor
+    if _difusor is not None:
+        await _difusor.cerrar()
+    _difusor = None
+
+
+@asynccontextmanager
+async def suscripcion_operacion(operacion_id: int):
+    """
+    Suscripción async a los cambios de una operación.
+
+    Suscribirse ANTES de leer el estado en BD evita perder un cambio que
+    ocurra entre la lectura y la espera.
+
+    Raises:
+        EventosNoDisponiblesError: Si no se puede suscribir.
+    """
+    difusor = get_difusor()
+    cola = await difusor.registrar(operacion_id)
+    try:
+        yield cola
+    finally:
+        difusor.liberar(operacion_id, cola)
+
+
+async def siguiente_cambio(cola: asyncio.Queue, timeout: float) -> Optional[dict]:
+    """
+    Espera el siguiente aviso de la suscripción.
+
+    Returns:
+        dict: El mensaje publicado ({} si hay que volver a leer la BD tras
+        una reconexión), o None si venció el timeout.
+    """
+    try:
+        return await asyncio.wait_for(cola.get(), timeout)
+    except asyncio.TimeoutError:
+        return None
@@ -3,6 +3,11 @@ Inicialización de la base de datos.
 
 Crea el schema y tablas necesarias si no existen.
 Se ejecuta al arrancar la aplicación FastAPI.
+
+driver.sire_operaciones y driver.sire_operacion_eventos están particionadas
+por mes (ver core/particiones.py). Si sire_operaciones existe todavía como
+tabla simple (versiones anteriores), se migra a la tabla particionada y su
+columna log se convierte en un evento por operación.
 """
 
 import logging
@@ -10,13 +15,140 @@ import logging
 from sqlalchemy import text
 
 from core.database import engine_sync
+from core.particiones import asegurar_particiones
 
 logger = logging.getLogger(__name__)
 
+_DDL_SECUENCIA_OPERACIONES = """
+    CREATE SEQUENCE IF NOT EXISTS driver.sire_operaciones_id_seq
+"""
+
+_DDL_OPERACIONES = """
+    CREATE TABLE IF NOT EXISTS driver.sire_operaciones (
+        id INTEGER NOT NULL DEFAULT nextval('driver.sire_operaciones_id_seq'),
+        ruc BIGINT NOT NULL,
+        periodo VARCHAR(6) NOT NULL,
+        tipo_operacion VARCHAR(50) NOT NULL,
+        ticket VARCHAR(100),
+        s3_url VARCHAR(500),
+        digest VARCHAR(64),
+        backfill_id INTEGER,
+        estado VARCHAR(20) DEFAULT 'PENDING',
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        updated_at TIMESTAMPTZ,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at)
+"""
+
+_DDL_EVENTOS = """
+    CREATE TABLE IF NOT EXISTS driver.sire_operacion_eventos (
+        id BIGSERIAL,
+        operacion_id INTEGER NOT NULL,
+        estado VARCHAR(20) NOT NULL,
+        mensaje TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at)
+"""
+
+# Índices sobre las tablas padre: PostgreSQL los crea en cada partición
+_INDICES = (
+    # Filtros y paginación de GET /api/v1/sire/operaciones (cubre también
+    # las búsquedas solo por ruc)
+    """
+    CREATE INDEX IF NOT EXISTS idx_sire_operaciones_ruc_periodo_tipo
+    ON driver.sire_operaciones(ruc, periodo, tipo_operacion, created_at)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_sire_operaciones_estado_updated
+    ON driver.sire_operaciones(estado, updated_at)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_sire_operaciones_backfill_id
+    ON driver.sire_operaciones(backfill_id)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_sire_operacion_eventos_operacion
+    ON driver.sire_operacion_eventos(operacion_id, created_at)
+    """,
+)
+
+
+def _tipo_tabla_operaciones(conn) -> str:
+    """
+    Retorna 'r' (tabla simple), 'p' (particionada) o '' (no existe) para
+    driver.sire_operaciones.
+    """
+    return conn.execute(
+        text("""
+            SELECT c.relkind
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'driver' AND c.relname = 'sire_operaciones'
+        """)
+    ).scalar() or ""
+
+
+def _migrar_operaciones_a_particionada(conn):
+    """
+    Migra la tabla simple driver.sire_operaciones a la versión particionada
+    conservando ids y secuencia. El log de cada operación pasa a ser su
+    primer evento. Todo ocurre en la transacción de conn.
+    """
+    logger.warning("Migrando driver.sire_operaciones a tabla particionada...")
+
+    conn.execute(text("""
+        ALTER TABLE driver.sire_operaciones
+            ADD COLUMN IF NOT EXISTS digest VARCHAR(64),
+            ADD COLUMN IF NOT EXISTS backfill_id INTEGER
+    """))
+    conn.execute(text("ALTER TABLE driver.sire_operaciones RENAME TO sire_operaciones_heap"))
+    conn.execute(text("ALTER INDEX driver.sire_operaciones_pkey RENAME TO sire_operaciones_heap_pkey"))
+    for indice in (
+        "idx_sire_operaciones_ruc",
+        "idx_sire_operaciones_backfill_id",
+        "idx_sire_operaciones_ruc_periodo_tipo",
+        "idx_sire_operaciones_estado_updated",
+    ):
+        conn.execute(text(f"DROP INDEX IF EXISTS driver.{indice}"))
+    # La secuencia del SERIAL sobrevive a la tabla anterior
+    conn.execute(text("ALTER SEQUENCE driver.sire_operaciones_id_seq OWNED BY NONE"))
+
+    conn.execute(text(_DDL_OPERACIONES))
+    conn.execute(text(_DDL_EVENTOS))
+
+    desde = conn.execute(
+        text("SELECT MIN(COALESCE(created_at, NOW())) FROM driver.sire_operaciones_heap")
+    ).scalar()
+    asegurar_particiones(conn, desde=desde.date() if desde else None)
+
+    migradas = conn.execute(text("""
+        INSERT INTO driver.sire_operaciones (
+            id, ruc, periodo, tipo_operacion, ticket, s3_url, digest,
+            backfill_id, estado, created_at, updated_at
+        )
+        SELECT id, ruc, periodo, tipo_operacion, ticket, s3_url, digest,
+               backfill_id, COALESCE(estado, 'PENDING'),
+               COALESCE(created_at, NOW()), updated_at
+        FROM driver.sire_operaciones_heap
+    """)).rowcount
+    conn.execute(text("""
+        INSERT INTO driver.sire_operacion_eventos (operacion_id, estado, mensaje, created_at)
+        SELECT id, COALESCE(estado, 'PENDING'), log,
+               COALESCE(updated_at, created_at, NOW())
+        FROM driver.sire_operaciones_heap
+        WHERE log IS NOT NULL
+    """))
+
+    conn.execute(text("DROP TABLE driver.sire_operaciones_heap"))
+    logger.warning("Migración completada: %d operaciones.", migradas)
+
 
 def init_database():
     """
-    Crea el schema 'driver' y la tabla 'sire_operaciones' si no existen.
+    Crea el schema 'driver', las tablas particionadas 'sire_operaciones' y
+    'sire_operacion_eventos' con sus particiones próximas, y 'sire_backfills'
+    si no existen.
     Esta operación es idempotente (se puede ejecutar múltiples veces sin efectos
     secundarios).
     """
@@ -29,17 +161,40 @@ def init_database():
 
         logger.info("Schema 'driver' verificado/creado.")
 
-        # Crear tabla driver.sire_operaciones si no existe
+        # Tablas particionadas de operaciones y eventos
+        conn.execute(text(_DDL_SECUENCIA_OPERACIONES))
+        if _tipo_tabla_operaciones(conn) == "r":
+            _migrar_operaciones_a_particionada(conn)
+        else:
+            conn.execute(text(_DDL_OPERACIONES))
+            conn.execute(text(_DDL_EVENTOS))
+        conn.execute(
+            text("ALTER SEQUENCE driver.sire_operaciones_id_seq OWNED BY driver.sire_operaciones.id")
+        )
+        asegurar_particiones(conn)
+        for ddl in _INDICES:
+            conn.execute(text(ddl))
+        conn.commit()
+
+        logger.info(
+            "Tablas 'driver.sire_operaciones' y 'driver.sire_operacion_eventos' "
+            "verificadas/creadas."
+        )
+
+        # Crear tabla driver.sire_backfills si no existe
         conn.execute(
             text("""
-                CREATE TABLE IF NOT EXISTS driver.sire_operaciones (
+                CREATE TABLE IF NOT EXISTS driver.sire_backfills (
                     id SERIAL PRIMARY KEY,
-                    ruc BIGINT NOT NULL,
-                    periodo VARCHAR(6) NOT NULL,
-                    tipo_operacion VARCHAR(50) NOT NULL,
-                    ticket VARCHAR(100),
-                    s3_url VARCHAR(500),
+                    rucs TEXT NOT NULL,
+                    periodo_inicio VARCHAR(6) NOT NULL,
+                    periodo_fin VARCHAR(6) NOT NULL,
+                    tipos VARCHAR(50) NOT NULL,
+                    webhook_url VARCHAR(500),
+                    forzar BOOLEAN DEFAULT FALSE,
                     estado VARCHAR(20) DEFAULT 'PENDING',
+                    total_operaciones INTEGER DEFAULT 0,
+                    omitidas INTEGER DEFAULT 0,
                     log TEXT,
                     created_at TIMESTAMPTZ DEFAULT NOW(),
                     updated_at TIMESTAMPTZ
@@ -48,13 +203,4 @@ def init_database():
         )
         conn.commit()
 
-        # Crear índice si no existe
-        conn.execute(
-            text("""
-                CREATE INDEX IF NOT EXISTS idx_sire_operaciones_ruc
-                ON driver.sire_operaciones(ruc)
-            """)
-        )
-        conn.commit()
-
-        logger.info("Tabla 'driver.sire_operaciones' verificada/creada.")
\ No newline at end of file
+        logger.info("Tabla 'driver.sire_backfills' verificada/creada.")
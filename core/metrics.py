@@ -0,0 +1,202 @@
+"""
+Métricas Prometheus del pipeline SIRE.
+
+Todas las métricas se declaran aquí para que los módulos instrumentados solo
+importen el objeto y lo actualicen. Se exponen:
+
+- En la API FastAPI: GET /metrics (ver api/main.py).
+- En los workers de Celery: servidor HTTP propio en METRICS_WORKER_PORT,
+  iniciado desde workers/celery_app.py.
+
+Con varios procesos (prefork de Celery, uvicorn --workers N) se debe definir
+PROMETHEUS_MULTIPROC_DIR para que las métricas de todos los procesos se
+agreguen en una sola exposición.
+"""
+
+import logging
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+
+logger = logging.getLogger(__name__)
+
+_BUCKETS_SUNAT = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 30, 60)
+_BUCKETS_RAPIDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+# ---------------------------------------------------------------------------
+# Llamadas HTTP a SUNAT
+# ---------------------------------------------------------------------------
+SUNAT_LATENCIA = Histogram(
+    "sunat_request_duration_seconds",
+    "Latencia de las llamadas HTTP a SUNAT por endpoint",
+    ["endpoint", "status"],
+    buckets=_BUCKETS_SUNAT,
+)
+SUNAT_REFRESCOS_TOKEN = Counter(
+    "sunat_token_refresh_total",
+    "Tokens refrescados tras recibir 401 de SUNAT",
+)
+SUNAT_TOKEN_CACHE = Counter(
+    "sunat_token_cache_total",
+    "Consultas a la caché Redis de tokens por resultado (hit/miss)",
+    ["resultado"],
+)
+
+# ---------------------------------------------------------------------------
+# Reintentos contra SUNAT
+# ---------------------------------------------------------------------------
+SUNAT_REINTENTOS = Counter(
+    "sunat_reintentos_total",
+    "Reintentos realizados contra SUNAT",
+    ["familia", "motivo"],
+)
+SUNAT_REINTENTOS_DENEGADOS = Counter(
+    "sunat_reintentos_denegados_total",
+    "Reintentos que la política no autorizó (max_intentos, flota, presupuesto)",
+    ["familia", "causa"],
+)
+SUNAT_HEDGES = Counter(
+    "sunat_hedges_total",
+    "Solicitudes cubiertas (hedged) lanzadas y cuál respondió primero",
+    ["familia", "ganador"],
+)
+
+# ---------------------------------------------------------------------------
+# Ciclo de vida de los tickets
+# ---------------------------------------------------------------------------
+SIRE_POLLS_POR_TICKET = Histogram(
+    "sire_polls_per_ticket",
+    "Consultas de estado necesarias hasta que el ticket termina",
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30),
+)
+SIRE_TIEMPO_HASTA_LISTO = Histogram(
+    "sire_ticket_time_to_ready_seconds",
+    "Tiempo desde que se obtiene el ticket hasta que SUNAT lo termina",
+    ["resultado"],
+    buckets=(30, 60, 90, 120, 180, 240, 300, 450, 600, 900, 1800),
+)
+SIRE_DESCARGA_BYTES = Counter(
+    "sire_download_bytes_total",
+    "Bytes descargados de archivoreporte",
+)
+SIRE_DESCARGA_THROUGHPUT = Histogram(
+    "sire_download_throughput_bytes_per_second",
+    "Throughput de las descargas de archivoreporte",
+    buckets=(1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7),
+)
+SIRE_PROPUESTAS_CACHE = Counter(
+    "sire_propuestas_cache_total",
+    "Consultas a la caché local de propuestas por resultado (hit_disco/hit_s3/miss)",
+    ["resultado"],
+)
+SIRE_PROPUESTAS_CACHE_BYTES = Gauge(
+    "sire_propuestas_cache_bytes",
+    "Bytes en disco de la caché local de propuestas",
+    multiprocess_mode="max",
+)
+
+# ---------------------------------------------------------------------------
+# Dependencias: S3, base de datos y webhook
+# ---------------------------------------------------------------------------
+S3_SUBIDA_LATENCIA = Histogram(
+    "s3_upload_duration_seconds",
+    "Latencia de put_object en S3",
+    ["resultado"],
+    buckets=_BUCKETS_SUNAT,
+)
+DB_ESCRITURA_LATENCIA = Histogram(
+    "db_write_duration_seconds",
+    "Latencia de escrituras en driver.sire_operaciones",
+    ["operacion"],
+    buckets=_BUCKETS_RAPIDOS,
+)
+WEBHOOK_LATENCIA = Histogram(
+    "webhook_duration_seconds",
+    "Latencia de las notificaciones al orquestador",
+    ["resultado"],
+    buckets=_BUCKETS_SUNAT,
+)
+
+# ---------------------------------------------------------------------------
+# Procesos de los workers
+# ---------------------------------------------------------------------------
+# En modo multiproceso process_resident_memory_bytes no se exporta; el pico
+# de RSS de cada hijo del prefork se publica aquí y se agrega con max.
+WORKER_RSS_PICO = Gauge(
+    "worker_peak_rss_bytes",
+    "Pico de memoria residente de los procesos del worker",
+    multiprocess_mode="max",
+)
+
+
+def registrar_rss_pico():
+    """Actualiza WORKER_RSS_PICO con el pico de RSS del proceso actual."""
+    # ru_maxrss está en KiB en Linux
+    WORKER_RSS_PICO.set(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+@contextmanager
+def medir(histograma, **labels):
+    """
+    Observa en el histograma la duración del bloque.
+
+    Uso::
+
+        with medir(DB_ESCRITURA_LATENCIA, operacion="actualizar_estado"):
+            session.execute(stmt)
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observado = histograma.labels(**labels) if labels else histograma
+        observado.observe(time.perf_counter() - inicio)
+
+
+# ---------------------------------------------------------------------------
+# Exposición
+# ---------------------------------------------------------------------------
+def _registry() -> CollectorRegistry:
+    """
+    Registry a exponer. En modo multiproceso agrega las métricas de todos
+    los procesos desde PROMETHEUS_MULTIPROC_DIR.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+
+    from prometheus_client import REGISTRY
+    return REGISTRY
+
+
+def generar_metricas() -> tuple:
+    """Retorna (contenido, content_type) para un endpoint /metrics."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def iniciar_exportador(puerto: int):
+    """Inicia un servidor HTTP que expone las métricas (workers de Celery)."""
+    start_http_server(puerto, registry=_registry())
+    logger.info("Exportador de métricas Prometheus escuchando en :%d", puerto)
+
+
+def marcar_proceso_terminado(pid: int):
+    """Limpia los archivos de métricas de un proceso hijo que terminó."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
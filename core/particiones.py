@@ -0,0 +1,184 @@
+"""
+Particionado mensual y retención de las tablas de operaciones SIRE.
+
+driver.sire_operaciones y driver.sire_operacion_eventos están particionadas
+por rango de created_at, una partición por mes (driver.<tabla>_pAAAAMM):
+
+- asegurar_particiones: crea las particiones del mes actual y de los
+  SIRE_PARTICIONES_ADELANTE meses siguientes. Lo ejecutan init_db al
+  arrancar y la tarea diaria workers.mantenimiento.
+- aplicar_retencion: las particiones con más de SIRE_RETENCION_MESES meses
+  se archivan en S3 (CSV gzip, si SIRE_ARCHIVAR_PARTICIONES) y se eliminan
+  con DETACH + DROP, sin DELETE masivos ni VACUUM posteriores.
+
+Con la retención el número de particiones queda acotado, así que las
+consultas y UPDATE por id no se degradan a medida que crece el historial.
+"""
+
+import gzip
+import io
+import logging
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = "driver"
+TABLAS_PARTICIONADAS = ("sire_operaciones", "sire_operacion_eventos")
+
+
+def _sumar_meses(d: date, meses: int) -> date:
+    total = d.year * 12 + d.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def nombre_particion(tabla: str, mes: date) -> str:
+    """Nombre de la partición mensual, ej: sire_operaciones_p202501."""
+    return f"{tabla}_p{mes:%Y%m}"
+
+
+def crear_particion(conn: Connection, tabla: str, mes: date) -> bool:
+    """
+    Crea la partición del mes indicado si no existe.
+
+    Returns:
+        bool: True si se creó.
+    """
+    inicio = date(mes.year, mes.month, 1)
+    fin = _sumar_meses(inicio, 1)
+    nombre = nombre_particion(tabla, inicio)
+
+    existe = conn.execute(
+        text("SELECT to_regclass(:nombre)"),
+        {"nombre": f"{SCHEMA}.{nombre}"},
+    ).scalar()
+    if existe:
+        return False
+
+    conn.execute(
+        text(
+            f"CREATE TABLE {SCHEMA}.{nombre} PARTITION OF {SCHEMA}.{tabla} "
+            f"FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fin.isoformat()}')"
+        )
+    )
+    logger.info("Partición %s.%s creada", SCHEMA, nombre)
+    return True
+
+
+def asegurar_particiones(
+    conn: Connection,
+    desde: Optional[date] = None,
+    meses_adelante: Optional[int] = None,
+) -> int:
+    """
+    Crea las particiones faltantes desde 'desde' (por defecto el mes actual)
+    hasta SIRE_PARTICIONES_ADELANTE meses después, para ambas tablas.
+
+    Returns:
+        int: Cantidad de particiones creadas.
+    """
+    if meses_adelante is None:
+        meses_adelante = settings.SIRE_PARTICIONES_ADELANTE
+    hoy = date.today().replace(day=1)
+    mes = (desde or hoy).replace(day=1)
+    hasta = _sumar_meses(hoy, meses_adelante)
+
+    creadas = 0
+    while mes <= hasta:
+        for tabla in TABLAS_PARTICIONADAS:
+            creadas += crear_particion(conn, tabla, mes)
+        mes = _sumar_meses(mes, 1)
+    return creadas
+
+
+def listar_particiones(conn: Connection, tabla: str) -> list:
+    """
+    Particiones mensuales de una tabla, de la más antigua a la más reciente.
+
+    Returns:
+        list[tuple[str, date]]: (nombre, primer día del mes).
+    """
+    filas = conn.execute(
+        text("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            JOIN pg_namespace n ON n.oid = p.relnamespace
+            WHERE n.nspname = :schema AND p.relname = :tabla
+        """),
+        {"schema": SCHEMA, "tabla": tabla},
+    ).scalars().all()
+
+    prefijo = f"{tabla}_p"
+    particiones = []
+    for nombre in filas:
+        sufijo = nombre[len(prefijo):]
+        if nombre.startswith(prefijo) and len(sufijo) == 6 and sufijo.isdigit():
+            particiones.append((nombre, date(int(sufijo[:4]), int(sufijo[4:]), 1)))
+    return sorted(particiones, key=lambda p: p[1])
+
+
+def _archivar_particion(conn: Connection, tabla: str, nombre: str) -> str:
+    """Exporta la partición a S3 como CSV gzip y retorna la URI."""
+    from core.storage import S3StorageManager
+
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb") as gz:
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {SCHEMA}.{nombre} TO STDOUT WITH (FORMAT csv, HEADER true)",
+                gz,
+            )
+        finally:
+            cursor.close()
+
+    return S3StorageManager().upload_file_bytes(
+        buffer.getvalue(), f"archivo/{tabla}/{nombre}.csv.gz"
+    )
+
+
+def aplicar_retencion(
+    conn: Connection,
+    meses: Optional[int] = None,
+    archivar: Optional[bool] = None,
+) -> list:
+    """
+    Archiva y elimina las particiones anteriores a la ventana de retención.
+
+    Args:
+        conn: Conexión en una transacción (la elimina solo si el archivo
+              se subió correctamente).
+        meses: Meses a conservar (SIRE_RETENCION_MESES; 0 = sin retención).
+        archivar: Si exportar a S3 antes de eliminar (SIRE_ARCHIVAR_PARTICIONES).
+
+    Returns:
+        list[str]: Particiones eliminadas.
+    """
+    meses = settings.SIRE_RETENCION_MESES if meses is None else meses
+    archivar = settings.SIRE_ARCHIVAR_PARTICIONES if archivar is None else archivar
+    if meses <= 0:
+        return []
+
+    limite = _sumar_meses(date.today().replace(day=1), -meses)
+    eliminadas = []
+
+    for tabla in TABLAS_PARTICIONADAS:
+        for nombre, mes in listar_particiones(conn, tabla):
+            if mes >= limite:
+                break
+            if archivar:
+                uri = _archivar_particion(conn, tabla, nombre)
+                logger.info("Partición %s archivada en %s", nombre, uri)
+            conn.execute(text(f"ALTER TABLE {SCHEMA}.{tabla} DETACH PARTITION {SCHEMA}.{nombre}"))
+            conn.execute(text(f"DROP TABLE {SCHEMA}.{nombre}"))
+            eliminadas.append(nombre)
+            logger.info("Partición %s eliminada por retención (%d meses)", nombre, meses)
+
+    return eliminadas
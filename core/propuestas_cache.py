@@ -0,0 +1,300 @@
+"""
+Caché local en disco de las propuestas SIRE descargadas (ZIP).
+
+Cada host (workers de Celery y el paquete legacy driver_sunat) guarda los
+ZIP que descarga en SIRE_CACHE_DIR, con un índice SQLite en el mismo
+directorio. La clave es (ruc, periodo, tipo, digest); el digest es el
+SHA-256 del ZIP.
+
+- Frescura: obtener() solo devuelve entradas guardadas hace menos de
+  SIRE_CACHE_FRESCURA segundos. Dentro de esa ventana, volver a pedir la
+  misma propuesta no toca SUNAT.
+- Dos niveles: si el archivo sigue en disco se sirve de ahí; si fue
+  desalojado pero se conoce su URL de S3 (unparsed/), se sirve esa URL.
+- LRU por tamaño: al superar SIRE_CACHE_MAX_BYTES se borran los archivos
+  menos usados recientemente. El índice conserva la URL de S3 hasta que la
+  entrada deja de estar fresca.
+
+Los aciertos y fallos se cuentan en SIRE_PROPUESTAS_CACHE (core/metrics.py).
+
+El índice se abre por operación (varios procesos del prefork y varios
+hilos comparten el directorio) y los archivos se escriben con un
+temporal + os.replace, así que un lector nunca ve un ZIP a medias.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from core.config import settings
+from core.metrics import SIRE_PROPUESTAS_CACHE, SIRE_PROPUESTAS_CACHE_BYTES
+
+logger = logging.getLogger(__name__)
+
+INDICE = "indice.db"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS propuestas (
+    ruc TEXT NOT NULL,
+    periodo TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    nom_archivo TEXT NOT NULL,
+    tamano INTEGER NOT NULL,
+    en_disco INTEGER NOT NULL DEFAULT 1,
+    s3_url TEXT,
+    creado REAL NOT NULL,
+    ultimo_acceso REAL NOT NULL,
+    PRIMARY KEY (ruc, periodo, tipo, digest)
+);
+CREATE INDEX IF NOT EXISTS idx_propuestas_lru ON propuestas (en_disco, ultimo_acceso);
+"""
+
+
+@dataclass(frozen=True)
+class PropuestaEnCache:
+    """Propuesta servida por la caché. `ruta` es None si solo queda en S3."""
+    ruc: str
+    periodo: str
+    tipo: str
+    digest: str
+    nom_archivo: str
+    tamano: int
+    ruta: Optional[str] = None
+    s3_url: Optional[str] = None
+
+    def leer(self) -> bytes:
+        with open(self.ruta, "rb") as f:
+            return f.read()
+
+    def copiar_a(self, destino: str) -> str:
+        """Publica el archivo en `destino` (hardlink si se puede) de forma atómica."""
+        _enlazar_o_copiar(self.ruta, destino)
+        return destino
+
+
+def _enlazar_o_copiar(origen: str, destino: str):
+    directorio = os.path.dirname(destino) or "."
+    fd, temporal = tempfile.mkstemp(dir=directorio, prefix=".", suffix=".part")
+    os.close(fd)
+    try:
+        os.remove(temporal)
+        try:
+            os.link(origen, temporal)
+        except OSError:
+            # Otro sistema de archivos o sin soporte de hardlinks
+            shutil.copyfile(origen, temporal)
+        os.replace(temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _escribir(contenido: bytes, directorio: str, destino: str):
+    """Escribe `contenido` en un temporal y lo publica en `destino` de forma atómica."""
+    fd, temporal = tempfile.mkstemp(dir=directorio, prefix=".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenido)
+        os.replace(temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+class PropuestasCache:
+    """Caché LRU acotada de propuestas SIRE en un directorio local."""
+
+    def __init__(self, directorio: str, max_bytes: int, frescura: float):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.frescura = frescura
+        os.makedirs(directorio, exist_ok=True)
+        with closing(self._conectar()) as conn, conn:
+            conn.executescript(_ESQUEMA)
+
+    def _conectar(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(os.path.join(self.directorio, INDICE), timeout=5)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _ruta(self, ruc: str, periodo: str, tipo: str, digest: str) -> str:
+        return os.path.join(self.directorio, f"{ruc}_{periodo}_{tipo}_{digest}.zip")
+
+    def obtener(
+        self, ruc: str, periodo: str, tipo: str, incluir_s3: bool = True
+    ) -> Optional[PropuestaEnCache]:
+        """
+        Última propuesta fresca de RUC/período/tipo, o None.
+
+        Cuenta un acierto de disco, un acierto de S3 o un fallo. Con
+        incluir_s3=False (consumidores sin acceso a S3) una entrada que solo
+        queda en S3 cuenta como fallo.
+        """
+        ahora = time.time()
+        with closing(self._conectar()) as conn, conn:
+            fila = conn.execute(
+                """SELECT * FROM propuestas
+                   WHERE ruc = ? AND periodo = ? AND tipo = ? AND creado >= ?
+                   ORDER BY creado DESC LIMIT 1""",
+                (ruc, periodo, tipo, ahora - self.frescura),
+            ).fetchone()
+            if fila is None:
+                SIRE_PROPUESTAS_CACHE.labels(resultado="miss").inc()
+                return None
+
+            clave = (fila["ruc"], fila["periodo"], fila["tipo"], fila["digest"])
+            ruta = self._ruta(*clave)
+            if fila["en_disco"] and os.path.exists(ruta):
+                conn.execute(
+                    "UPDATE propuestas SET ultimo_acceso = ? "
+                    "WHERE ruc = ? AND periodo = ? AND tipo = ? AND digest = ?",
+                    (ahora, *clave),
+                )
+                SIRE_PROPUESTAS_CACHE.labels(resultado="hit_disco").inc()
+                return self._entrada(fila, ruta)
+
+            if fila["en_disco"]:
+                # Borrado por fuera de la caché
+                conn.execute(
+                    "UPDATE propuestas SET en_disco = 0 "
+                    "WHERE ruc = ? AND periodo = ? AND tipo = ? AND digest = ?",
+                    clave,
+                )
+            if fila["s3_url"] and incluir_s3:
+                SIRE_PROPUESTAS_CACHE.labels(resultado="hit_s3").inc()
+                return self._entrada(fila, None)
+
+        SIRE_PROPUESTAS_CACHE.labels(resultado="miss").inc()
+        return None
+
+    def guardar(
+        self,
+        ruc: str,
+        periodo: str,
+        tipo: str,
+        nom_archivo: str,
+        contenido: Optional[bytes] = None,
+        ruta: Optional[str] = None,
+        digest: Optional[str] = None,
+        s3_url: Optional[str] = None,
+    ) -> PropuestaEnCache:
+        """
+        Guarda una propuesta desde bytes (`contenido`) o desde un archivo ya
+        en disco (`ruta`, se enlaza sin copiar si está en el mismo volumen).
+
+        Args:
+            digest: SHA-256 del ZIP si ya se conoce (evita recalcularlo).
+            s3_url: URL del objeto en S3, si se subió.
+        """
+        if (contenido is None) == (ruta is None):
+            raise ValueError("Indicar contenido o ruta, no ambos")
+        if digest is None:
+            if contenido is not None:
+                digest = hashlib.sha256(contenido).hexdigest()
+            else:
+                with open(ruta, "rb") as f:
+                    digest = hashlib.file_digest(f, "sha256").hexdigest()
+
+        destino = self._ruta(ruc, periodo, tipo, digest)
+        if not os.path.exists(destino):
+            if contenido is not None:
+                _escribir(contenido, self.directorio, destino)
+            else:
+                _enlazar_o_copiar(ruta, destino)
+        tamano = os.path.getsize(destino)
+
+        ahora = time.time()
+        with closing(self._conectar()) as conn, conn:
+            conn.execute(
+                """INSERT INTO propuestas
+                   (ruc, periodo, tipo, digest, nom_archivo, tamano, en_disco, s3_url, creado, ultimo_acceso)
+                   VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?)
+                   ON CONFLICT (ruc, periodo, tipo, digest) DO UPDATE SET
+                       nom_archivo = excluded.nom_archivo,
+                       en_disco = 1,
+                       s3_url = COALESCE(excluded.s3_url, propuestas.s3_url),
+                       creado = excluded.creado,
+                       ultimo_acceso = excluded.ultimo_acceso""",
+                (ruc, periodo, tipo, digest, nom_archivo, tamano, s3_url, ahora, ahora),
+            )
+            self._desalojar(conn, (ruc, periodo, tipo, digest))
+
+        return PropuestaEnCache(ruc, periodo, tipo, digest, nom_archivo, tamano, destino, s3_url)
+
+    def registrar_s3(self, ruc: str, periodo: str, tipo: str, digest: str, s3_url: str):
+        """Asocia la URL de S3 a una entrada (para servirla tras desalojar el archivo)."""
+        with closing(self._conectar()) as conn, conn:
+            conn.execute(
+                "UPDATE propuestas SET s3_url = ? "
+                "WHERE ruc = ? AND periodo = ? AND tipo = ? AND digest = ?",
+                (s3_url, ruc, periodo, tipo, digest),
+            )
+
+    def _desalojar(self, conn: sqlite3.Connection, protegida: tuple):
+        """Borra archivos LRU hasta quedar bajo max_bytes y purga entradas vencidas."""
+        total = conn.execute(
+            "SELECT COALESCE(SUM(tamano), 0) FROM propuestas WHERE en_disco = 1"
+        ).fetchone()[0]
+        if total > self.max_bytes:
+            candidatas = conn.execute(
+                """SELECT ruc, periodo, tipo, digest, tamano FROM propuestas
+                   WHERE en_disco = 1 ORDER BY ultimo_acceso"""
+            )
+            for fila in candidatas.fetchall():
+                if total <= self.max_bytes:
+                    break
+                clave = tuple(fila)[:4]
+                if clave == protegida:
+                    continue
+                try:
+                    os.remove(self._ruta(*clave))
+                except FileNotFoundError:
+                    pass
+                conn.execute(
+                    "UPDATE propuestas SET en_disco = 0 "
+                    "WHERE ruc = ? AND periodo = ? AND tipo = ? AND digest = ?",
+                    clave,
+                )
+                total -= fila["tamano"]
+                logger.debug("Propuesta desalojada de la caché: %s", clave)
+
+        conn.execute(
+            "DELETE FROM propuestas WHERE en_disco = 0 AND creado < ?",
+            (time.time() - self.frescura,),
+        )
+        SIRE_PROPUESTAS_CACHE_BYTES.set(total)
+
+    @staticmethod
+    def _entrada(fila: sqlite3.Row, ruta: Optional[str]) -> PropuestaEnCache:
+        return PropuestaEnCache(
+            ruc=fila["ruc"],
+            periodo=fila["periodo"],
+            tipo=fila["tipo"],
+            digest=fila["digest"],
+            nom_archivo=fila["nom_archivo"],
+            tamano=fila["tamano"],
+            ruta=ruta,
+            s3_url=fila["s3_url"],
+        )
+
+
+@lru_cache(maxsize=None)
+def get_propuestas_cache() -> PropuestasCache:
+    """Caché del proceso configurada con SIRE_CACHE_*."""
+    return PropuestasCache(
+        settings.SIRE_CACHE_DIR,
+        settings.SIRE_CACHE_MAX_BYTES,
+        settings.SIRE_CACHE_FRESCURA,
+    )
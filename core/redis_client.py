@@ -0,0 +1,96 @@
+"""
+Conexión Redis compartida.
+
+Redis se usa como caché de tokens SUNAT, para el semáforo de concurrencia
+por RUC, para publicar los cambios de estado de las operaciones (pub/sub)
+y como broker de Celery. Este módulo centraliza el cliente para que
+todos los componentes reutilicen el mismo pool de conexiones.
+"""
+
+from typing import Optional
+
+import redis
+import redis.asyncio as redis_async
+
+from core.config import settings
+
+# ---------------------------------------------------------------------------
+# Conexión Redis síncrona (funciona tanto en FastAPI como en Celery workers)
+# ---------------------------------------------------------------------------
+_redis_client: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """Obtiene conexión Redis síncrona (singleton)."""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=3,
+        )
+    return _redis_client
+
+
+# ---------------------------------------------------------------------------
+# Conexión Redis asíncrona (endpoints async de FastAPI)
+# ---------------------------------------------------------------------------
+_redis_async_client: Optional[redis_async.Redis] = None
+
+
+def get_redis_async() -> redis_async.Redis:
+    """
+    Obtiene el cliente Redis asíncrono del proceso de la API.
+
+    Usa un pool acotado (REDIS_ASYNC_MAX_CONEXIONES) que espera una conexión
+    libre en lugar de abrir conexiones sin límite bajo carga. Las
+    suscripciones pub/sub (long-poll/SSE) no lo usan: van por
+    get_redis_pubsub().
+    """
+    global _redis_async_client
+    if _redis_async_client is None:
+        pool = redis_async.BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=3,
+            max_connections=settings.REDIS_ASYNC_MAX_CONEXIONES,
+            timeout=5,
+            health_check_interval=30,
+        )
+        _redis_async_client = redis_async.Redis(connection_pool=pool)
+    return _redis_async_client
+
+
+# ---------------------------------------------------------------------------
+# Conexión pub/sub de la API (un solo suscriptor por proceso, core/eventos.py)
+# ---------------------------------------------------------------------------
+_redis_pubsub_client: Optional[redis_async.Redis] = None
+
+
+def get_redis_pubsub() -> redis_async.Redis:
+    """
+    Cliente Redis asíncrono reservado al suscriptor pub/sub del proceso.
+
+    Va aparte de get_redis_async(): la suscripción ocupa su conexión todo
+    el tiempo y no debe competir con los comandos ni con /health.
+    """
+    global _redis_pubsub_client
+    if _redis_pubsub_client is None:
+        _redis_pubsub_client = redis_async.Redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=3,
+            health_check_interval=30,
+        )
+    return _redis_pubsub_client
+
+
+async def close_redis_async():
+    """Cierra los clientes asíncronos (shutdown de FastAPI)."""
+    global _redis_async_client, _redis_pubsub_client
+    for cliente in (_redis_async_client, _redis_pubsub_client):
+        if cliente is not None:
+            await cliente.aclose()
+            await cliente.connection_pool.disconnect()
+    _redis_async_client = None
+    _redis_pubsub_client = None
@@ -1,7 +1,12 @@
+import time
+
 import boto3
 from botocore.exceptions import ClientError
+from opentelemetry.trace import SpanKind
 
 from core.config import settings
+from core.metrics import S3_SUBIDA_LATENCIA
+from core.tracing import span
 
 
 class S3StorageManager:
@@ -32,12 +37,24 @@ class S3StorageManager:
         Raises:
             ClientError: Si falla la subida a S3.
         """
+        inicio = time.perf_counter()
+        resultado = "ok"
         try:
-            self.client.put_object(
-                Bucket=self.bucket,
-                Key=s3_key,
-                Body=file_bytes,
-            )
+            with span(
+                "s3.put_object",
+                {"s3.bucket": self.bucket, "s3.key": s3_key, "s3.bytes": len(file_bytes)},
+                kind=SpanKind.CLIENT,
+            ):
+                self.client.put_object(
+                    Bucket=self.bucket,
+                    Key=s3_key,
+                    Body=file_bytes,
+                )
             return f"s3://{self.bucket}/{s3_key}"
         except ClientError as e:
-            raise RuntimeError(f"Error al subir archivo a S3: {e}") from e
\ No newline at end of file
+            resultado = "error"
+            raise RuntimeError(f"Error al subir archivo a S3: {e}") from e
+        finally:
+            S3_SUBIDA_LATENCIA.labels(resultado=resultado).observe(
+                time.perf_counter() - inicio
+            )
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""
+Trazas distribuidas (OpenTelemetry) del pipeline SIRE.
+
+Una operación SIRE recorre la API, dos tareas de Celery, varias llamadas a
+SUNAT, S3 y el webhook. Este módulo une todo en una sola traza:
+
+- API: middleware que abre un span SERVER por solicitud (api/main.py).
+- Celery: el contexto viaja en los headers del mensaje (before_task_publish)
+  y cada tarea abre su span CONSUMER como hija (task_prerun/task_postrun).
+  Las señales se conectan en workers/celery_app.py.
+- Spans internos: BaseSunatAPIClient._make_request/_authenticate, cada
+  iteración de polling, S3StorageManager.upload_file_bytes y _enviar_webhook.
+
+Sin OTEL_ENABLED el tracer es el no-op de opentelemetry-api: los spans no
+cuestan nada y no se exporta nada. Con OTEL_ENABLED se exporta por OTLP/HTTP
+a OTEL_EXPORTER_OTLP_ENDPOINT (ej: un collector local).
+"""
+
+import logging
+from contextlib import contextmanager
+from typing import Optional
+
+from opentelemetry import context, propagate, trace
+from opentelemetry.propagators.textmap import Getter
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("driver_sunat")
+
+_configurado = False
+
+
+def configurar_tracing(componente: str):
+    """
+    Instala el TracerProvider con exportador OTLP si OTEL_ENABLED.
+
+    Debe llamarse una vez por proceso (en los workers prefork, después del
+    fork: el procesador por lotes usa un hilo propio).
+
+    Args:
+        componente: "api" o "worker"; se agrega al nombre del servicio.
+    """
+    global _configurado
+    if _configurado or not settings.OTEL_ENABLED:
+        return
+
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    provider = TracerProvider(
+        resource=Resource.create({
+            "service.name": settings.OTEL_SERVICE_NAME,
+            "service.namespace": "driver_sunat",
+            "driver_sunat.componente": componente,
+        })
+    )
+    provider.add_span_processor(
+        BatchSpanProcessor(
+            OTLPSpanExporter(endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT)
+        )
+    )
+    trace.set_tracer_provider(provider)
+    _configurado = True
+    logger.info(
+        "Tracing OTLP activo (%s) → %s",
+        componente, settings.OTEL_EXPORTER_OTLP_ENDPOINT,
+    )
+
+
+def _limpiar(atributos: Optional[dict]) -> dict:
+    return {k: v for k, v in (atributos or {}).items() if v is not None}
+
+
+@contextmanager
+def span(
+    nombre: str,
+    atributos: Optional[dict] = None,
+    kind: SpanKind = SpanKind.INTERNAL,
+):
+    """
+    Abre un span hijo del contexto actual. Los atributos None se omiten.
+    Las excepciones se registran en el span y se vuelven a levantar.
+    """
+    with tracer.start_as_current_span(
+        nombre, kind=kind, attributes=_limpiar(atributos)
+    ) as s:
+        yield s
+
+
+def anotar(atributos: dict):
+    """Agrega atributos al span activo (ej: operacion_id al conocerlo)."""
+    trace.get_current_span().set_attributes(_limpiar(atributos))
+
+
+def inyectar_contexto(carrier: dict) -> dict:
+    """Escribe traceparent/tracestate del contexto actual en carrier."""
+    propagate.inject(carrier)
+    return carrier
+
+
+def extraer_contexto(carrier: dict) -> context.Context:
+    """Contexto remoto a partir de headers HTTP (dict)."""
+    return propagate.extract(carrier)
+
+
+# ---------------------------------------------------------------------------
+# Celery
+# ---------------------------------------------------------------------------
+class _RequestGetter(Getter):
+    """Lee los headers propagados desde el task.request de Celery."""
+
+    def get(self, carrier, key: str) -> Optional[list]:
+        valor = getattr(carrier, key, None)
+        if valor is None:
+            return None
+        return [valor] if isinstance(valor, str) else list(valor)
+
+    def keys(self, carrier) -> list:
+        return []
+
+
+_tareas_activas: dict = {}
+
+
+def celery_publicar(headers: Optional[dict]):
+    """before_task_publish: agrega el contexto actual a los headers."""
+    if headers is not None:
+        propagate.inject(headers)
+
+
+def celery_iniciar_tarea(task_id: str, task, kwargs: Optional[dict]):
+    """task_prerun: abre el span de la tarea como hijo del publicador."""
+    padre = propagate.extract(task.request, getter=_RequestGetter())
+    kwargs = kwargs or {}
+    s = tracer.start_span(
+        f"celery.{task.name}",
+        context=padre,
+        kind=SpanKind.CONSUMER,
+        attributes=_limpiar({
+            "celery.task_id": task_id,
+            "celery.retries": task.request.retries,
+            "sire.operacion_id": kwargs.get("operacion_id"),
+            "sire.backfill_id": kwargs.get("backfill_id"),
+            "sire.ruc": str(kwargs["ruc"]) if kwargs.get("ruc") else None,
+        }),
+    )
+    token = context.attach(trace.set_span_in_context(s))
+    _tareas_activas[task_id] = (s, token)
+
+
+def celery_fallo_tarea(task_id: str, exception: BaseException):
+    """task_failure: marca el span de la tarea como error."""
+    activo = _tareas_activas.get(task_id)
+    if activo:
+        activo[0].record_exception(exception)
+        activo[0].set_status(Status(StatusCode.ERROR, str(exception)))
+
+
+def celery_terminar_tarea(task_id: str, estado: Optional[str]):
+    """task_postrun: cierra el span de la tarea."""
+    activo = _tareas_activas.pop(task_id, None)
+    if not activo:
+        return
+    s, token = activo
+    if estado:
+        s.set_attribute("celery.state", estado)
+    s.end()
+    context.detach(token)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Escritura en disco de un reporte ZIP recibido en streaming.
+
+Lo usa SireClient.download_file como receptor del cliente asíncrono (ver
+api_clients.base_client.BaseSunatAPIClient._recibir). Los bytes se
+escriben en un temporal del mismo directorio y, solo si pasan las
+verificaciones, el archivo se sincroniza (fsync) y se renombra
+atómicamente a su nombre final: nadie ve nunca un ZIP a medias.
+
+Las verificaciones se calculan mientras llegan los bytes, sin releer el
+archivo:
+
+- Firma de ZIP en los primeros bytes (se corta enseguida si SUNAT
+  devuelve otra cosa).
+- Tamaño recibido contra Content-Length / Content-Range.
+- End Of Central Directory al final: el directorio central debe terminar
+  justo antes del EOCD y tener tantas entradas válidas como declara.
+
+Si la conexión se corta a mitad del archivo, el reintento del cliente
+pide solo lo que falta (Range, con If-Range si SUNAT envió ETag o
+Last-Modified); si el servidor responde el archivo completo, se empieza
+de cero.
+"""
+import hashlib
+import os
+import re
+import struct
+import tempfile
+
+FIRMA_LOCAL = b"PK\x03\x04"
+FIRMA_CENTRAL = b"PK\x01\x02"
+FIRMA_EOCD = b"PK\x05\x06"
+EOCD_TAMANO = 22
+EOCD_COMENTARIO_MAX = 0xFFFF
+CENTRAL_TAMANO = 46
+# Bytes finales retenidos en memoria: EOCD, su comentario y el directorio central
+COLA_MAXIMA = 1 << 20
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class ZipIntegrityError(ValueError):
+    """El archivo recibido no es un ZIP completo y válido."""
+    pass
+
+
+def _fsync_directorio(directorio: str):
+    """Persiste el rename en el directorio (no disponible en Windows)."""
+    try:
+        fd = os.open(directorio, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class ZipDownloadFile:
+    """
+    Receptor de una descarga ZIP en streaming hacia un temporal en `directorio`.
+
+        with ZipDownloadFile(config.DOWNLOAD_PATH) as archivo:
+            respuesta = await cliente.descargar_archivo(params, receptor=archivo)
+            ruta = archivo.finalizar(os.path.join(config.DOWNLOAD_PATH, nombre))
+
+    Al salir del bloque sin finalizar (error, reporte vacío) el temporal se borra.
+    """
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        fd, self.ruta_temporal = tempfile.mkstemp(dir=directorio, prefix=".", suffix=".part")
+        self._archivo = os.fdopen(fd, "wb")
+        self._validador = None
+        self._finalizado = False
+        self._reiniciar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.descartar()
+
+    def _reiniciar(self):
+        self._archivo.seek(0)
+        self._archivo.truncate()
+        self.recibidos = 0
+        self.esperados = None
+        self._cabecera = b""
+        self._cola = bytearray()
+        self._sha256 = hashlib.sha256()
+
+    # --- Protocolo de receptor de BaseSunatAPIClient._recibir ---
+
+    def cabeceras_reanudacion(self) -> dict:
+        if not self.recibidos:
+            return {}
+        cabeceras = {"Range": f"bytes={self.recibidos}-"}
+        if self._validador:
+            cabeceras["If-Range"] = self._validador
+        return cabeceras
+
+    def iniciar(self, response):
+        content_type = response.headers.get("Content-Type", "")
+        if "application/json" in content_type:
+            raise ValueError("Respuesta inesperada de SUNAT (Content-Type JSON) en lugar del archivo")
+
+        if response.status_code == 206 and self.recibidos:
+            rango = _CONTENT_RANGE.fullmatch(response.headers.get("Content-Range", ""))
+            if not rango or int(rango.group(1)) != self.recibidos:
+                raise ZipIntegrityError(
+                    f"Content-Range inesperado al reanudar desde el byte {self.recibidos}: "
+                    f"{response.headers.get('Content-Range')}"
+                )
+            if rango.group(3) != "*":
+                self.esperados = int(rango.group(3))
+            return
+
+        # Respuesta completa: el servidor ignoró el Range (o es el primer intento)
+        if self.recibidos:
+            self._reiniciar()
+        length = response.headers.get("Content-Length")
+        # Con Content-Encoding el largo es el del cuerpo comprimido
+        if length and response.headers.get("Content-Encoding", "identity") == "identity":
+            self.esperados = int(length)
+        validador = response.headers.get("ETag") or response.headers.get("Last-Modified")
+        # If-Range no admite ETag débiles
+        self._validador = None if validador and validador.startswith("W/") else validador
+
+    def escribir(self, chunk: bytes):
+        if len(self._cabecera) < 4:
+            self._cabecera += chunk[:4 - len(self._cabecera)]
+            if len(self._cabecera) == 4 and self._cabecera not in (FIRMA_LOCAL, FIRMA_EOCD):
+                raise ZipIntegrityError(f"El archivo recibido no es un ZIP (firma {self._cabecera!r})")
+
+        self._archivo.write(chunk)
+        self._sha256.update(chunk)
+        self.recibidos += len(chunk)
+        self._cola += chunk
+        # Recorte amortizado: solo al duplicar el máximo
+        if len(self._cola) > 2 * COLA_MAXIMA:
+            del self._cola[:-COLA_MAXIMA]
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 de lo recibido (clave de la caché de propuestas)."""
+        return self._sha256.hexdigest()
+
+    # --- Cierre ---
+
+    def verificar(self):
+        """Tamaño y estructura del ZIP. Lanza ZipIntegrityError si algo no cuadra."""
+        if self.esperados is not None and self.recibidos != self.esperados:
+            raise ZipIntegrityError(
+                f"Descarga incompleta: {self.recibidos} de {self.esperados} bytes"
+            )
+
+        cola = bytes(self._cola[-COLA_MAXIMA:])
+        pos = cola.rfind(FIRMA_EOCD, max(0, len(cola) - EOCD_TAMANO - EOCD_COMENTARIO_MAX))
+        if pos < 0 or len(cola) - pos < EOCD_TAMANO:
+            raise ZipIntegrityError("No se encontró el End Of Central Directory del ZIP")
+        (_, _, _, _, entradas, tamano_cd, offset_cd,
+         largo_comentario) = struct.unpack("<4s4H2LH", cola[pos:pos + EOCD_TAMANO])
+        if pos + EOCD_TAMANO + largo_comentario != len(cola):
+            raise ZipIntegrityError("Bytes sobrantes o faltantes tras el End Of Central Directory")
+        if offset_cd == 0xFFFFFFFF:
+            return  # ZIP64: el EOCD no describe el directorio central
+
+        offset_eocd = self.recibidos - len(cola) + pos
+        if offset_cd + tamano_cd != offset_eocd:
+            raise ZipIntegrityError(
+                f"Directorio central inconsistente (offset {offset_cd} + {tamano_cd} != {offset_eocd})"
+            )
+
+        inicio = pos - tamano_cd
+        if inicio < 0:
+            return  # Directorio central más grande que la cola retenida
+        i, encontradas = inicio, 0
+        while i < pos:
+            if cola[i:i + 4] != FIRMA_CENTRAL or i + CENTRAL_TAMANO > pos:
+                raise ZipIntegrityError(f"Entrada {encontradas} del directorio central inválida")
+            largo_nombre, largo_extra, largo_coment = struct.unpack("<3H", cola[i + 28:i + 34])
+            i += CENTRAL_TAMANO + largo_nombre + largo_extra + largo_coment
+            encontradas += 1
+        if i != pos or encontradas != entradas:
+            raise ZipIntegrityError(
+                f"El directorio central tiene {encontradas} entradas, el ZIP declara {entradas}"
+            )
+
+    def finalizar(self, destino: str) -> str:
+        """Verifica, sincroniza y renombra atómicamente el temporal a `destino`."""
+        self.verificar()
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+        self._archivo.close()
+        os.replace(self.ruta_temporal, destino)
+        self._finalizado = True
+        _fsync_directorio(os.path.dirname(destino) or ".")
+        return destino
+
+    def descartar(self):
+        """Cierra y borra el temporal (no hace nada si ya se finalizó)."""
+        if not self._archivo.closed:
+            self._archivo.close()
+        if not self._finalizado:
+            try:
+                os.remove(self.ruta_temporal)
+            except FileNotFoundError:
+                pass
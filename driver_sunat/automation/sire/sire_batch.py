@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Corrida por lotes de reportes SIRE (legacy) sobre muchos RUC.
+
+Cada RUC recorre sus fases (solicitud → estado → descarga) en un hilo de
+un pool acotado, con un único SireClient para todas ellas: mientras un
+RUC espera su ticket, otros solicitan o descargan. Las llamadas HTTP de
+todos los hilos comparten el pool de conexiones del cliente asíncrono
+(ver sire_client).
+
+El avance queda en sire_reportes, así que una corrida interrumpida se
+retoma donde quedó:
+
+- DESCARGADO / SIN_DATOS: no se vuelve a tocar.
+- SOLICITADO: se sigue consultando el ticket ya emitido (no se pide otro).
+- ERROR o sin fila: se solicita de nuevo, salvo que la propuesta esté
+  fresca en la caché local (core/propuestas_cache.py): entonces se publica
+  en DOWNLOAD_PATH sin tocar SUNAT.
+"""
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from core.config import settings
+from core.propuestas_cache import get_propuestas_cache
+from ...config import config
+from ...database import operations as db
+from .sire_client import SireClient, SireNoComprobantesError
+from .sire_download_task import SireDownloadTask
+from .sire_request_task import SireRequestTask
+from .sire_status_task import SireStatusTask
+
+TIPOS = ('ventas', 'compras')
+ESTADOS_FINALES = ('DESCARGADO', 'SIN_DATOS')
+
+
+def periodo_anterior() -> str:
+    """Período tributario del mes anterior (AAAAMM)."""
+    last_month = datetime.now().replace(day=1) - timedelta(days=1)
+    return last_month.strftime("%Y%m")
+
+
+class SireBatchRunner:
+    """
+    Solicita, consulta y descarga los reportes SIRE de un período para
+    varios contribuyentes a la vez.
+    """
+
+    def __init__(self, logger, periodo: str = None, tipos=TIPOS, max_workers: int = None,
+                 poll_interval: float = None, poll_max_wait: float = None):
+        """
+        Args:
+            periodo: Período tributario (AAAAMM); si None usa el mes anterior.
+            tipos: Reportes a procesar por RUC ('ventas', 'compras').
+            max_workers: RUC procesados a la vez (config.SIRE_BATCH_WORKERS).
+            poll_interval: Segundos entre consultas de estado de un RUC.
+            poll_max_wait: Espera máxima por los tickets de un RUC; los que
+                           sigan en proceso quedan SOLICITADO para la próxima corrida.
+        """
+        self.logger = logger
+        self.periodo = periodo or periodo_anterior()
+        self.tipos = tuple(tipos)
+        self.max_workers = max_workers or config.SIRE_BATCH_WORKERS
+        self.poll_interval = settings.SIRE_POLL_INTERVALO if poll_interval is None else poll_interval
+        self.poll_max_wait = settings.SIRE_POLL_ESPERA_MAX if poll_max_wait is None else poll_max_wait
+
+    def run(self, contribuyentes=None) -> Counter:
+        """
+        Procesa los contribuyentes (por defecto, los activos con credenciales SIRE).
+
+        Returns:
+            Counter: Reportes por estado final (DESCARGADO, SIN_DATOS, ERROR,
+            y SOLICITADO para los que quedaron pendientes).
+        """
+        if contribuyentes is None:
+            contribuyentes = db.get_active_contribuyentes_with_sire_creds(lazy=True)
+        contribuyentes = list(contribuyentes)
+        # Checkpoint: último estado de cada (ruc, tipo) en este período
+        reportes = db.get_sire_reports_for_period(self.periodo)
+
+        self.logger.info(
+            f"Corrida SIRE {self.periodo}: {len(contribuyentes)} RUC, "
+            f"{self.max_workers} en paralelo"
+        )
+        resumen = Counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sire-batch") as pool:
+            futuros = {
+                pool.submit(
+                    self._procesar_ruc, contribuyente,
+                    {tipo: reportes.get((contribuyente['ruc'], tipo)) for tipo in self.tipos},
+                ): contribuyente['ruc']
+                for contribuyente in contribuyentes
+            }
+            for futuro in as_completed(futuros):
+                ruc = futuros[futuro]
+                try:
+                    resumen.update(futuro.result())
+                except Exception as e:
+                    # Un RUC con error no detiene al resto
+                    self.logger.error(f"Error procesando SIRE para RUC {ruc}: {e}")
+                    resumen['ERROR'] += len(self.tipos)
+
+        self.logger.info(f"Corrida SIRE {self.periodo} terminada: {dict(resumen)}")
+        return resumen
+
+    def _procesar_ruc(self, contribuyente: dict, reportes: dict) -> Counter:
+        """Fases de un RUC con un único SireClient. `reportes` es {tipo: fila o None}."""
+        ruc = contribuyente['ruc']
+        resultado = Counter()
+
+        pendientes = {}
+        for tipo, reporte in reportes.items():
+            if reporte is not None and reporte['estado'] in ESTADOS_FINALES:
+                resultado[reporte['estado']] += 1
+            elif (reporte is None or reporte['estado'] == 'ERROR') and self._servir_desde_cache(ruc, tipo):
+                resultado['DESCARGADO'] += 1
+            else:
+                pendientes[tipo] = reporte
+        if not pendientes:
+            return resultado
+
+        client = SireClient(self.logger, ruc)
+
+        # Fase 1: solicitud (o retomar el ticket ya emitido)
+        tickets = {}  # tipo -> (sire_id, ticket)
+        request_task = SireRequestTask(self.logger, ruc, client)
+        for tipo, reporte in pendientes.items():
+            if reporte is not None and reporte['estado'] == 'SOLICITADO' and reporte['ticket']:
+                self.logger.info(f"Retomando ticket {reporte['ticket']} ({tipo}) para RUC {ruc}")
+                tickets[tipo] = (reporte['id'], reporte['ticket'])
+                continue
+            try:
+                sire_id = request_task.run(contribuyente, tipo, self.periodo)
+            except SireNoComprobantesError:
+                self.logger.info(f"RUC {ruc} sin comprobantes de {tipo} en {self.periodo}.")
+                db.add_sire_request({
+                    'ruc': ruc, 'tipo': tipo, 'periodo': self.periodo, 'ticket': None,
+                    'estado': 'SIN_DATOS', 'fecha_solicitud': datetime.now().isoformat(),
+                })
+                resultado['SIN_DATOS'] += 1
+                continue
+            except Exception:
+                # SireRequestTask ya registró el error; se reintenta en la próxima corrida
+                resultado['ERROR'] += 1
+                continue
+            if not sire_id:
+                resultado['ERROR'] += 1
+                continue
+            tickets[tipo] = (sire_id, db.get_sire_report(sire_id)['ticket'])
+
+        # Fases 2 y 3: consultar estado y descargar lo que esté listo
+        status_task = SireStatusTask(self.logger, ruc, client)
+        download_task = SireDownloadTask(self.logger, ruc, client)
+        limite = time.monotonic() + self.poll_max_wait
+        while tickets:
+            for tipo, (sire_id, ticket) in list(tickets.items()):
+                estado = status_task.run(contribuyente, ticket, self.periodo)
+                if estado['status'] == 'PROCESANDO':
+                    continue
+                del tickets[tipo]
+                if estado['status'] == 'LISTO':
+                    download_task.run(contribuyente, sire_id, estado['params'])
+                    resultado[db.get_sire_report(sire_id)['estado']] += 1
+                else:  # SIN_DATOS o ERROR
+                    db.update_sire_status(sire_id, estado['status'])
+                    resultado[estado['status']] += 1
+
+            if not tickets or time.monotonic() >= limite:
+                break
+            time.sleep(self.poll_interval)
+
+        if tickets:
+            self.logger.warning(
+                f"RUC {ruc}: {len(tickets)} ticket(s) aún en proceso; se retoman en la próxima corrida."
+            )
+            resultado['SOLICITADO'] += len(tickets)
+        return resultado
+
+    def _servir_desde_cache(self, ruc: str, tipo: str) -> bool:
+        """Publica en DOWNLOAD_PATH la propuesta si está fresca en la caché local."""
+        en_cache = get_propuestas_cache().obtener(ruc, self.periodo, tipo, incluir_s3=False)
+        if en_cache is None:
+            return False
+
+        try:
+            os.makedirs(config.DOWNLOAD_PATH, exist_ok=True)
+            en_cache.copiar_a(os.path.join(config.DOWNLOAD_PATH, en_cache.nom_archivo))
+        except OSError as e:
+            # Otro proceso la desalojó entre obtener() y la copia: se pide a SUNAT
+            self.logger.warning(f"No se pudo servir la propuesta {tipo} de RUC {ruc} desde la caché: {e}")
+            return False
+        ahora = datetime.now().isoformat()
+        sire_id = db.add_sire_request({
+            'ruc': ruc, 'tipo': tipo, 'periodo': self.periodo, 'ticket': None,
+            'estado': 'DESCARGADO', 'fecha_solicitud': ahora,
+        })
+        db.update_sire_status(sire_id, 'DESCARGADO', en_cache.nom_archivo, ahora)
+        self.logger.info(f"Propuesta SIRE {tipo} de RUC {ruc} servida desde la caché local.")
+        return True
+
+
+def run_sire_batch(logger, periodo: str = None, contribuyentes=None, **kwargs) -> Counter:
+    """Atajo para SireBatchRunner(logger, periodo, **kwargs).run(contribuyentes)."""
+    return SireBatchRunner(logger, periodo, **kwargs).run(contribuyentes)
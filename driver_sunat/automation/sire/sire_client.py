@@ -1,15 +1,108 @@
 # -*- coding: utf-8 -*-
+"""
+Cliente SIRE del paquete legacy.
+
+Es una fachada síncrona sobre el cliente asíncrono
+api_clients.sire.client.SireClient, para que las tareas legacy
+(SireRequestTask, SireStatusTask, SireDownloadTask) compartan con los
+workers la misma implementación:
+
+- Un único httpx.AsyncClient por proceso (pool de conexiones keep-alive):
+  las llamadas sucesivas, de uno o varios RUC, no repiten el handshake TCP/TLS.
+- La caché de tokens en Redis, el circuit breaker y la política de
+  reintentos de api_clients.
+- El semáforo por RUC de core.concurrency: cada llamada a SUNAT ocupa un
+  cupo del RUC, así una corrida legacy no se suma a los workers que ya
+  están usando todo el cupo de ese contribuyente.
+
+Las corrutinas corren en un event loop dedicado en un hilo de fondo; los
+métodos de SireClient bloquean hasta obtener el resultado, así que se
+pueden llamar desde varios hilos a la vez.
+"""
+import asyncio
 import os
-import re
-import requests
-from datetime import datetime, timedelta
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+
+from api_clients.sire.client import SireClient as AsyncSireClient
+from core.concurrency import RucConcurrencyLimiter, calcular_espera_diferimiento
+from core.config import settings
+from core.propuestas_cache import get_propuestas_cache
 from ...config import config
 from ...database import operations as db
+from .descarga import ZipDownloadFile
+
+TIPOS_VALIDOS = ('ventas', 'compras')
+
+_lock = threading.RLock()
+_loop = None
+_http_client = None
+
 
 class SireNoComprobantesError(Exception):
-    """Lanzada cuando la API SIRE devuelve un error 1070 (sin comprobantes)."""
+    """Lanzada cuando la API SIRE devuelve un error 1070 (sin comprobantes) o un reporte vacío."""
     pass
 
+
+class SireSinCupoError(Exception):
+    """Lanzada cuando el RUC no obtuvo cupo en el semáforo dentro de SIRE_CUPO_ESPERA_MAX."""
+    pass
+
+
+def _get_loop():
+    """Event loop de fondo compartido por todos los SireClient del proceso."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="sire-legacy-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def _run(coro):
+    """Ejecuta una corrutina en el loop de fondo y espera su resultado."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+async def _crear_http_client():
+    return httpx.AsyncClient(timeout=settings.SUNAT_API_TIMEOUT)
+
+
+def _get_http_client():
+    """httpx.AsyncClient compartido (se crea dentro del loop de fondo)."""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = _run(_crear_http_client())
+    return _http_client
+
+
+def close_shared_http_client():
+    """Cierra las conexiones del cliente HTTP compartido (fin del proceso)."""
+    global _http_client
+    with _lock:
+        if _http_client is not None:
+            _run(_http_client.aclose())
+            _http_client = None
+
+
+def _error_sin_comprobantes(response: httpx.Response):
+    """Devuelve el cuerpo del error si es un 422 con código 1070, si no None."""
+    if response.status_code != 422:
+        return None
+    try:
+        error_data = response.json()
+        if any(err.get('cod') == '1070' for err in error_data.get('errors', [])):
+            return error_data
+    except (ValueError, KeyError, AttributeError):
+        pass  # Si el JSON no es válido o no tiene la estructura, se trata como error normal
+    return None
+
+
 class SireClient:
     """
     Cliente para interactuar con la API SIRE de SUNAT.
@@ -19,8 +112,9 @@ class SireClient:
     def __init__(self, logger, ruc):
         self.logger = logger
         self.ruc = ruc
-        self.token = None
-        self.token_expires_at = None
+        self._cliente = None
+        self._credenciales_sol = None
+        self._limiter = None
         # Obtener credenciales de BD
         creds = db.get_sire_credentials(ruc)
         if not creds:
@@ -29,202 +123,191 @@ class SireClient:
         self.client_secret = creds['client_secret']
         self.user_sol = creds['user_sol']
 
-    def _get_token(self, ruc, sol_user, sol_pass):
+    @property
+    def token(self):
+        return self._cliente.token if self._cliente else None
+
+    def _cliente_async(self, sol_user, sol_pass) -> AsyncSireClient:
+        """
+        SireClient asíncrono de este RUC, sobre el pool HTTP compartido.
+        Si cambian las credenciales SOL se crea uno nuevo.
+        """
+        credenciales = (sol_user or self.user_sol, sol_pass)
+        if self._cliente is None or (sol_pass and credenciales != self._credenciales_sol):
+            self._cliente = AsyncSireClient(
+                ruc=self.ruc,
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+                user_sol=credenciales[0],
+                clave_sol=credenciales[1],
+                http_client=_get_http_client(),
+            )
+            self._credenciales_sol = credenciales
+        return self._cliente
+
+    @contextmanager
+    def _cupo(self):
+        """
+        Ocupa un cupo del semáforo del RUC durante una llamada.
+
+        El semáforo no espera (ver core.concurrency); aquí se reintenta con
+        la misma espera creciente con la que los workers difieren sus tareas,
+        hasta config.SIRE_CUPO_ESPERA_MAX segundos.
         """
-        Obtiene un Bearer Token con un sistema de cache de tres niveles:
-        1. Cache en memoria (dentro de la instancia)
-        2. Cache en BD local
-        3. Solicitud a la API de SUNAT
-        """
-        # 1. Verificar cache en memoria
-        if self.token and self.token_expires_at and self.token_expires_at > datetime.now():
-            self.logger.info("Token SIRE obtenido de cache en memoria.")
-            return self.token
-
-        # 2. Verificar cache en BD
-        cached_token = db.get_valid_sire_token(ruc)
-        if cached_token:
-            self.token = cached_token
-            self.token_expires_at = datetime.now() + timedelta(hours=1)  # Asumir 1h de validez
-            self.logger.info("Token SIRE obtenido de cache en BD.")
-            return self.token
-
-        # 3. Obtener nuevo token de SUNAT
-        self.logger.info("Solicitando nuevo token de acceso SIRE a SUNAT...")
-        token_url = f"https://api-seguridad.sunat.gob.pe/v1/clientessol/{self.client_id}/oauth2/token/"
-        username = f"{ruc}{sol_user}"
-
-        payload = {
-            'grant_type': 'password',
-            'scope': 'https://api-cpe.sunat.gob.pe',
-            'client_id': self.client_id,
-            'client_secret': self.client_secret,
-            'username': username,
-            'password': sol_pass
-        }
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        if self._limiter is None:
+            self._limiter = RucConcurrencyLimiter()
+        limite = time.monotonic() + config.SIRE_CUPO_ESPERA_MAX
+        intentos = 0
+        while True:
+            lease = self._limiter.acquire(self.ruc)
+            if lease is not None:
+                break
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                raise SireSinCupoError(
+                    f"RUC {self.ruc} sin cupo de concurrencia tras {config.SIRE_CUPO_ESPERA_MAX}s"
+                )
+            espera = min(calcular_espera_diferimiento(intentos), restante)
+            self.logger.info(f"RUC {self.ruc} sin cupo de concurrencia; esperando {espera:.0f}s")
+            time.sleep(espera)
+            intentos += 1
+        try:
+            yield
+        finally:
+            self._limiter.release(self.ruc, lease)
 
+    def _get_token(self, ruc, sol_user, sol_pass):
+        """
+        Obtiene un Bearer Token: de la caché en Redis compartida con los
+        workers o, si no hay, solicitándolo a SUNAT.
+        """
+        cliente = self._cliente_async(sol_user, sol_pass)
         try:
-            response = requests.post(token_url, data=payload, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            self.token = data.get('access_token')
-            # Guardar en BD con fecha de expiración real
-            expires_in_seconds = data.get('expires_in', 3600) # Default 1 hora
-            self.token_expires_at = datetime.now() + timedelta(seconds=expires_in_seconds)
-            db.save_sire_token(ruc, self.token, self.token_expires_at.isoformat())
-            
-            self.logger.info("Token de acceso SIRE obtenido y guardado.")
-            return self.token
-        except requests.exceptions.HTTPError as e:
+            with self._cupo():
+                token = _run(cliente.obtener_token())
+            self.logger.info("Token de acceso SIRE disponible.")
+            return token
+        except httpx.HTTPStatusError as e:
             error_msg = f"Error token SIRE HTTP {e.response.status_code}: {e.response.text}"
             self.logger.error(error_msg)
             db.add_observation(ruc, error_msg, "LOCAL")
             raise
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             error_msg = f"Error obteniendo token SIRE: {e}"
             self.logger.error(error_msg)
             db.add_observation(ruc, error_msg, "LOCAL")
             raise
 
-    def _make_request(self, method, url, params=None, retries=3, sol_user=None, sol_pass=None):
+    def _ejecutar(self, sol_user, sol_pass, operacion):
         """
-        Realiza una request HTTP con reintentos y manejo de token.
+        Ejecuta `operacion(cliente_async)` de forma síncrona, con un cupo
+        del semáforo del RUC.
+
+        Los reintentos, el refresco de token ante 401 y el circuit breaker
+        los aplica el cliente asíncrono.
         """
-        # Asegurarse de tener un token antes de la primera request
-        if not self.token:
+        cliente = self._cliente_async(sol_user, sol_pass)
+        if not cliente.token:
             self._get_token(self.ruc, sol_user, sol_pass)
-
-        for attempt in range(retries):
-            try:
-                headers = {'Authorization': f'Bearer {self.token}'}
-                response = requests.request(method, url, headers=headers, params=params, timeout=30)
-                response.raise_for_status()
-                return response.json()
-
-            except requests.exceptions.HTTPError as e:
-                # Manejo de error 422 / 1070
-                if e.response.status_code == 422:
-                    try:
-                        error_data = e.response.json()
-                        if any(err.get('cod') == '1070' for err in error_data.get('errors', [])):
-                            raise SireNoComprobantesError(error_data)
-                    except (ValueError, KeyError):
-                        pass # Si el JSON no es válido o no tiene la estructura, se trata como error normal
-
-                if e.response.status_code == 401:  # Token expirado
-                    self.logger.warning("Token expirado o inválido, intentando refrescar...")
-                    self.token = None # Forzar refresh
-                    self._get_token(self.ruc, sol_user, sol_pass) # Obtener nuevo token
-                    continue # Reintentar la request original
-                self.logger.error(f"Error HTTP en request SIRE (intento {attempt+1}): {e.response.text}")
-                if attempt == retries - 1:
-                    raise
-            except Exception as e:
-                self.logger.error(f"Error en request SIRE (intento {attempt+1}): {e}")
-                if attempt == retries - 1:
-                    raise
-        return None
+        cliente.reiniciar_presupuesto_reintentos()
+        try:
+            with self._cupo():
+                return _run(operacion(cliente))
+        except httpx.HTTPStatusError as e:
+            error_data = _error_sin_comprobantes(e.response)
+            if error_data is not None:
+                raise SireNoComprobantesError(error_data) from e
+            self.logger.error(f"Error HTTP en request SIRE: {e.response.text}")
+            raise
 
     def request_proposal(self, ruc, sol_user, sol_pass, tipo, periodo):
         """
         Solicita una propuesta de descarga para Ventas o Compras.
         """
-        if tipo == 'ventas':
-            libro = 'rvie'
-            url = f"https://api-sire.sunat.gob.pe/v1/contribuyente/migeigv/libros/{libro}/propuesta/web/propuesta/{periodo}/exportapropuesta"
-            params = {'codTipoArchivo': '0'}
-        elif tipo == 'compras':
-            libro = 'rce'
-            url = f"https://api-sire.sunat.gob.pe/v1/contribuyente/migeigv/libros/{libro}/propuesta/web/propuesta/{periodo}/exportacioncomprobantepropuesta"
-            params = {'codTipoArchivo': '0', 'codOrigenEnvio': '2'}
-        else:
+        if tipo not in TIPOS_VALIDOS:
             raise ValueError(f"Tipo no válido: {tipo}")
 
-        data = self._make_request('GET', url, params, sol_user=sol_user, sol_pass=sol_pass)
-        if data and 'numTicket' in data:
-            self.logger.info(f"Propuesta SIRE {tipo} solicitada, ticket: {data['numTicket']}")
-            return data['numTicket']
-        else:
-            self.logger.error(f"No se recibió numTicket en respuesta de propuesta: {data}")
+        try:
+            ticket = self._ejecutar(
+                sol_user, sol_pass,
+                lambda c: c.solicitar_descarga_propuesta(periodo, tipo),
+            )
+        except ValueError as e:
+            self.logger.error(f"No se recibió numTicket en respuesta de propuesta: {e}")
             return None
+        self.logger.info(f"Propuesta SIRE {tipo} solicitada, ticket: {ticket}")
+        return ticket
 
     def query_status(self, ruc, sol_user, sol_pass, ticket, periodo):
         """
-        Consulta el estado de un ticket.
+        Consulta el estado de un ticket y devuelve el JSON de SUNAT sin
+        procesar (compatibilidad; las tareas usan query_ticket_status).
         """
-        libro = 'rvierce'
-        url = f"https://api-sire.sunat.gob.pe/v1/contribuyente/migeigv/libros/{libro}/gestionprocesosmasivos/web/masivo/consultaestadotickets"
-        params = {
-            'perIni': periodo,
-            'perFin': periodo,
-            'page': 1,
-            'perPage': 20,
-            'numTicket': ticket
-        }
-
-        data = self._make_request('GET', url, params, sol_user=sol_user, sol_pass=sol_pass)
+        data = self._ejecutar(
+            sol_user, sol_pass,
+            lambda c: c.consultar_estado_ticket_json(ticket, periodo),
+        )
         if data:
             self.logger.info(f"Estado de ticket {ticket} consultado")
             return data
         return None
 
-    def download_file(self, ruc, sol_user, sol_pass, download_params: dict):
+    def query_ticket_status(self, ruc, sol_user, sol_pass, ticket, periodo):
+        """
+        Consulta el estado de un ticket.
+
+        Returns:
+            TicketStatus: Estado normalizado (PROCESANDO si SUNAT aún no lo lista).
+        """
+        estado = self._ejecutar(
+            sol_user, sol_pass,
+            lambda c: c.consultar_estado_ticket(ticket, periodo),
+        )
+        self.logger.info(f"Estado de ticket {ticket} consultado")
+        return estado
+
+    def download_file(self, ruc, sol_user, sol_pass, download_params: dict, tipo: str = None):
         """
         Descarga un archivo de reporte usando los parámetros obtenidos de la consulta de estado.
+
+        El archivo se recibe en streaming a un temporal, se verifica (tamaño y
+        estructura ZIP) y se renombra atómicamente en config.DOWNLOAD_PATH;
+        un corte a mitad de la descarga se retoma con Range (ver descarga.py).
+        Si se indica `tipo`, el archivo queda además en la caché local de
+        propuestas (core/propuestas_cache.py).
+
+        Returns:
+            str: Ruta del archivo verificado.
+
+        Raises:
+            SireNoComprobantesError: Si el reporte descargado no contiene datos.
+            ZipIntegrityError: Si el archivo recibido no es un ZIP íntegro.
         """
-        libro = 'rvierce'
-        url = f"https://api-sire.sunat.gob.pe/v1/contribuyente/migeigv/libros/{libro}/gestionprocesosmasivos/web/masivo/archivoreporte"
+        os.makedirs(config.DOWNLOAD_PATH, exist_ok=True)
+        with ZipDownloadFile(config.DOWNLOAD_PATH) as archivo:
+            respuesta = self._ejecutar(
+                sol_user, sol_pass,
+                lambda c: c.descargar_archivo(download_params, receptor=archivo),
+            )
+            if respuesta.es_vacio:
+                self.logger.info(
+                    f"El reporte '{respuesta.nom_archivo}' no contiene comprobantes."
+                )
+                raise SireNoComprobantesError(respuesta.mensaje)
 
-        # Asegurarse de tener un token
-        if not self.token:
-            self._get_token(ruc, sol_user, sol_pass)
+            # El cliente asíncrono ya ajustó el nombre al periodo tributario
+            file_path = archivo.finalizar(os.path.join(config.DOWNLOAD_PATH, respuesta.nom_archivo))
 
-        headers = {'Authorization': f'Bearer {self.token}'}
-        try:
-            response = requests.get(url, headers=headers, params=download_params, timeout=60)
-            response.raise_for_status()
-
-            content_type = response.headers.get('Content-Type', '')
-            content_size = len(response.content)
-
-            # SUNAT a veces devuelve HTTP 200 con un cuerpo JSON de error en lugar del archivo.
-            # Un archivo legítimo (ZIP, CSV, XLSX) nunca tiene Content-Type application/json.
-            if 'application/json' in content_type:
-                error_body = response.text[:500]
-                self.logger.error(
-                    f"SUNAT devolvió JSON en lugar del archivo para '{download_params.get('nomArchivoReporte')}'. "
-                    f"Body: {error_body}"
+        self.logger.info(
+            f"Archivo SIRE descargado: {file_path} | "
+            f"Tamaño: {archivo.recibidos} bytes"
+        )
+        if tipo:
+            try:
+                get_propuestas_cache().guardar(
+                    ruc, download_params.get('perTributario', ''), tipo, respuesta.nom_archivo,
+                    ruta=file_path, digest=archivo.digest,
                 )
-                raise ValueError(f"Respuesta inesperada de SUNAT (Content-Type JSON): {error_body}")
-
-            nom_archivo = download_params.get('nomArchivoReporte')
-
-            # Archivos de ventas SIRE comienzan con 'LE'. SUNAT genera el nombre con el timestamp
-            # del momento de descarga, lo que provoca colision entre periodos distintos.
-            # Se reemplaza ese timestamp por el periodo tributario real antes de escribir en disco.
-            nom_archivo_final = nom_archivo
-            if nom_archivo.upper().startswith('LE'):
-                periodo = download_params.get('perTributario', '')
-                if periodo:
-                    nom_archivo_final = re.sub(
-                        r'20\d{2}(?:0[1-9]|1[0-2])00', f"{periodo}00", nom_archivo
-                    )
-                    if nom_archivo_final != nom_archivo:
-                        self.logger.info(
-                            f"Nombre ajustado al periodo: '{nom_archivo}' -> '{nom_archivo_final}'"
-                        )
-
-            file_path = os.path.join(config.DOWNLOAD_PATH, nom_archivo_final)
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
-
-            self.logger.info(
-                f"Archivo SIRE descargado: {file_path} | "
-                f"Content-Type: {content_type} | "
-                f"Tamaño: {content_size} bytes"
-            )
-            return file_path
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Error descargando archivo SIRE: {e}")
-            raise
\ No newline at end of file
+            except OSError as e:
+                self.logger.warning(f"No se pudo guardar la propuesta en la caché local: {e}")
+        return file_path
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 import os
 from datetime import datetime
-from .sire_client import SireClient
+from .sire_client import SireClient, SireNoComprobantesError
 from ...database import operations as db
 
 class SireDownloadTask:
@@ -28,33 +28,29 @@ class SireDownloadTask:
         self.logger.info(f"Iniciando descarga del archivo '{nom_archivo}' para el reporte SIRE ID {sire_id}")
 
         try:
+            reporte = db.get_sire_report(sire_id)
             file_path = self.client.download_file(
                 contribuyente['ruc'],
                 contribuyente['user_sol'],
                 contribuyente['password_sol'],
-                download_params
+                download_params,
+                tipo=reporte['tipo'] if reporte else None,
             )
 
-            if file_path and os.path.exists(file_path):
-                # Usar el nombre real del archivo en disco (puede diferir del original si fue renombrado)
-                nom_archivo_final = os.path.basename(file_path)
-                file_size = os.path.getsize(file_path)
-                self.logger.info(
-                    f"Archivo verificado en disco: '{file_path}' | Tamaño: {file_size} bytes"
-                )
-                db.update_sire_status(
-                    sire_id,
-                    'DESCARGADO',
-                    nom_archivo_final,
-                    datetime.now().isoformat()
-                )
-                self.logger.info(f"Reporte SIRE ID {sire_id} marcado como DESCARGADO.")
-            else:
-                self.logger.error(
-                    f"La descarga del reporte SIRE ID {sire_id} falló: "
-                    f"no se recibió ruta o el archivo no existe en disco (path={file_path})."
-                )
-                db.update_sire_status(sire_id, 'ERROR')
+            # download_file solo devuelve la ruta de un ZIP ya verificado y en su
+            # lugar definitivo; el nombre puede diferir del original (periodo)
+            nom_archivo_final = os.path.basename(file_path)
+            db.update_sire_status(
+                sire_id,
+                'DESCARGADO',
+                nom_archivo_final,
+                datetime.now().isoformat()
+            )
+            self.logger.info(f"Reporte SIRE ID {sire_id} marcado como DESCARGADO.")
+
+        except SireNoComprobantesError:
+            self.logger.info(f"Reporte SIRE ID {sire_id} sin comprobantes, marcado como SIN_DATOS.")
+            db.update_sire_status(sire_id, 'SIN_DATOS')
 
         except Exception as e:
             self.logger.error(f"Error crítico durante la descarga del reporte SIRE ID {sire_id}: {e}")
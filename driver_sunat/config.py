@@ -15,6 +15,9 @@ class Config:
     ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
     if not ENCRYPTION_KEY:
         raise ValueError("No se ha definido ENCRYPTION_KEY en el archivo .env. Es necesaria para la seguridad de las credenciales.")
+    # Claves anteriores, separadas por comas: solo se usan para descifrar
+    # mientras se rota ENCRYPTION_KEY (ver security.CryptoService).
+    ENCRYPTION_KEYS_OLD = [k.strip() for k in os.getenv("ENCRYPTION_KEYS_OLD", "").split(",") if k.strip()]
 
     # --- Configuración de la Base de Datos Central (PostgreSQL) ---
     PG_HOST = os.getenv("PG_HOST")
@@ -22,9 +25,16 @@ class Config:
     PG_DBNAME = os.getenv("PG_DBNAME")
     PG_USER = os.getenv("PG_USER")
     PG_PASSWORD = os.getenv("PG_PASSWORD")
+    # Pool de conexiones del paquete (ver database.connection.central_connection)
+    PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+    PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "8"))
 
     # --- Configuración de API SIRE ---
     # Credenciales obtenidas de BD local (otras_credenciales)
+    # RUC procesados a la vez por la corrida por lotes (automation.sire.sire_batch)
+    SIRE_BATCH_WORKERS = int(os.getenv("SIRE_BATCH_WORKERS", "8"))
+    # Segundos que una llamada espera cupo en el semáforo por RUC compartido con los workers
+    SIRE_CUPO_ESPERA_MAX = int(os.getenv("SIRE_CUPO_ESPERA_MAX", "300"))
 
     # --- Rutas de Archivos Locales ---
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Gestor de conexiones de la BD local SQLite y de la BD central PostgreSQL.
+
+Cada hilo reutiliza una única conexión por archivo de BD (en lugar de abrir
+una por consulta), configurada con:
+
+- journal_mode=WAL: los lectores no bloquean al escritor ni viceversa.
+- synchronous=NORMAL: en WAL sigue siendo seguro ante caídas del proceso
+  y evita un fsync por commit.
+- busy_timeout: espera el lock en lugar de fallar con "database is locked".
+- cached_statements: las sentencias preparadas se reutilizan entre llamadas.
+
+La conexión trabaja en modo autocommit; las escrituras de varias sentencias
+se agrupan con el context manager transaction():
+
+    with transaction() as conn:
+        conn.executemany("UPDATE ...", filas)
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+from ..config import config
+
+BUSY_TIMEOUT_MS = 5000
+CACHED_STATEMENTS = 256
+
+_local = threading.local()
+_directorios_creados = set()
+_lock_directorios = threading.Lock()
+
+
+def _asegurar_directorio(path: str):
+    """Crea el directorio de la BD una sola vez por proceso."""
+    directorio = os.path.dirname(path)
+    if directorio in _directorios_creados:
+        return
+    with _lock_directorios:
+        os.makedirs(directorio, exist_ok=True)
+        _directorios_creados.add(directorio)
+
+
+def _abrir_conexion(path: str) -> sqlite3.Connection:
+    _asegurar_directorio(path)
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=CACHED_STATEMENTS,
+        isolation_level=None,  # autocommit; transacciones explícitas con transaction()
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def _conexiones() -> dict:
+    if not hasattr(_local, "conexiones"):
+        _local.conexiones = {}
+        _local.profundidad = 0
+    return _local.conexiones
+
+
+def get_local_db_connection() -> sqlite3.Connection:
+    """
+    Devuelve la conexión SQLite del hilo actual (la crea si no existe).
+
+    La conexión es compartida: no se debe cerrar después de usarla.
+    """
+    conexiones = _conexiones()
+    path = config.DATABASE_PATH
+    conn = conexiones.get(path)
+    if conn is not None:
+        try:
+            conn.total_changes  # falla si alguien la cerró
+            return conn
+        except sqlite3.ProgrammingError:
+            pass
+    conn = conexiones[path] = _abrir_conexion(path)
+    return conn
+
+
+@contextmanager
+def transaction():
+    """
+    Transacción de escritura sobre la conexión del hilo.
+
+    Usa BEGIN IMMEDIATE para tomar el lock de escritura al inicio (sin
+    deadlocks al pasar de lectura a escritura). Las transacciones anidadas
+    se unen a la exterior. Hace COMMIT al salir o ROLLBACK ante excepción.
+    """
+    conn = get_local_db_connection()
+    if _local.profundidad:
+        _local.profundidad += 1
+        try:
+            yield conn
+        finally:
+            _local.profundidad -= 1
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    _local.profundidad = 1
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+    finally:
+        _local.profundidad = 0
+
+
+def close_local_db_connection():
+    """Cierra las conexiones del hilo actual (fin de un hilo o de las pruebas)."""
+    conexiones = _conexiones()
+    for conn in conexiones.values():
+        conn.close()
+    conexiones.clear()
+
+
+# --- BD Central (PostgreSQL) ---
+# Las operaciones del paquete toman conexiones de un ThreadedConnectionPool
+# compartido por el proceso (central_connection()); get_central_db_connection
+# sigue abriendo una conexión propia para quien necesite cerrarla a mano.
+
+_central_pool = None
+_central_pool_lock = threading.Lock()
+
+
+def _central_connect_kwargs() -> dict:
+    return dict(
+        host=config.PG_HOST,
+        port=config.PG_PORT,
+        dbname=config.PG_DBNAME,
+        user=config.PG_USER,
+        password=config.PG_PASSWORD
+    )
+
+
+def _get_central_pool() -> ThreadedConnectionPool:
+    global _central_pool
+    if _central_pool is None:
+        with _central_pool_lock:
+            if _central_pool is None:
+                _central_pool = ThreadedConnectionPool(
+                    config.PG_POOL_MIN, config.PG_POOL_MAX, **_central_connect_kwargs()
+                )
+    return _central_pool
+
+
+@contextmanager
+def central_connection():
+    """
+    Conexión del pool de la BD central, devuelta al pool al salir.
+
+    Produce None si no se puede conectar (el error ya se imprimió), igual
+    que get_central_db_connection. Ante una excepción hace rollback; la
+    transacción que quede abierta sin commit se descarta al devolverla.
+    """
+    try:
+        pool = _get_central_pool()
+        conn = pool.getconn()
+    except psycopg2.OperationalError as e:
+        print(f"ERROR: No se pudo conectar a la base de datos PostgreSQL. Revisa las credenciales en .env. Detalle: {e}")
+        yield None
+        return
+
+    try:
+        yield conn
+    except BaseException:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def close_central_pool():
+    """Cierra todas las conexiones del pool de la BD central."""
+    global _central_pool
+    with _central_pool_lock:
+        if _central_pool is not None:
+            _central_pool.closeall()
+            _central_pool = None
+
+
+def get_central_db_connection():
+    """Crea y devuelve una conexión a la base de datos central PostgreSQL."""
+    try:
+        conn = psycopg2.connect(**_central_connect_kwargs())
+        return conn
+    except psycopg2.OperationalError as e:
+        print(f"ERROR: No se pudo conectar a la base de datos PostgreSQL. Revisa las credenciales en .env. Detalle: {e}")
+        return None
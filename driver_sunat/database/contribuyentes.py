@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Carga de contribuyentes de la BD local con filtros combinables.
+
+Cada filtro aporta una condición sobre `contribuyentes c`; las relaciones
+con otras tablas se expresan con EXISTS / NOT EXISTS (sin JOIN), de modo
+que un contribuyente aparece una sola vez aunque tenga varias credenciales
+o reportes, y SQLite puede resolver cada subconsulta con el índice por ruc.
+
+    for contribuyente in iter_contribuyentes(active(), with_sire_creds()):
+        ...
+
+iter_contribuyentes es un generador: lee y descifra por lotes, así que el
+llamador puede empezar a trabajar con el primer lote sin esperar al resto.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from ..security import get_crypto_service
+from .connection import get_local_db_connection
+
+BATCH_SIZE = 256
+
+# Condición SQL sobre el alias `c` y sus parámetros
+Filter = namedtuple("Filter", ["sql", "params"])
+
+
+def active() -> Filter:
+    """Contribuyentes activos."""
+    return Filter("c.is_active = 1", ())
+
+
+def with_sire_creds() -> Filter:
+    """Con credenciales SIRE (tipo APISUNAT y 'SIRE' en observaciones)."""
+    return Filter("""EXISTS (
+        SELECT 1 FROM otras_credenciales oc
+        WHERE oc.ruc = c.ruc AND oc.tipo = 'APISUNAT' AND oc.observaciones LIKE '%SIRE%'
+    )""", ())
+
+
+def not_flagged_non_employer(days: int = 25) -> Filter:
+    """
+    Sin observación 'No es empleador' en los últimos `days` días.
+
+    Evita reintentos constantes en casos conocidos, pero permite una
+    re-verificación periódica por si el estado del contribuyente cambia.
+    """
+    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+    return Filter("""NOT EXISTS (
+        SELECT 1 FROM observaciones o
+        WHERE o.ruc = c.ruc AND o.fecha_observacion >= ? AND o.mensaje LIKE 'No es empleador%'
+    )""", (cutoff,))
+
+
+def with_pending_reports() -> Filter:
+    """Con al menos un reporte T-Registro en estado 'SOLICITADO'."""
+    return Filter("""EXISTS (
+        SELECT 1 FROM reportes_tregistro r
+        WHERE r.ruc = c.ruc AND r.estado = 'SOLICITADO'
+    )""", ())
+
+
+def build_query(*filters: Filter):
+    """Arma la consulta de iter_contribuyentes. Devuelve (sql, params)."""
+    sql = "SELECT c.ruc, c.user_sol, c.password_sol_encrypted FROM contribuyentes c"
+    params = []
+    if filters:
+        sql += " WHERE " + " AND ".join(f.sql for f in filters)
+        for f in filters:
+            params.extend(f.params)
+    return sql, params
+
+
+def _decrypt_batch(crypto, rows, lazy: bool):
+    if lazy:
+        for row in rows:
+            yield crypto.lazy({"ruc": row['ruc'], "user_sol": row['user_sol']},
+                              "password_sol", row['password_sol_encrypted'])
+        return
+
+    passwords = crypto.decrypt_many(row['password_sol_encrypted'] for row in rows)
+    for row, decrypted_pass in zip(rows, passwords):
+        if decrypted_pass is None:
+            print(f"ADVERTENCIA: No se pudo descifrar la contraseña para el RUC {row['ruc']}.")
+            continue
+        yield {
+            "ruc": row['ruc'],
+            "user_sol": row['user_sol'],
+            "password_sol": decrypted_pass
+        }
+
+
+def iter_contribuyentes(*filters: Filter, lazy: bool = False, batch_size: int = BATCH_SIZE):
+    """
+    Itera los contribuyentes que cumplen todos los filtros.
+
+    Args:
+        filters: Filtros de este módulo (active(), with_sire_creds(), ...).
+        lazy: Si es True, la contraseña se descifra recién al leer
+              contribuyente['password_sol'] (o al copiar/serializar el
+              dict); un token inválido lanza InvalidToken en ese momento.
+        batch_size: Filas leídas y descifradas por lote.
+
+    Yields:
+        dict: {"ruc", "user_sol", "password_sol"}. Las filas cuya contraseña
+        no se puede descifrar se omiten con una advertencia (modo no lazy).
+    """
+    sql, params = build_query(*filters)
+    crypto = get_crypto_service()
+    cursor = get_local_db_connection().execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from _decrypt_batch(crypto, rows, lazy)
+    finally:
+        cursor.close()
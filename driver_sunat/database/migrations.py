@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Migraciones versionadas de la BD local SQLite.
+
+La versión del esquema se guarda en PRAGMA user_version. migrate() aplica,
+en orden, las migraciones con versión mayor a la actual; cada una corre en
+su propia transacción junto con el cambio de user_version, así que una
+migración fallida no deja el esquema a medias ni la versión adelantada.
+
+Para cambiar el esquema se agrega una función _vN_... al final de
+MIGRATIONS; nunca se modifica una migración ya publicada.
+"""
+import sqlite3
+
+from .connection import get_local_db_connection, transaction
+
+
+def _v1_base_schema(cursor):
+    """
+    Esquema previo al versionado. Idempotente: también completa las BD
+    creadas antes de user_version, a las que les pueden faltar columnas.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS contribuyentes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ruc TEXT NOT NULL UNIQUE,
+        user_sol TEXT NOT NULL,
+        password_sol_encrypted BLOB NOT NULL,
+        is_active BOOLEAN NOT NULL DEFAULT 1
+    );
+    """)
+    print("Tabla 'contribuyentes' lista.")
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS buzon_mensajes (
+        id INTEGER PRIMARY KEY,
+        ruc TEXT NOT NULL,
+        asunto TEXT,
+        fecha_publicacion TEXT,
+        leido BOOLEAN DEFAULT 0,
+        fecha_revision TEXT
+    );
+    """)
+    print("Tabla 'buzon_mensajes' lista.")
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS reportes_tregistro (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ruc TEXT NOT NULL,
+        tipo_reporte TEXT NOT NULL,
+        ticket TEXT,
+        estado TEXT DEFAULT 'SOLICITADO',
+        fecha_solicitud TEXT,
+        fecha_descarga TEXT
+    );
+    """)
+    print("Tabla 'reportes_tregistro' lista.")
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS observaciones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ruc TEXT NOT NULL,
+        mensaje TEXT NOT NULL,
+        tipo TEXT DEFAULT 'LOCAL',  -- 'LOCAL' o 'DETERMINANTE'
+        estado TEXT DEFAULT 'PENDIENTE',  -- 'PENDIENTE' o 'SINCRONIZADO'
+        timestamp TEXT NOT NULL,
+        fecha_observacion TEXT
+    );
+    """)
+    print("Tabla 'observaciones' lista.")
+
+    # Add columns if not exist
+    try:
+        cursor.execute("ALTER TABLE observaciones ADD COLUMN tipo TEXT DEFAULT 'LOCAL'")
+        print("Columna 'tipo' agregada a 'observaciones'.")
+    except sqlite3.OperationalError:
+        pass
+    try:
+        cursor.execute("ALTER TABLE observaciones ADD COLUMN estado TEXT DEFAULT 'PENDIENTE'")
+        print("Columna 'estado' agregada a 'observaciones'.")
+    except sqlite3.OperationalError:
+        pass
+    try:
+        cursor.execute("ALTER TABLE observaciones ADD COLUMN fecha_observacion TEXT")
+        cursor.execute("UPDATE observaciones SET fecha_observacion = timestamp")
+        print("Columna 'fecha_observacion' agregada a 'observaciones'.")
+    except sqlite3.OperationalError:
+        pass
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS sire_reportes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ruc TEXT NOT NULL,
+        tipo TEXT NOT NULL,  -- 'ventas' o 'compras'
+        periodo TEXT NOT NULL,
+        ticket TEXT,
+        estado TEXT DEFAULT 'SOLICITADO',
+        fecha_solicitud TEXT,
+        fecha_descarga TEXT,
+        nom_archivo TEXT
+    );
+    """)
+    print("Tabla 'sire_reportes' lista.")
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS sire_tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ruc TEXT NOT NULL,
+        token_encrypted BLOB NOT NULL,
+        expires_at TEXT NOT NULL
+    );
+    """)
+    print("Tabla 'sire_tokens' lista.")
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS otras_credenciales (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ruc TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        usuario TEXT,
+        contrasena TEXT,
+        credencial3 TEXT,
+        observaciones TEXT
+    );
+    """)
+    print("Tabla 'otras_credenciales' lista.")
+
+    # Add columns if not exist
+    try:
+        cursor.execute("ALTER TABLE otras_credenciales ADD COLUMN observaciones TEXT")
+        print("Columna 'observaciones' agregada a 'otras_credenciales'.")
+    except sqlite3.OperationalError:
+        pass
+
+    # Huella de la fila de origen en la BD central (ver sync.py)
+    for table in ("contribuyentes", "otras_credenciales"):
+        try:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN source_hash TEXT")
+            print(f"Columna 'source_hash' agregada a '{table}'.")
+        except sqlite3.OperationalError:
+            pass
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_otras_credenciales_source_hash
+    ON otras_credenciales (source_hash)
+    """)
+
+
+def _v2_hot_query_indexes(cursor):
+    """Índices para las consultas frecuentes (ver tests/test_local_db_query_plans.py)."""
+    statements = [
+        # get_pending_reports(ruc) y el filtro with_pending_reports()
+        "CREATE INDEX IF NOT EXISTS idx_reportes_tregistro_ruc_estado ON reportes_tregistro (ruc, estado)",
+        # get_pending_reports() sin RUC
+        "CREATE INDEX IF NOT EXISTS idx_reportes_tregistro_estado ON reportes_tregistro (estado)",
+        # get_pending_sire_reports(ruc, tipo)
+        "CREATE INDEX IF NOT EXISTS idx_sire_reportes_estado_tipo ON sire_reportes (estado, tipo, ruc)",
+        # sync_determinant_observations_to_central
+        "CREATE INDEX IF NOT EXISTS idx_observaciones_estado_tipo ON observaciones (estado, tipo)",
+        # Filtro not_flagged_non_employer(): cubre también el LIKE sobre mensaje
+        "CREATE INDEX IF NOT EXISTS idx_observaciones_ruc_fecha ON observaciones (ruc, fecha_observacion, mensaje)",
+        # Filtro with_sire_creds() y get_sire_credentials
+        "CREATE INDEX IF NOT EXISTS idx_otras_credenciales_ruc_tipo ON otras_credenciales (ruc, tipo, observaciones)",
+        # get_messages_by_ruc_as_dict y sync_buzon_to_central
+        "CREATE INDEX IF NOT EXISTS idx_buzon_mensajes_ruc ON buzon_mensajes (ruc)",
+    ]
+    for statement in statements:
+        cursor.execute(statement)
+    print("Índices de consultas frecuentes creados.")
+
+
+def _v3_sire_periodo_index(cursor):
+    """Índice para retomar corridas SIRE por período (get_sire_reports_for_period)."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sire_reportes_periodo ON sire_reportes (periodo, ruc, tipo)")
+    print("Índice de sire_reportes por período creado.")
+
+
+MIGRATIONS = [
+    (1, _v1_base_schema),
+    (2, _v2_hot_query_indexes),
+    (3, _v3_sire_periodo_index),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn) -> int:
+    """Versión del esquema de la BD local (0 si nunca se migró)."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate() -> int:
+    """
+    Aplica las migraciones pendientes de la BD local.
+
+    Returns:
+        int: Versión del esquema tras migrar.
+    """
+    for version, apply in MIGRATIONS:
+        # BEGIN IMMEDIATE: si dos procesos migran a la vez, el segundo espera
+        # el lock y vuelve a leer la versión antes de decidir.
+        with transaction() as conn:
+            if get_schema_version(conn) >= version:
+                continue
+            print(f"Aplicando migración {version} ({apply.__name__})...")
+            apply(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version}")
+
+    return get_schema_version(get_local_db_connection())
@@ -1,157 +1,29 @@
 # -*- coding: utf-8 -*-
-import sqlite3
-import psycopg2
-import os
-from datetime import datetime, timedelta
-from ..config import config
-from ..security import encrypt_password, decrypt_password
+from datetime import datetime
+from psycopg2.extras import execute_values
+from .contribuyentes import (
+    iter_contribuyentes, active, with_sire_creds, not_flagged_non_employer, with_pending_reports,
+)
+from .connection import get_local_db_connection, get_central_db_connection, central_connection, transaction
+from .migrations import migrate
+from .sync import (
+    sync_clients_from_central_db, sync_otras_credenciales_from_central_db, sync_buzones_to_central,
+)
 
 # --- Operaciones con la BD Local (SQLite) ---
-
-def get_local_db_connection():
-    """Crea y devuelve una conexión a la base de datos local SQLite."""
-    os.makedirs(os.path.dirname(config.DATABASE_PATH), exist_ok=True)
-    conn = sqlite3.connect(config.DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# La conexión SQLite es compartida por hilo (ver connection.py): las lecturas
+# la usan directamente y las escrituras van dentro de `with transaction()`.
 
 def initialize_local_db():
-    """Inicializa la base de datos local, creando las tablas si no existen."""
+    """Inicializa la base de datos local aplicando las migraciones pendientes."""
     print("Inicializando la base de datos local (SQLite)...")
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS contribuyentes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ruc TEXT NOT NULL UNIQUE,
-        user_sol TEXT NOT NULL,
-        password_sol_encrypted BLOB NOT NULL,
-        is_active BOOLEAN NOT NULL DEFAULT 1
-    );
-    """)
-    print("Tabla 'contribuyentes' lista.")
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS buzon_mensajes (
-        id INTEGER PRIMARY KEY,
-        ruc TEXT NOT NULL,
-        asunto TEXT,
-        fecha_publicacion TEXT,
-        leido BOOLEAN DEFAULT 0,
-        fecha_revision TEXT
-    );
-    """)
-    print("Tabla 'buzon_mensajes' lista.")
+    migrate()
 
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS reportes_tregistro (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ruc TEXT NOT NULL,
-        tipo_reporte TEXT NOT NULL,
-        ticket TEXT,
-        estado TEXT DEFAULT 'SOLICITADO',
-        fecha_solicitud TEXT,
-        fecha_descarga TEXT
-    );
-    """)
-    print("Tabla 'reportes_tregistro' lista.")
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS observaciones (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ruc TEXT NOT NULL,
-        mensaje TEXT NOT NULL,
-        tipo TEXT DEFAULT 'LOCAL',  -- 'LOCAL' o 'DETERMINANTE'
-        estado TEXT DEFAULT 'PENDIENTE',  -- 'PENDIENTE' o 'SINCRONIZADO'
-        timestamp TEXT NOT NULL
-    );
-    """)
-    print("Tabla 'observaciones' lista.")
-
-    # Add columns if not exist
-    try:
-        cursor.execute("ALTER TABLE observaciones ADD COLUMN tipo TEXT DEFAULT 'LOCAL'")
-        print("Columna 'tipo' agregada a 'observaciones'.")
-    except sqlite3.OperationalError:
-        pass
-    try:
-        cursor.execute("ALTER TABLE observaciones ADD COLUMN estado TEXT DEFAULT 'PENDIENTE'")
-        print("Columna 'estado' agregada a 'observaciones'.")
-    except sqlite3.OperationalError:
-        pass
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS sire_reportes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ruc TEXT NOT NULL,
-        tipo TEXT NOT NULL,  -- 'ventas' o 'compras'
-        periodo TEXT NOT NULL,
-        ticket TEXT,
-        estado TEXT DEFAULT 'SOLICITADO',
-        fecha_solicitud TEXT,
-        fecha_descarga TEXT,
-        nom_archivo TEXT
-    );
-    """)
-    print("Tabla 'sire_reportes' lista.")
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS sire_tokens (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ruc TEXT NOT NULL,
-        token_encrypted BLOB NOT NULL,
-        expires_at TEXT NOT NULL
-    );
-    """)
-    print("Tabla 'sire_tokens' lista.")
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS otras_credenciales (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ruc TEXT NOT NULL,
-        tipo TEXT NOT NULL,
-        usuario TEXT,
-        contrasena TEXT,
-        credencial3 TEXT,
-        observaciones TEXT
-    );
-    """)
-    print("Tabla 'otras_credenciales' lista.")
-
-    # Add columns if not exist
-    try:
-        cursor.execute("ALTER TABLE otras_credenciales ADD COLUMN observaciones TEXT")
-        print("Columna 'observaciones' agregada a 'otras_credenciales'.")
-    except sqlite3.OperationalError:
-        pass
-
-    conn.commit()
-    conn.close()
-
-def get_active_contribuyentes():
+def get_active_contribuyentes(lazy: bool = False):
     """Obtiene todos los contribuyentes activos de la BD local SQLite y descifra sus claves."""
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT ruc, user_sol, password_sol_encrypted FROM contribuyentes WHERE is_active = 1")
-    rows = cursor.fetchall()
-    conn.close()
-
-    key = config.ENCRYPTION_KEY.encode('utf-8')
-    contribuyentes = []
-    for row in rows:
-        try:
-            decrypted_pass = decrypt_password(row['password_sol_encrypted'], key)
-            contribuyentes.append({
-                "ruc": row['ruc'],
-                "user_sol": row['user_sol'],
-                "password_sol": decrypted_pass
-            })
-        except Exception as e:
-            print(f"ADVERTENCIA: No se pudo descifrar la contraseña para el RUC {row['ruc']}. Error: {e}")
-    return contribuyentes
+    return list(iter_contribuyentes(active(), lazy=lazy))
 
-def get_active_contribuyentes_employer():
+def get_active_contribuyentes_employer(lazy: bool = False):
     """
     Obtiene una lista de contribuyentes activos que no han sido marcados
     como 'No es empleador' en los últimos 25 días.
@@ -164,78 +36,11 @@ def get_active_contribuyentes_employer():
         list[dict]: Una lista de diccionarios, donde cada diccionario
                     representa a un contribuyente apto.
     """
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-
-    # 1. Calcular la fecha límite (hace 25 días)
-    # SQLite no tiene funciones de fecha complejas, así que lo calculamos en Python.
-    cutoff_date = datetime.now() - timedelta(days=25)
-    cutoff_date_str = cutoff_date.isoformat()
-
-    # 2. Escribir la consulta SQL usando LEFT JOIN para un rendimiento óptimo
-    # y la condición de fecha para el bloqueo temporal.
-    # Un contribuyente es seleccionado si:
-    #   a) Está activo.
-    #   b) No tiene ninguna observación de 'No es empleador' (o.ruc IS NULL), O
-    #   c) La observación que tiene es más antigua que la fecha de corte.
-    query = """
-            SELECT c.ruc, \
-                   c.user_sol, \
-                   c.password_sol_encrypted
-            FROM contribuyentes c \
-                     LEFT JOIN (SELECT ruc, MAX(fecha_observacion) as last_observation_date \
-                                FROM observaciones \
-                                WHERE mensaje LIKE 'No es empleador%' \
-                                GROUP BY ruc) o ON c.ruc = o.ruc
-            WHERE c.is_active = 1
-              AND (o.ruc IS NULL OR o.last_observation_date < ?);
-            """
-
-    # 3. Ejecutar la consulta pasando la fecha de corte como parámetro seguro
-    cursor.execute(query, (cutoff_date_str,))
-    rows = cursor.fetchall()
-    conn.close()
-
-    key = config.ENCRYPTION_KEY.encode('utf-8')
-    contribuyentes = []
-    for row in rows:
-        try:
-            decrypted_pass = decrypt_password(row['password_sol_encrypted'], key)
-            contribuyentes.append({
-                "ruc": row['ruc'],
-                "user_sol": row['user_sol'],
-                "password_sol": decrypted_pass
-            })
-        except Exception as e:
-            print(f"ADVERTENCIA: No se pudo descifrar la contraseña para el RUC {row['ruc']}. Error: {e}")
-    return contribuyentes
+    return list(iter_contribuyentes(active(), not_flagged_non_employer(days=25), lazy=lazy))
 
-def get_active_contribuyentes_with_sire_creds():
+def get_active_contribuyentes_with_sire_creds(lazy: bool = False):
     """Obtiene contribuyentes activos que tienen credenciales SIRE válidas (tipo APISUNAT y credencial3 LIKE '%SIRE%')."""
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    SELECT c.ruc, c.user_sol, c.password_sol_encrypted
-    FROM contribuyentes c
-    JOIN otras_credenciales oc ON c.ruc = oc.ruc
-    WHERE c.is_active = 1 AND oc.tipo = 'APISUNAT' AND oc.observaciones LIKE '%SIRE%'
-    """)
-    rows = cursor.fetchall()
-    conn.close()
-
-    key = config.ENCRYPTION_KEY.encode('utf-8')
-    contribuyentes = []
-    for row in rows:
-        try:
-            decrypted_pass = decrypt_password(row['password_sol_encrypted'], key)
-            contribuyentes.append({
-                "ruc": row['ruc'],
-                "user_sol": row['user_sol'],
-                "password_sol": decrypted_pass
-            })
-        except Exception as e:
-            print(f"ADVERTENCIA: No se pudo descifrar la contraseña para el RUC {row['ruc']}. Error: {e}")
-    return contribuyentes
+    return list(iter_contribuyentes(active(), with_sire_creds(), lazy=lazy))
 
 # --- Funciones para el Buzón ---
 
@@ -248,40 +53,27 @@ def get_messages_by_ruc_as_dict(ruc: str):
 
 def add_message(msg_data: dict):
     """Añade un nuevo mensaje a la base de datos local."""
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    INSERT INTO buzon_mensajes (id, ruc, asunto, fecha_publicacion, leido, fecha_revision)
-    VALUES (:id, :ruc, :asunto, :fecha_publicacion, :leido, :fecha_revision)
-    """, msg_data)
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("""
+        INSERT INTO buzon_mensajes (id, ruc, asunto, fecha_publicacion, leido, fecha_revision)
+        VALUES (:id, :ruc, :asunto, :fecha_publicacion, :leido, :fecha_revision)
+        """, msg_data)
 
 def update_message_status(msg_id: int, leido: bool, fecha_revision: str):
     """Actualiza el estado 'leido' de un mensaje existente."""
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE buzon_mensajes SET leido = ?, fecha_revision = ? WHERE id = ?", (leido, fecha_revision, msg_id))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("UPDATE buzon_mensajes SET leido = ?, fecha_revision = ? WHERE id = ?", (leido, fecha_revision, msg_id))
 
 # --- Funciones para Reportes T-Registro ---
 
 def add_report_request(report_data: dict):
     """Añade una nueva solicitud de reporte a la base de datos local."""
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    INSERT INTO reportes_tregistro (ruc, tipo_reporte, ticket, estado, fecha_solicitud)
-    VALUES (:ruc, :tipo_reporte, :ticket, :estado, :fecha_solicitud)
-    """, report_data)
-    cursor.execute("SELECT id FROM reportes_tregistro ORDER BY id DESC LIMIT 1")
-    result = cursor.fetchone()
-    report_id = result[0] if result else 0
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return report_id
+    with transaction() as conn:
+        cursor = conn.execute("""
+        INSERT INTO reportes_tregistro (ruc, tipo_reporte, ticket, estado, fecha_solicitud)
+        VALUES (:ruc, :tipo_reporte, :ticket, :estado, :fecha_solicitud)
+        """, report_data)
+    return cursor.lastrowid or 0
 
 def get_pending_reports(ruc=None):
     """Obtiene reportes pendientes de descarga."""
@@ -291,228 +83,117 @@ def get_pending_reports(ruc=None):
         cursor.execute("SELECT * FROM reportes_tregistro WHERE ruc = ? AND estado = 'SOLICITADO'", (ruc,))
     else:
         cursor.execute("SELECT * FROM reportes_tregistro WHERE estado = 'SOLICITADO'")
-    reports = cursor.fetchall()
-    conn.close()
-    return reports
+    return cursor.fetchall()
 
 def update_report_status(report_id: int, estado: str, fecha_descarga=None):
     """Actualiza el estado de un reporte."""
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-    if fecha_descarga:
-        cursor.execute("UPDATE reportes_tregistro SET estado = ?, fecha_descarga = ? WHERE id = ?",
-                      (estado, fecha_descarga, report_id))
-    else:
-        cursor.execute("UPDATE reportes_tregistro SET estado = ? WHERE id = ?", (estado, report_id))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        if fecha_descarga:
+            conn.execute("UPDATE reportes_tregistro SET estado = ?, fecha_descarga = ? WHERE id = ?",
+                         (estado, fecha_descarga, report_id))
+        else:
+            conn.execute("UPDATE reportes_tregistro SET estado = ? WHERE id = ?", (estado, report_id))
 
 def update_report_ticket(report_id: int, ticket: str):
     """Actualiza el ticket de un reporte."""
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE reportes_tregistro SET ticket = ? WHERE id = ?", (ticket, report_id))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("UPDATE reportes_tregistro SET ticket = ? WHERE id = ?", (ticket, report_id))
 
 # --- Operaciones con la BD Central (PostgreSQL) ---
 
-def get_central_db_connection():
-    """Crea y devuelve una conexión a la base de datos central PostgreSQL."""
-    try:
-        conn = psycopg2.connect(
-            host=config.PG_HOST,
-            port=config.PG_PORT,
-            dbname=config.PG_DBNAME,
-            user=config.PG_USER,
-            password=config.PG_PASSWORD
-        )
-        return conn
-    except psycopg2.OperationalError as e:
-        print(f"ERROR: No se pudo conectar a la base de datos PostgreSQL. Revisa las credenciales en .env. Detalle: {e}")
-        return None
-
-def sync_clients_from_central_db():
-    """Sincroniza los clientes desde PostgreSQL a la base de datos local SQLite."""
-    print("Iniciando sincronización de clientes desde la BD Central...")
-    pg_conn = get_central_db_connection()
-    if not pg_conn:
-        print("Sincronización fallida.")
-        return
-
-    # !!! IMPORTANTE: Ajusta esta consulta a tu esquema de BD real. !!!
-    query = "SELECT ruc, usuario_sol, clave_sol, activo FROM priv.entities WHERE activo = TRUE"
-    
-    try:
-        pg_cursor = pg_conn.cursor()
-        pg_cursor.execute(query)
-        clients = pg_cursor.fetchall()
-    except Exception as e:
-        print(f"ERROR: Falló la consulta a la base de datos central. Revisa la consulta y los nombres de tablas/columnas. Detalle: {e}")
-        pg_conn.close()
-        return
-    finally:
-        pg_conn.close()
-
-    print(f"Se encontraron {len(clients)} clientes activos en la BD Central. Sincronizando...")
-    local_conn = get_local_db_connection()
-    local_cursor = local_conn.cursor()
-    key = config.ENCRYPTION_KEY.encode('utf-8')
-
-    active_rucs = []
-    for client in clients:
-        ruc, user_sol, plain_password, is_active = client
-        active_rucs.append(str(ruc))
-        if not plain_password:
-            print(f"ADVERTENCIA: Se omite el RUC {ruc} porque no tiene contraseña definida en la BD Central.")
-            continue
-
-        encrypted_pass = encrypt_password(plain_password, key)
-
-        local_cursor.execute("""
-        INSERT INTO contribuyentes (ruc, user_sol, password_sol_encrypted, is_active)
-        VALUES (?, ?, ?, ?)
-        ON CONFLICT(ruc) DO UPDATE SET
-            user_sol = excluded.user_sol,
-            password_sol_encrypted = excluded.password_sol_encrypted,
-            is_active = excluded.is_active;
-        """, (str(ruc), user_sol, encrypted_pass, is_active))
-
-    # Desactivar clientes no presentes en la lista activa
-    if active_rucs:
-        placeholders = ','.join('?' for _ in active_rucs)
-        local_cursor.execute(f"UPDATE contribuyentes SET is_active = 0 WHERE ruc NOT IN ({placeholders})", active_rucs)
-
-    local_conn.commit()
-    local_conn.close()
-    print("Sincronización completada.")
-
 def add_observation(ruc: str, mensaje: str, tipo: str = "LOCAL", estado: str = "PENDIENTE"):
     """Añade una nueva observación a la base de datos local."""
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
     timestamp = datetime.now().isoformat()
-    cursor.execute("""
-    INSERT INTO observaciones (ruc, mensaje, tipo, estado, timestamp)
-    VALUES (?, ?, ?, ?, ?)
-    """, (ruc, mensaje, tipo, estado, timestamp))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("""
+        INSERT INTO observaciones (ruc, mensaje, tipo, estado, timestamp, fecha_observacion)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """, (ruc, mensaje, tipo, estado, timestamp, timestamp))
 
 def update_central_db_observacion(ruc: str, observacion: str):
     """Añade una observación a un cliente en la BD Central PostgreSQL, concatenando con el texto existente."""
     print(f"Registrando observación para el RUC {ruc} en la BD Central...")
-    pg_conn = get_central_db_connection()
-    if not pg_conn:
-        return
-
-    try:
-        pg_cursor = pg_conn.cursor()
-        # Query current observaciones
-        pg_cursor.execute("SELECT observaciones FROM priv.entities WHERE ruc = %s", (str(ruc),))
-        row = pg_cursor.fetchone()
-        current = row[0] if row and row[0] else ""
-        # Concatenate
-        new_observacion = f"{current}|{observacion}" if current else observacion
-
-        # Update
-        query = "UPDATE priv.entities SET observaciones = %s WHERE ruc = %s"
-        pg_cursor.execute(query, (new_observacion, str(ruc)))
-        pg_conn.commit()
+    if update_central_db_observaciones([(ruc, observacion)]):
         print("Observación registrada correctamente.")
-    except Exception as e:
-        print(f"ERROR al actualizar la BD Central: {e}")
-        pg_conn.rollback()
-    finally:
-        pg_conn.close()
+
+def update_central_db_observaciones(observaciones):
+    """
+    Añade observaciones a varios clientes de la BD Central en un solo UPDATE.
+
+    Las observaciones de un mismo RUC se concatenan con '|' en el orden
+    recibido y luego se agregan al texto existente, como hace
+    update_central_db_observacion con una sola.
+
+    Args:
+        observaciones: Iterable de (ruc, observacion).
+
+    Returns:
+        bool: True si la BD central quedó actualizada.
+    """
+    por_ruc = {}
+    for ruc, observacion in observaciones:
+        por_ruc.setdefault(str(ruc), []).append(observacion)
+    if not por_ruc:
+        return True
+
+    with central_connection() as pg_conn:
+        if not pg_conn:
+            return False
+        try:
+            with pg_conn.cursor() as pg_cursor:
+                # e.ruc se compara como texto: el tipo de la columna central no es fijo
+                execute_values(pg_cursor, """
+                    UPDATE priv.entities AS e
+                    SET observaciones = CASE
+                        WHEN COALESCE(e.observaciones, '') = '' THEN v.observacion
+                        ELSE e.observaciones || '|' || v.observacion
+                    END
+                    FROM (VALUES %s) AS v (ruc, observacion)
+                    WHERE e.ruc::text = v.ruc
+                """, [(ruc, "|".join(obs)) for ruc, obs in por_ruc.items()], page_size=1000)
+            pg_conn.commit()
+            return True
+        except Exception as e:
+            print(f"ERROR al actualizar la BD Central: {e}")
+            pg_conn.rollback()
+            return False
 
 def sync_determinant_observations_to_central():
     """Sincroniza observaciones determinantes pendientes para todos los RUC a la BD central."""
     conn = get_local_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, ruc, mensaje FROM observaciones WHERE tipo = 'DETERMINANTE' AND estado = 'PENDIENTE'")
-    pending = cursor.fetchall()
-    conn.close()
+    pending = conn.execute(
+        "SELECT id, ruc, mensaje FROM observaciones WHERE tipo = 'DETERMINANTE' AND estado = 'PENDIENTE' ORDER BY id"
+    ).fetchall()
 
     if not pending:
         return
 
-    for obs_id, ruc, mensaje in pending:
-        update_central_db_observacion(ruc, mensaje)
-        # Mark as synced
-        conn = get_local_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE observaciones SET estado = 'SINCRONIZADO' WHERE id = ?", (obs_id,))
-        conn.commit()
-        conn.close()
-
-def sync_buzon_to_central(ruc: str):
-    """Sincroniza mensajes de buzón local a la tabla central priv.buzon_sunat."""
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, asunto, fecha_publicacion, leido, fecha_revision FROM buzon_mensajes WHERE ruc = ?", (ruc,))
-    local_messages = cursor.fetchall()
-    conn.close()
-
-    if not local_messages:
+    # Si la BD central no se actualizó, quedan pendientes para el próximo intento
+    if not update_central_db_observaciones((ruc, mensaje) for _, ruc, mensaje in pending):
         return
 
-    pg_conn = get_central_db_connection()
-    if not pg_conn:
-        return
+    # Marcar todas como sincronizadas en una sola transacción
+    with transaction() as conn:
+        conn.executemany(
+            "UPDATE observaciones SET estado = 'SINCRONIZADO' WHERE id = ?",
+            [(obs_id,) for obs_id, _, _ in pending],
+        )
+    print(f"{len(pending)} observaciones determinantes sincronizadas con la BD Central.")
 
-    try:
-        pg_cursor = pg_conn.cursor()
-        for msg in local_messages:
-            msg_id, asunto, fecha_publicacion_str, leido_int, fecha_revision = msg
-            leido = bool(leido_int)  # Convert to bool
-            # Parse fecha_publicacion to date
-            try:
-                fecha_recepcion = datetime.strptime(fecha_publicacion_str, "%d/%m/%Y %H:%M:%S").date()
-            except ValueError:
-                print(f"Error parsing fecha_publicacion: {fecha_publicacion_str}")
-                continue
-            # Check if exists
-            pg_cursor.execute("SELECT leido FROM priv.buzon_sunat WHERE id = %s", (msg_id,))
-            existing = pg_cursor.fetchone()
-            if existing:
-                # Update if leido changed to true
-                if not existing[0] and leido:
-                    pg_cursor.execute("""
-                        UPDATE priv.buzon_sunat
-                        SET leido = %s, fecha_revision = %s
-                        WHERE id = %s
-                    """, (leido, fecha_revision, msg_id))
-            else:
-                # Insert new
-                pg_cursor.execute("""
-                    INSERT INTO priv.buzon_sunat (id, asunto, fecha_recepcion, fecha_revision, leido, observaciones, ruc)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (msg_id, asunto, fecha_recepcion, fecha_revision, leido, '', ruc))
-        pg_conn.commit()
-    except Exception as e:
-        print(f"Error syncing buzon to central: {e}")
-        pg_conn.rollback()
-    finally:
-        pg_conn.close()
+def sync_buzon_to_central(ruc: str):
+    """Sincroniza mensajes de buzón local a la tabla central priv.buzon_sunat."""
+    sync_buzones_to_central([ruc])
 
 # --- Funciones para SIRE ---
 
 def add_sire_request(sire_data: dict):
     """Añade una nueva solicitud de reporte SIRE a la base de datos local."""
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    INSERT INTO sire_reportes (ruc, tipo, periodo, ticket, estado, fecha_solicitud)
-    VALUES (:ruc, :tipo, :periodo, :ticket, :estado, :fecha_solicitud)
-    """, sire_data)
-    cursor.execute("SELECT id FROM sire_reportes ORDER BY id DESC LIMIT 1")
-    result = cursor.fetchone()
-    sire_id = result[0] if result else 0
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return sire_id
+    with transaction() as conn:
+        cursor = conn.execute("""
+        INSERT INTO sire_reportes (ruc, tipo, periodo, ticket, estado, fecha_solicitud)
+        VALUES (:ruc, :tipo, :periodo, :ticket, :estado, :fecha_solicitud)
+        """, sire_data)
+    return cursor.lastrowid or 0
 
 def get_pending_sire_reports(ruc=None, tipo=None):
     """Obtiene reportes SIRE pendientes."""
@@ -527,104 +208,35 @@ def get_pending_sire_reports(ruc=None, tipo=None):
         query += " AND tipo = ?"
         params.append(tipo)
     cursor.execute(query, params)
-    reports = cursor.fetchall()
-    conn.close()
-    return reports
+    return cursor.fetchall()
 
-def update_sire_status(sire_id: int, estado: str, nom_archivo=None, fecha_descarga=None):
-    """Actualiza el estado de un reporte SIRE."""
+def get_sire_report(sire_id: int):
+    """Obtiene un reporte SIRE por su ID."""
     conn = get_local_db_connection()
-    cursor = conn.cursor()
-    if fecha_descarga:
-        cursor.execute("UPDATE sire_reportes SET estado = ?, nom_archivo = ?, fecha_descarga = ? WHERE id = ?",
-                      (estado, nom_archivo, fecha_descarga, sire_id))
-    else:
-        cursor.execute("UPDATE sire_reportes SET estado = ? WHERE id = ?", (estado, sire_id))
-    conn.commit()
-    conn.close()
+    return conn.execute("SELECT * FROM sire_reportes WHERE id = ?", (sire_id,)).fetchone()
 
-# --- Funciones para SIRE Tokens ---
+def get_sire_reports_for_period(periodo: str):
+    """
+    Último reporte SIRE de cada (ruc, tipo) para un período.
 
-def save_sire_token(ruc: str, token: str, expires_at: str):
-    """Guarda un token SIRE en la BD local (cifrado)."""
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-    key = config.ENCRYPTION_KEY.encode('utf-8')
-    encrypted_token = encrypt_password(token, key)
-    cursor.execute("""
-    INSERT OR REPLACE INTO sire_tokens (ruc, token_encrypted, expires_at)
-    VALUES (?, ?, ?)
-    """, (ruc, encrypted_token, expires_at))
-    conn.commit()
-    conn.close()
-
-def get_valid_sire_token(ruc: str):
-    """Obtiene un token SIRE válido de la BD local (descifrado)."""
+    Returns:
+        dict: {(ruc, tipo): fila} con la fila más reciente de cada par.
+    """
     conn = get_local_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT token_encrypted, expires_at FROM sire_tokens WHERE ruc = ?", (ruc,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        token_encrypted, expires_at = row
-        if datetime.fromisoformat(expires_at) > datetime.now():
-            key = config.ENCRYPTION_KEY.encode('utf-8')
-            return decrypt_password(token_encrypted, key)
-    return None
+    cursor = conn.execute("SELECT * FROM sire_reportes WHERE periodo = ? ORDER BY id", (periodo,))
+    return {(row['ruc'], row['tipo']): row for row in cursor}
 
-def clean_expired_sire_tokens():
-    """Limpia tokens SIRE expirados."""
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM sire_tokens WHERE expires_at < ?", (datetime.now().isoformat(),))
-    conn.commit()
-    conn.close()
+def update_sire_status(sire_id: int, estado: str, nom_archivo=None, fecha_descarga=None):
+    """Actualiza el estado de un reporte SIRE."""
+    with transaction() as conn:
+        if fecha_descarga:
+            conn.execute("UPDATE sire_reportes SET estado = ?, nom_archivo = ?, fecha_descarga = ? WHERE id = ?",
+                         (estado, nom_archivo, fecha_descarga, sire_id))
+        else:
+            conn.execute("UPDATE sire_reportes SET estado = ? WHERE id = ?", (estado, sire_id))
 
 # --- Funciones para otras_credenciales ---
 
-def sync_otras_credenciales_from_central_db():
-    """Sincroniza otras_credenciales desde PostgreSQL a SQLite."""
-    print("Iniciando sincronización de otras_credenciales desde BD Central...")
-    pg_conn = get_central_db_connection()
-    if not pg_conn:
-        print("Sincronización fallida.")
-        return
-
-    # Se cambia la consulta para traer 'notas' en lugar de 'observaciones'
-    query = "SELECT ruc, tipo, usuario, contrasena, credencial3, notas FROM priv.otras_credenciales"
-    try:
-        pg_cursor = pg_conn.cursor()
-        pg_cursor.execute(query)
-        creds = pg_cursor.fetchall()
-    except Exception as e:
-        print(f"ERROR: Falló consulta en BD central: {e}")
-        pg_conn.close()
-        return
-    finally:
-        pg_conn.close()
-
-    print(f"Se encontraron {len(creds)} registros de otras_credenciales.")
-    local_conn = get_local_db_connection()
-    local_cursor = local_conn.cursor()
-
-    # Limpieza total de la tabla local para evitar duplicados
-    local_cursor.execute("DELETE FROM otras_credenciales")
-    print("Tabla local 'otras_credenciales' limpiada antes de la inserción.")
-
-    for cred in creds:
-        # Aquí 'observaciones' en la variable local contendrá el valor de 'notas' de la BD central
-        ruc, tipo, usuario, contrasena, credencial3, observaciones = cred
-        
-        # Se inserta en la columna 'observaciones' de SQLite el valor que vino de 'notas'
-        local_cursor.execute("""
-        INSERT INTO otras_credenciales (ruc, tipo, usuario, contrasena, credencial3, observaciones)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """, (str(ruc), tipo, usuario, contrasena, credencial3, observaciones))
-
-    local_conn.commit()
-    local_conn.close()
-    print("Sincronización de otras_credenciales completada.")
-
 def get_otras_credenciales(ruc=None, tipo=None):
     """Obtiene otras_credenciales."""
     conn = get_local_db_connection()
@@ -638,9 +250,7 @@ def get_otras_credenciales(ruc=None, tipo=None):
         query += (" AND" if ruc else " WHERE") + " tipo = ?"
         params.append(tipo)
     cursor.execute(query, params)
-    creds = cursor.fetchall()
-    conn.close()
-    return creds
+    return cursor.fetchall()
 
 def get_sire_credentials(ruc: str):
     """Obtiene credenciales SIRE para un RUC (tipo APISUNAT con SIRE en credencial3)."""
@@ -653,7 +263,6 @@ def get_sire_credentials(ruc: str):
     WHERE oc.ruc = ? AND oc.tipo = 'APISUNAT' AND oc.observaciones LIKE '%SIRE%'
     """, (ruc,))
     row = cursor.fetchone()
-    conn.close()
     if row:
         return {
             'client_id': row[0],
@@ -662,7 +271,7 @@ def get_sire_credentials(ruc: str):
         }
     return None
 
-def get_contribuyentes_with_pending_reports():
+def get_contribuyentes_with_pending_reports(lazy: bool = False):
     """
     Obtiene una lista de contribuyentes activos que tienen al menos un reporte
     T-Registro con estado 'SOLICITADO'.
@@ -671,35 +280,4 @@ def get_contribuyentes_with_pending_reports():
         list[dict]: Una lista de diccionarios, donde cada diccionario
                     representa a un contribuyente con reportes pendientes.
     """
-    conn = get_local_db_connection()
-    cursor = conn.cursor()
-    query = """
-        SELECT DISTINCT
-            c.ruc,
-            c.user_sol,
-            c.password_sol_encrypted
-        FROM
-            contribuyentes c
-        JOIN
-            reportes_tregistro r ON c.ruc = r.ruc
-        WHERE
-            c.is_active = 1
-            AND r.estado = 'SOLICITADO';
-    """
-    cursor.execute(query)
-    rows = cursor.fetchall()
-    conn.close()
-
-    key = config.ENCRYPTION_KEY.encode('utf-8')
-    contribuyentes = []
-    for row in rows:
-        try:
-            decrypted_pass = decrypt_password(row['password_sol_encrypted'], key)
-            contribuyentes.append({
-                "ruc": row['ruc'],
-                "user_sol": row['user_sol'],
-                "password_sol": decrypted_pass
-            })
-        except Exception as e:
-            print(f"ADVERTENCIA: No se pudo descifrar la contraseña para el RUC {row['ruc']}. Error: {e}")
-    return contribuyentes
+    return list(iter_contribuyentes(active(), with_pending_reports(), lazy=lazy))
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Sincronización entre la BD Central (PostgreSQL) y la BD local (SQLite).
+
+Central → local (clientes y otras_credenciales), incremental.
+
+En lugar de recargar las tablas locales fila por fila, cada sincronización:
+
+1. Lee la BD central con un cursor de servidor (named cursor), por lotes de
+   SYNC_CHUNK_SIZE filas, sin cargar el resultado completo en memoria.
+2. Compara la huella (source_hash) de cada fila con la guardada localmente
+   y solo conserva las filas nuevas o modificadas. Solo esas se cifran.
+3. Aplica los cambios (upserts y borrados por diferencia) con executemany
+   en una única transacción corta, después de terminar la lectura: el lock
+   de escritura de SQLite dura en proporción a los cambios, no al total.
+
+La huella es un HMAC-SHA256 con ENCRYPTION_KEY, porque incluye contraseñas
+en texto plano y no debe poder compararse contra un diccionario.
+
+Local → central (buzón SUNAT), en bloque: sync_buzones_to_central lee los
+mensajes de todos los RUC pedidos en una consulta, valida y convierte
+fecha_publicacion en la misma consulta SQL, y los envía con execute_values
+a un único INSERT ... ON CONFLICT por página.
+"""
+import hashlib
+import hmac
+import json
+from itertools import chain, islice
+
+from psycopg2.extras import execute_values
+
+from ..config import config
+from ..security import get_crypto_service
+from .connection import get_local_db_connection, central_connection, transaction
+
+SYNC_CHUNK_SIZE = 2000
+
+
+def _source_hash(*values) -> str:
+    """Huella de una fila de origen (HMAC-SHA256 de sus valores)."""
+    data = "\x1f".join("" if v is None else str(v) for v in values)
+    return hmac.new(config.ENCRYPTION_KEY.encode('utf-8'), data.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def _stream_central(pg_conn, name: str, query: str):
+    """Itera el resultado de `query` con un cursor de servidor, por lotes."""
+    pg_cursor = pg_conn.cursor(name=name)
+    pg_cursor.itersize = SYNC_CHUNK_SIZE
+    try:
+        pg_cursor.execute(query)
+        while True:
+            rows = pg_cursor.fetchmany(SYNC_CHUNK_SIZE)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        pg_cursor.close()
+
+
+def _executemany_chunked(cursor, sql: str, rows):
+    """executemany por lotes de SYNC_CHUNK_SIZE (acota la memoria de cada llamada)."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, SYNC_CHUNK_SIZE))
+        if not chunk:
+            break
+        cursor.executemany(sql, chunk)
+
+
+def _read_central(name: str, query: str, consume):
+    """
+    Toma una conexión del pool, pasa el stream de filas a `consume` y la devuelve.
+
+    Returns:
+        bool: False si no hubo conexión o falló la consulta.
+    """
+    with central_connection() as pg_conn:
+        if not pg_conn:
+            print("Sincronización fallida.")
+            return False
+        try:
+            consume(_stream_central(pg_conn, name, query))
+            return True
+        except Exception as e:
+            print(f"ERROR: Falló la consulta a la base de datos central. Revisa la consulta y los nombres de tablas/columnas. Detalle: {e}")
+            pg_conn.rollback()
+            return False
+
+
+def sync_clients_from_central_db():
+    """Sincroniza los clientes desde PostgreSQL a la base de datos local SQLite."""
+    print("Iniciando sincronización de clientes desde la BD Central...")
+
+    # Estado local actual: ruc -> (source_hash, is_active). No requiere descifrar nada.
+    local = {
+        row['ruc']: (row['source_hash'], row['is_active'])
+        for row in get_local_db_connection().execute(
+            "SELECT ruc, source_hash, is_active FROM contribuyentes"
+        )
+    }
+    crypto = get_crypto_service()
+    seen = set()
+    upserts = []
+
+    def consume(rows):
+        for ruc, user_sol, plain_password, is_active in rows:
+            ruc = str(ruc)
+            seen.add(ruc)
+            if not plain_password:
+                print(f"ADVERTENCIA: Se omite el RUC {ruc} porque no tiene contraseña definida en la BD Central.")
+                continue
+            source_hash = _source_hash(ruc, user_sol, plain_password, is_active)
+            current = local.get(ruc)
+            if current is not None and current[0] == source_hash and bool(current[1]) == bool(is_active):
+                continue
+            upserts.append((ruc, user_sol, crypto.encrypt(plain_password), is_active, source_hash))
+
+    # !!! IMPORTANTE: Ajusta esta consulta a tu esquema de BD real. !!!
+    query = "SELECT ruc, usuario_sol, clave_sol, activo FROM priv.entities WHERE activo = TRUE"
+    if not _read_central("sync_contribuyentes", query, consume):
+        return
+
+    print(f"Se encontraron {len(seen)} clientes activos en la BD Central. Sincronizando...")
+
+    # Desactivar clientes activos localmente que ya no vienen en la BD central
+    # (como antes, una respuesta vacía no desactiva a todos)
+    deactivate = [
+        (ruc,) for ruc, (_, is_active) in local.items() if is_active and ruc not in seen
+    ] if seen else []
+
+    with transaction() as local_conn:
+        local_cursor = local_conn.cursor()
+        _executemany_chunked(local_cursor, """
+        INSERT INTO contribuyentes (ruc, user_sol, password_sol_encrypted, is_active, source_hash)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(ruc) DO UPDATE SET
+            user_sol = excluded.user_sol,
+            password_sol_encrypted = excluded.password_sol_encrypted,
+            is_active = excluded.is_active,
+            source_hash = excluded.source_hash;
+        """, upserts)
+        _executemany_chunked(local_cursor, "UPDATE contribuyentes SET is_active = 0 WHERE ruc = ?", deactivate)
+
+    print(f"Sincronización completada: {len(upserts)} nuevos o modificados, "
+          f"{len(deactivate)} desactivados, {len(seen) - len(upserts)} sin cambios.")
+
+
+def sync_otras_credenciales_from_central_db():
+    """
+    Sincroniza otras_credenciales desde PostgreSQL a SQLite.
+
+    La tabla local no guarda la clave de la central, así que cada fila se
+    identifica por su huella, que incluye el id central además del
+    contenido: se insertan las huellas nuevas y se borran las locales que
+    ya no existen en la BD central (incluidas las filas anteriores a la
+    columna source_hash). Dos filas centrales idénticas siguen siendo dos
+    filas locales, como con la recarga completa.
+    """
+    print("Iniciando sincronización de otras_credenciales desde BD Central...")
+
+    local_hashes = {
+        row['source_hash']
+        for row in get_local_db_connection().execute("SELECT source_hash FROM otras_credenciales")
+    }
+    seen = set()
+    inserts = []
+
+    def consume(rows):
+        for cred in rows:
+            # Aquí 'observaciones' en la variable local contendrá el valor de 'notas' de la BD central
+            central_id, ruc, tipo, usuario, contrasena, credencial3, observaciones = cred
+            source_hash = _source_hash(central_id, ruc, tipo, usuario, contrasena, credencial3, observaciones)
+            seen.add(source_hash)
+            if source_hash not in local_hashes:
+                inserts.append((str(ruc), tipo, usuario, contrasena, credencial3, observaciones, source_hash))
+
+    # Se cambia la consulta para traer 'notas' en lugar de 'observaciones'
+    query = "SELECT id, ruc, tipo, usuario, contrasena, credencial3, notas FROM priv.otras_credenciales"
+    if not _read_central("sync_otras_credenciales", query, consume):
+        return
+
+    print(f"Se encontraron {len(seen)} registros de otras_credenciales.")
+    deletes = [(h,) for h in local_hashes - seen if h is not None]
+
+    with transaction() as local_conn:
+        local_cursor = local_conn.cursor()
+        local_cursor.execute("DELETE FROM otras_credenciales WHERE source_hash IS NULL")
+        _executemany_chunked(local_cursor, "DELETE FROM otras_credenciales WHERE source_hash = ?", deletes)
+        # Se inserta en la columna 'observaciones' de SQLite el valor que vino de 'notas'
+        _executemany_chunked(local_cursor, """
+        INSERT INTO otras_credenciales (ruc, tipo, usuario, contrasena, credencial3, observaciones, source_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, inserts)
+
+    print(f"Sincronización de otras_credenciales completada: {len(inserts)} nuevas, "
+          f"{len(deletes)} eliminadas, {len(seen) - len(inserts)} sin cambios.")
+
+
+# --- Buzón local → BD central ---
+
+BUZON_PAGE_SIZE = 1000
+
+# fecha_publicacion llega como 'DD/MM/YYYY HH:MM:SS'. Se reordena a ISO y se
+# valida con un ida y vuelta por julianday (rechaza formatos y fechas
+# imposibles, como 31/02), equivalente al strptime que se hacía por fila.
+BUZON_LOCAL_QUERY = """
+SELECT id, asunto, fecha_publicacion, fecha_revision, leido, ruc,
+       substr(iso, 1, 10) AS fecha_recepcion,
+       COALESCE(datetime(julianday(iso)) = iso, 0) AS fecha_valida
+FROM (
+    SELECT *,
+           substr(fecha_publicacion, 7, 4) || '-' || substr(fecha_publicacion, 4, 2) || '-' ||
+           substr(fecha_publicacion, 1, 2) || ' ' || substr(fecha_publicacion, 12, 8) AS iso
+    FROM buzon_mensajes
+    {where}
+)
+"""
+
+# Inserta los mensajes nuevos; en los existentes solo registra la lectura
+# (leido pasa de FALSE a TRUE), igual que la sincronización por mensaje.
+BUZON_UPSERT = """
+INSERT INTO priv.buzon_sunat (id, asunto, fecha_recepcion, fecha_revision, leido, observaciones, ruc)
+VALUES %s
+ON CONFLICT (id) DO UPDATE SET
+    leido = EXCLUDED.leido,
+    fecha_revision = EXCLUDED.fecha_revision
+WHERE NOT priv.buzon_sunat.leido AND EXCLUDED.leido
+"""
+
+
+def _local_buzon_rows(rucs=None):
+    """Mensajes locales listos para la BD central (omite fechas inválidas)."""
+    where, params = "", ()
+    if rucs is not None:
+        where = "WHERE ruc IN (SELECT value FROM json_each(?))"
+        params = (json.dumps([str(ruc) for ruc in rucs]),)
+    for row in get_local_db_connection().execute(BUZON_LOCAL_QUERY.format(where=where), params):
+        if not row['fecha_valida']:
+            print(f"Error parsing fecha_publicacion: {row['fecha_publicacion']}")
+            continue
+        yield (row['id'], row['asunto'], row['fecha_recepcion'], row['fecha_revision'],
+               bool(row['leido']), '', row['ruc'])
+
+
+def sync_buzones_to_central(rucs=None):
+    """
+    Sincroniza los mensajes de buzón locales a priv.buzon_sunat.
+
+    Args:
+        rucs: RUCs a sincronizar; None sincroniza todos los mensajes locales.
+
+    Returns:
+        int: Mensajes enviados a la BD central (0 si no hubo o si falló).
+    """
+    rows = _local_buzon_rows(rucs)
+    first = next(rows, None)
+    if first is None:
+        return 0
+
+    sent = 0
+
+    def counted():
+        nonlocal sent
+        for row in chain((first,), rows):
+            sent += 1
+            yield row
+
+    with central_connection() as pg_conn:
+        if not pg_conn:
+            return 0
+        try:
+            with pg_conn.cursor() as pg_cursor:
+                execute_values(pg_cursor, BUZON_UPSERT, counted(), page_size=BUZON_PAGE_SIZE)
+            pg_conn.commit()
+        except Exception as e:
+            print(f"Error syncing buzon to central: {e}")
+            pg_conn.rollback()
+            return 0
+
+    print(f"Buzón sincronizado con la BD central: {sent} mensajes.")
+    return sent
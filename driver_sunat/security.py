@@ -1,12 +1,166 @@
 # -*- coding: utf-8 -*-
-from cryptography.fernet import Fernet
+"""
+Cifrado de credenciales con Fernet.
+
+CryptoService construye el cifrador una sola vez y lo reutiliza. Si se
+definen claves anteriores (ENCRYPTION_KEYS_OLD) usa MultiFernet: cifra con
+la clave actual y descifra con cualquiera de ellas, lo que permite rotar
+ENCRYPTION_KEY sin perder los datos ya cifrados (ver rotate()).
+"""
+from functools import lru_cache
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+from .config import config
+
+
+class CryptoService:
+    """Cifrador Fernet/MultiFernet reutilizable."""
+
+    def __init__(self, key, old_keys=()):
+        keys = [key, *old_keys]
+        fernets = [Fernet(k) for k in keys]
+        self._cipher = MultiFernet(fernets) if len(fernets) > 1 else fernets[0]
+
+    def encrypt(self, plaintext: str) -> bytes:
+        """Cifra un texto con la clave actual."""
+        return self._cipher.encrypt(plaintext.encode('utf-8'))
+
+    def decrypt(self, token: bytes) -> str:
+        """Descifra un token (con la clave actual o una anterior)."""
+        return self._cipher.decrypt(token).decode('utf-8')
+
+    def rotate(self, token: bytes) -> bytes:
+        """Vuelve a cifrar un token con la clave actual."""
+        if isinstance(self._cipher, MultiFernet):
+            return self._cipher.rotate(token)
+        return token
+
+    def _decrypt_or_none(self, token):
+        try:
+            return self.decrypt(token)
+        except (InvalidToken, TypeError, ValueError):
+            return None
+
+    def decrypt_many(self, tokens) -> list:
+        """
+        Descifra una lista de tokens conservando el orden.
+
+        Los tokens inválidos devuelven None en su posición (para que el
+        llamador decida cómo reportarlos). Se descifra en el hilo actual:
+        Fernet no libera el GIL, y con un pool de hilos el lote tarda más.
+        """
+        return [self._decrypt_or_none(t) for t in tokens]
+
+    def lazy(self, data: dict, field: str, token: bytes) -> "LazySecretDict":
+        """dict con `data` cuyo campo `field` se descifra al primer acceso."""
+        return LazySecretDict(data, field, token, self)
+
+
+class _Pendiente:
+    """Valor del campo cifrado antes de descifrarlo (no expone el token)."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<cifrado>"
+
+
+_PENDIENTE = _Pendiente()
+
+
+class LazySecretDict(dict):
+    """
+    dict que descifra uno de sus campos recién cuando se lee su valor.
+
+    El campo está presente desde el inicio: keys(), len(), la iteración, ==,
+    dict(d), {**d} y json.dumps(d) lo incluyen, y los que necesitan el valor
+    lo descifran. Un token inválido lanza InvalidToken en ese acceso.
+    """
+    __slots__ = ("_field", "_token", "_crypto")
+
+    def __init__(self, data: dict, field: str, token: bytes, crypto: CryptoService):
+        super().__init__(data)
+        super().__setitem__(field, _PENDIENTE)
+        self._field = field
+        self._token = token
+        self._crypto = crypto
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if value is _PENDIENTE:
+            value = self._crypto.decrypt(self._token)
+            super().__setitem__(key, value)
+        return value
+
+    def _descifrar(self):
+        if super().get(self._field) is _PENDIENTE:
+            self[self._field]
+
+    # dict(d) y {**d} solo pasan por keys() y __getitem__ si __iter__ está
+    # redefinido; si no, copian el almacenamiento interno (el marcador).
+    def __iter__(self):
+        return super().__iter__()
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        self._descifrar()
+        return super().items()
+
+    def values(self):
+        self._descifrar()
+        return super().values()
+
+    def copy(self) -> dict:
+        self._descifrar()
+        return dict(super().items())
+
+    def pop(self, key, *default):
+        if key == self._field:
+            self._descifrar()
+        return super().pop(key, *default)
+
+    def popitem(self):
+        self._descifrar()
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        return super().setdefault(key, default)
+
+    def __eq__(self, other):
+        self._descifrar()
+        if isinstance(other, LazySecretDict):
+            other._descifrar()
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+
+@lru_cache(maxsize=8)
+def _service_for(key: bytes, old_keys: tuple = ()) -> CryptoService:
+    return CryptoService(key, old_keys)
+
+
+def get_crypto_service() -> CryptoService:
+    """CryptoService de la aplicación (ENCRYPTION_KEY + ENCRYPTION_KEYS_OLD)."""
+    return _service_for(
+        config.ENCRYPTION_KEY.encode('utf-8'),
+        tuple(k.encode('utf-8') for k in config.ENCRYPTION_KEYS_OLD),
+    )
+
 
 def encrypt_password(password: str, key: bytes) -> bytes:
     """Cifra una contraseña en texto plano usando la clave proporcionada."""
-    f = Fernet(key)
-    return f.encrypt(password.encode('utf-8'))
+    return _service_for(key).encrypt(password)
+
 
 def decrypt_password(encrypted_password: bytes, key: bytes) -> str:
     """Descifra una contraseña cifrada usando la clave proporcionada."""
-    f = Fernet(key)
-    return f.decrypt(encrypted_password).decode('utf-8')
+    return _service_for(key).decrypt(encrypted_password)
@@ -0,0 +1,10 @@
+"""
+Arnés de pruebas de carga del pipeline SIRE.
+
+- sunat_simulator: simulador local de los endpoints de SUNAT que usa SireClient.
+- webhook_sink: receptor de webhooks que registra la hora de llegada.
+- driver: encarga N operaciones por la API real y reporta throughput,
+  latencias, llamadas a SUNAT por operación y pico de RSS de los workers.
+
+Ver loadtest/README.md.
+"""
@@ -0,0 +1,326 @@
+"""
+Driver de pruebas de carga del pipeline SIRE.
+
+Encarga N operaciones por POST /api/v1/sire/descargar de la API real,
+espera a que cada una termine (long-poll sobre /operaciones/{id}/esperar o
+webhook recibido por loadtest.webhook_sink) y reporta:
+
+- throughput (operaciones terminadas por minuto)
+- latencia de punta a punta p50/p95/p99 (POST → estado final / webhook)
+- llamadas a SUNAT por operación (contadores del simulador)
+- pico de RSS de los procesos del worker (worker_peak_rss_bytes)
+
+Uso (con docker-compose.loadtest.yml levantado)::
+
+    python -m loadtest.driver --operaciones 500 --rucs 50 --sembrar
+
+--sembrar crea credenciales ficticias en priv.otras_credenciales y
+priv.entities para los RUCs de la prueba (usa DATABASE_URL).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import time
+from datetime import date
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger("loadtest")
+
+# Estados a partir de los cuales la operación ya no cambia para la prueba:
+# S3_UPLOADED es el último paso del pipeline antes del webhook
+_ESTADOS_TERMINADOS = {"S3_UPLOADED", "WEBHOOK_SENT", "COMPLETED", "EMPTY", "ERROR"}
+
+_RUC_BASE = 20_100_000_000
+
+
+# ---------------------------------------------------------------------------
+# Plan de la prueba
+# ---------------------------------------------------------------------------
+def _restar_meses(d: date, meses: int) -> str:
+    total = d.year * 12 + d.month - 1 - meses
+    return f"{total // 12:04d}{total % 12 + 1:02d}"
+
+
+def generar_solicitudes(operaciones: int, rucs: int) -> list:
+    """
+    (ruc, periodo, tipo) únicos, repartidos en round-robin entre 'rucs' RUCs:
+    cada RUC recorre ventas/compras de los meses anteriores al actual.
+    """
+    hoy = date.today()
+    solicitudes = []
+    for i in range(operaciones):
+        ruc = str(_RUC_BASE + i % rucs)
+        k = i // rucs
+        tipo = "ventas" if k % 2 == 0 else "compras"
+        solicitudes.append((ruc, _restar_meses(hoy, 1 + k // 2), tipo))
+    return solicitudes
+
+
+def sembrar_credenciales(rucs: list):
+    """Crea credenciales SIRE ficticias para los RUCs (idempotente)."""
+    from sqlalchemy import text
+
+    from core.database import engine_sync
+
+    with engine_sync.begin() as conn:
+        conn.execute(text("CREATE SCHEMA IF NOT EXISTS priv"))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS priv.otras_credenciales (
+                id SERIAL PRIMARY KEY, ruc BIGINT, tipo VARCHAR, usuario VARCHAR,
+                contrasena VARCHAR, credencial3 VARCHAR, notas VARCHAR,
+                observaciones VARCHAR
+            )
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS priv.entities (
+                id SERIAL PRIMARY KEY, ruc BIGINT NOT NULL, usuario_sol VARCHAR,
+                clave_sol VARCHAR, activo VARCHAR, observaciones VARCHAR
+            )
+        """))
+        for ruc in rucs:
+            conn.execute(
+                text("""
+                    INSERT INTO priv.otras_credenciales (ruc, tipo, usuario, contrasena, notas)
+                    SELECT :ruc, 'APISUNAT', 'cliente-' || :ruc, 'secreto', 'SIRE'
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM priv.otras_credenciales
+                        WHERE ruc = :ruc AND tipo = 'APISUNAT' AND notas = 'SIRE'
+                    )
+                """),
+                {"ruc": int(ruc)},
+            )
+            conn.execute(
+                text("""
+                    INSERT INTO priv.entities (ruc, usuario_sol, clave_sol, activo)
+                    SELECT :ruc, 'LOADTEST', 'clave', 'SI'
+                    WHERE NOT EXISTS (SELECT 1 FROM priv.entities WHERE ruc = :ruc)
+                """),
+                {"ruc": int(ruc)},
+            )
+    logger.info("Credenciales sembradas para %d RUCs", len(rucs))
+
+
+# ---------------------------------------------------------------------------
+# Métricas
+# ---------------------------------------------------------------------------
+def percentil(valores: list, p: float) -> Optional[float]:
+    """Percentil por rango más cercano (p en 0-100)."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[indice]
+
+
+def _valor_metrica(texto: str, nombre: str) -> Optional[float]:
+    """Máximo de las muestras 'nombre' en una exposición Prometheus."""
+    valores = []
+    for linea in texto.splitlines():
+        if linea.startswith(nombre) and linea[len(nombre):len(nombre) + 1] in (" ", "{"):
+            valores.append(float(linea.rsplit(" ", 1)[1]))
+    return max(valores) if valores else None
+
+
+async def _muestrear_rss(client: httpx.AsyncClient, url: str, pico: dict, fin: asyncio.Event):
+    """Consulta el exportador del worker hasta 'fin' y guarda el máximo RSS."""
+    while not fin.is_set():
+        try:
+            texto = (await client.get(url, timeout=5)).text
+            rss = _valor_metrica(texto, "worker_peak_rss_bytes") or _valor_metrica(
+                texto, "process_resident_memory_bytes"
+            )
+            if rss:
+                pico["rss"] = max(pico.get("rss", 0), rss)
+        except httpx.HTTPError as e:
+            logger.debug("No se pudo leer %s: %s", url, e)
+        try:
+            await asyncio.wait_for(fin.wait(), timeout=2)
+        except asyncio.TimeoutError:
+            pass
+
+
+# ---------------------------------------------------------------------------
+# Ejecución
+# ---------------------------------------------------------------------------
+async def _encargar(client, api: str, solicitud: tuple, webhook_url: str, sem) -> dict:
+    ruc, periodo, tipo = solicitud
+    async with sem:
+        enviado_en = time.time()
+        response = await client.post(
+            f"{api}/api/v1/sire/descargar",
+            json={"ruc": ruc, "periodo": periodo, "tipo": tipo, "webhook_url": webhook_url},
+            timeout=30,
+        )
+    resultado = {
+        "clave": solicitud,
+        "enviado_en": enviado_en,
+        "status_http": response.status_code,
+        "operacion_id": None,
+        "estado": None,
+        "terminado_en": None,
+    }
+    if response.status_code == 202:
+        resultado["operacion_id"] = int(response.json()["job_id"])
+    else:
+        logger.warning("POST /descargar %s → %d: %s", solicitud, response.status_code, response.text[:200])
+    return resultado
+
+
+async def _esperar_longpoll(client, api: str, resultado: dict, limite: float):
+    estado = "PENDING"
+    while time.time() < limite:
+        try:
+            response = await client.get(
+                f"{api}/api/v1/sire/operaciones/{resultado['operacion_id']}/esperar",
+                params={"estado": estado, "timeout": 30},
+                timeout=40,
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.debug("Long-poll de %s falló: %s", resultado["operacion_id"], e)
+            await asyncio.sleep(1)
+            continue
+        estado = response.json()["estado"]
+        if estado in _ESTADOS_TERMINADOS:
+            resultado["estado"] = estado
+            resultado["terminado_en"] = time.time()
+            return
+
+
+async def _esperar_webhooks(client, sink: str, resultados: list, limite: float):
+    por_clave = {r["clave"]: r for r in resultados if r["operacion_id"]}
+    pendientes = set(por_clave)
+    leidos = 0
+    while pendientes and time.time() < limite:
+        data = (await client.get(f"{sink}/_sink/recibidos", params={"desde": leidos})).json()
+        leidos += len(data["items"])
+        for item in data["items"]:
+            p = item["payload"]
+            clave = (str(p["ruc"]), p["periodo"], p["tipo"])
+            if clave in pendientes:
+                por_clave[clave]["estado"] = p["estado"]
+                por_clave[clave]["terminado_en"] = item["recibido_en"]
+                pendientes.discard(clave)
+        await asyncio.sleep(1)
+
+
+async def ejecutar(args) -> dict:
+    solicitudes = generar_solicitudes(args.operaciones, args.rucs)
+    if args.sembrar:
+        sembrar_credenciales(sorted({ruc for ruc, _, _ in solicitudes}))
+
+    limites = httpx.Limits(max_connections=args.max_conexiones, max_keepalive_connections=args.max_conexiones)
+    async with httpx.AsyncClient(limits=limites) as client:
+        await client.post(f"{args.simulador}/_sim/reiniciar")
+        if args.modo == "webhook":
+            await client.post(f"{args.sink}/_sink/reiniciar")
+
+        pico: dict = {}
+        fin_muestreo = asyncio.Event()
+        muestreo = asyncio.create_task(
+            _muestrear_rss(client, args.metricas_worker, pico, fin_muestreo)
+        )
+
+        sem = asyncio.Semaphore(args.concurrencia)
+        inicio = time.time()
+        limite = inicio + args.timeout
+        resultados = await asyncio.gather(*(
+            _encargar(client, args.api, s, args.webhook_url, sem) for s in solicitudes
+        ))
+        encargadas = [r for r in resultados if r["operacion_id"]]
+        logger.info(
+            "%d/%d operaciones encargadas en %.1fs",
+            len(encargadas), len(resultados), time.time() - inicio,
+        )
+
+        if args.modo == "webhook":
+            await _esperar_webhooks(client, args.sink, encargadas, limite)
+        else:
+            await asyncio.gather(*(
+                _esperar_longpoll(client, args.api, r, limite) for r in encargadas
+            ))
+
+        fin_muestreo.set()
+        await muestreo
+        estadisticas = (await client.get(f"{args.simulador}/_sim/estadisticas")).json()
+
+    return resumir(resultados, inicio, estadisticas, pico.get("rss"))
+
+
+def resumir(resultados: list, inicio: float, estadisticas: dict, rss_pico: Optional[float]) -> dict:
+    terminadas = [r for r in resultados if r["terminado_en"]]
+    latencias = [r["terminado_en"] - r["enviado_en"] for r in terminadas]
+    duracion = (max(r["terminado_en"] for r in terminadas) - inicio) if terminadas else 0
+
+    por_estado: dict = {}
+    for r in resultados:
+        estado = r["estado"] or ("RECHAZADA" if not r["operacion_id"] else "SIN_TERMINAR")
+        por_estado[estado] = por_estado.get(estado, 0) + 1
+
+    return {
+        "operaciones": len(resultados),
+        "terminadas": len(terminadas),
+        "por_estado": por_estado,
+        "duracion_s": round(duracion, 2),
+        "throughput_por_min": round(len(terminadas) / duracion * 60, 2) if duracion else 0,
+        "latencia_s": {
+            f"p{p}": round(v, 2) if (v := percentil(latencias, p)) is not None else None
+            for p in (50, 95, 99)
+        },
+        "llamadas_sunat": estadisticas.get("llamadas", {}),
+        "llamadas_sunat_por_operacion": (
+            round(estadisticas.get("total_llamadas", 0) / len(terminadas), 2)
+            if terminadas else None
+        ),
+        "respuestas_sunat": estadisticas.get("respuestas", {}),
+        "rss_pico_worker_mb": round(rss_pico / 2**20, 1) if rss_pico else None,
+    }
+
+
+def _imprimir(resumen: dict):
+    lat = resumen["latencia_s"]
+    print(f"Operaciones:            {resumen['terminadas']}/{resumen['operaciones']} terminadas")
+    print(f"Por estado:             {resumen['por_estado']}")
+    print(f"Duración:               {resumen['duracion_s']} s")
+    print(f"Throughput:             {resumen['throughput_por_min']} op/min")
+    print(f"Latencia p50/p95/p99:   {lat['p50']} / {lat['p95']} / {lat['p99']} s")
+    print(f"Llamadas SUNAT por op.: {resumen['llamadas_sunat_por_operacion']}")
+    print(f"  por endpoint:         {resumen['llamadas_sunat']}")
+    print(f"RSS pico del worker:    {resumen['rss_pico_worker_mb']} MiB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del pipeline SIRE")
+    parser.add_argument("--operaciones", type=int, default=200)
+    parser.add_argument("--rucs", type=int, default=20, help="RUCs distintos (el semáforo es por RUC)")
+    parser.add_argument("--concurrencia", type=int, default=20, help="POST /descargar simultáneos")
+    parser.add_argument("--modo", choices=("longpoll", "webhook"), default="longpoll")
+    parser.add_argument("--timeout", type=int, default=1800, help="segundos máximos de la prueba")
+    parser.add_argument("--max-conexiones", type=int, default=500)
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--simulador", default="http://localhost:8090")
+    parser.add_argument("--sink", default="http://localhost:8091")
+    parser.add_argument(
+        "--webhook-url", default="http://webhook-sink:8091/webhook",
+        help="URL del sink tal como la ve el worker",
+    )
+    parser.add_argument("--metricas-worker", default="http://localhost:9100/metrics")
+    parser.add_argument("--sembrar", action="store_true", help="crear credenciales ficticias")
+    parser.add_argument("--json", help="guardar el resumen en este archivo")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    resumen = asyncio.run(ejecutar(args))
+    _imprimir(resumen)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(resumen, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
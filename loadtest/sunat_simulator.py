@@ -0,0 +1,361 @@
+"""
+Simulador local de la API SIRE de SUNAT para pruebas de carga.
+
+Implementa los cuatro endpoints que usa api_clients.sire.client.SireClient:
+
+- POST /v1/clientessol/{client_id}/oauth2/token/
+- GET  .../propuesta/web/propuesta/{periodo}/exportapropuesta
+       .../propuesta/web/propuesta/{periodo}/exportacioncomprobantepropuesta
+- GET  .../gestionprocesosmasivos/web/masivo/consultaestadotickets
+- GET  .../gestionprocesosmasivos/web/masivo/archivoreporte
+
+El comportamiento se configura con variables de entorno SIM_* (ver
+ConfigSimulador): latencia lognormal por llamada, tiempo de procesamiento
+de los tickets, tasas de error (5xx, 429, tickets en error, reportes
+vacíos), vencimiento de tokens (401) y tamaño de los ZIP.
+
+Para apuntar el servicio al simulador::
+
+    SUNAT_BASE_URL_SEGURIDAD=http://localhost:8090
+    SUNAT_BASE_URL_SIRE=http://localhost:8090
+
+Uso::
+
+    uvicorn loadtest.sunat_simulator:app --port 8090
+
+GET /_sim/estadisticas retorna las llamadas recibidas por endpoint y
+POST /_sim/reiniciar las pone en cero (y olvida tokens y tickets).
+"""
+
+import asyncio
+import io
+import math
+import random
+import secrets
+import time
+import zipfile
+from collections import Counter
+from typing import Optional
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+_PREFIJO_SIRE = "/v1/contribuyente/migeigv/libros"
+
+
+class ConfigSimulador(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="SIM_", extra="ignore")
+
+    # Latencia de cada llamada (lognormal: mediana y sigma)
+    LATENCIA_MEDIANA_MS: float = 150
+    LATENCIA_SIGMA: float = 0.6
+    # Ancho de banda de archivoreporte (se suma a la latencia)
+    DESCARGA_MBPS: float = 50
+
+    # Tiempo hasta que SUNAT termina un ticket (lognormal)
+    PROCESO_MEDIANA_S: float = 20
+    PROCESO_SIGMA: float = 0.5
+
+    # Errores
+    TASA_ERROR_5XX: float = 0.01       # respuestas 503 en cualquier endpoint
+    TASA_429: float = 0.0              # respuestas 429 con Retry-After
+    TASA_TICKET_ERROR: float = 0.01    # tickets que terminan en "04"
+    TASA_SIN_DATOS: float = 0.05       # reportes terminados sin registros
+
+    # Tokens OAuth2: tras TOKEN_TTL segundos las llamadas reciben 401
+    TOKEN_TTL: int = 300
+
+    # Tamaño de los ZIP (lognormal, KiB)
+    ZIP_MEDIANA_KB: float = 200
+    ZIP_SIGMA: float = 1.0
+    ZIP_MAX_KB: float = 50_000
+
+
+config = ConfigSimulador()
+
+app = FastAPI(title="Simulador SUNAT SIRE", docs_url=None, redoc_url=None)
+
+# Estado en memoria (un solo proceso uvicorn)
+_tokens: dict = {}        # access_token -> (ruc, vence_en)
+_tickets: dict = {}       # numTicket -> dict
+_llamadas: Counter = Counter()
+_respuestas: Counter = Counter()
+
+
+def _lognormal(mediana: float, sigma: float) -> float:
+    if mediana <= 0:
+        return 0.0
+    return random.lognormvariate(math.log(mediana), sigma)
+
+
+async def _latencia(extra: float = 0.0):
+    await asyncio.sleep(
+        _lognormal(config.LATENCIA_MEDIANA_MS, config.LATENCIA_SIGMA) / 1000 + extra
+    )
+
+
+def _registrar(endpoint: str, status: int):
+    _respuestas[f"{endpoint}:{status}"] += 1
+
+
+def _falla_inyectada(endpoint: str) -> Optional[Response]:
+    """Respuesta de error simulada (503/429) o None."""
+    sorteo = random.random()
+    if sorteo < config.TASA_ERROR_5XX:
+        _registrar(endpoint, 503)
+        return JSONResponse({"msg": "Servicio no disponible"}, status_code=503)
+    if sorteo < config.TASA_ERROR_5XX + config.TASA_429:
+        _registrar(endpoint, 429)
+        return JSONResponse(
+            {"msg": "Demasiadas solicitudes"},
+            status_code=429,
+            headers={"Retry-After": "2"},
+        )
+    return None
+
+
+def _ruc_autenticado(request: Request) -> Optional[str]:
+    """RUC del Bearer token o None si falta o venció."""
+    autorizacion = request.headers.get("Authorization", "")
+    token = autorizacion.removeprefix("Bearer ").strip()
+    ruc, vence_en = _tokens.get(token, (None, 0))
+    if ruc is None or vence_en < time.time():
+        _tokens.pop(token, None)
+        return None
+    return ruc
+
+
+def _no_autorizado(endpoint: str) -> Response:
+    _registrar(endpoint, 401)
+    return JSONResponse({"msg": "Token inválido o expirado"}, status_code=401)
+
+
+# ---------------------------------------------------------------------------
+# Autenticación
+# ---------------------------------------------------------------------------
+@app.post("/v1/clientessol/{client_id}/oauth2/token/")
+async def token(client_id: str, request: Request):
+    endpoint = "token"
+    _llamadas[endpoint] += 1
+    await _latencia()
+    if falla := _falla_inyectada(endpoint):
+        return falla
+
+    # x-www-form-urlencoded; se parsea a mano para no requerir python-multipart
+    formulario = parse_qs((await request.body()).decode())
+    username = formulario.get("username", [""])[0]
+    if len(username) < 11 or not formulario.get("password"):
+        _registrar(endpoint, 400)
+        return JSONResponse({"error": "invalid_grant"}, status_code=400)
+
+    access_token = secrets.token_urlsafe(24)
+    # username = RUC (11 dígitos) + usuario SOL
+    _tokens[access_token] = (username[:11], time.time() + config.TOKEN_TTL)
+    _registrar(endpoint, 200)
+    return {
+        "access_token": access_token,
+        "token_type": "JWT",
+        "expires_in": config.TOKEN_TTL,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Solicitud de propuesta
+# ---------------------------------------------------------------------------
+async def _crear_ticket(request: Request, libro: str, periodo: str, endpoint: str):
+    _llamadas[endpoint] += 1
+    await _latencia()
+    if falla := _falla_inyectada(endpoint):
+        return falla
+    ruc = _ruc_autenticado(request)
+    if ruc is None:
+        return _no_autorizado(endpoint)
+
+    sorteo = random.random()
+    if sorteo < config.TASA_TICKET_ERROR:
+        resultado = "ERROR"
+    elif sorteo < config.TASA_TICKET_ERROR + config.TASA_SIN_DATOS:
+        resultado = "SIN_DATOS"
+    else:
+        resultado = "LISTO"
+
+    num_ticket = f"{int(time.time() * 1000)}{random.randint(0, 9999):04d}"
+    _tickets[num_ticket] = {
+        "ruc": ruc,
+        "libro": libro,
+        "periodo": periodo,
+        "resultado": resultado,
+        "listo_en": time.time() + _lognormal(config.PROCESO_MEDIANA_S, config.PROCESO_SIGMA),
+        "bytes": int(
+            min(_lognormal(config.ZIP_MEDIANA_KB, config.ZIP_SIGMA), config.ZIP_MAX_KB) * 1024
+        ),
+    }
+    _registrar(endpoint, 200)
+    return {"numTicket": num_ticket}
+
+
+@app.get(_PREFIJO_SIRE + "/{libro}/propuesta/web/propuesta/{periodo}/exportapropuesta")
+async def exportapropuesta(request: Request, libro: str, periodo: str):
+    return await _crear_ticket(request, libro, periodo, "exportapropuesta")
+
+
+@app.get(
+    _PREFIJO_SIRE
+    + "/{libro}/propuesta/web/propuesta/{periodo}/exportacioncomprobantepropuesta"
+)
+async def exportacioncomprobantepropuesta(request: Request, libro: str, periodo: str):
+    return await _crear_ticket(
+        request, libro, periodo, "exportacioncomprobantepropuesta"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Estado de tickets
+# ---------------------------------------------------------------------------
+def _nombre_archivo(num_ticket: str, ticket: dict) -> str:
+    if ticket["resultado"] == "SIN_DATOS":
+        return f"Reporte sin datos {num_ticket}.zip"
+    creado = time.strftime("%Y%m%d", time.localtime(ticket["listo_en"]))
+    if ticket["libro"] == "rvie":
+        return f"LE{ticket['ruc']}{creado}0014040001EXP2.zip"
+    return f"{ticket['ruc']}-{creado}-{num_ticket[-6:]}-propuesta.zip"
+
+
+def _registro(num_ticket: str, ticket: dict, ahora: float) -> dict:
+    """Registro de consultaestadotickets con el formato de SUNAT."""
+    registro = {
+        "numTicket": num_ticket,
+        "perTributario": ticket["periodo"],
+        "codProceso": "10",
+        "desProceso": "Descarga de propuesta",
+        "codLibro": "140400" if ticket["libro"] == "rvie" else "080100",
+    }
+    if ahora < ticket["listo_en"]:
+        registro["detalleTicket"] = {
+            "codEstadoEnvio": "02",
+            "desEstadoEnvio": "En proceso",
+        }
+        registro["archivoReporte"] = []
+    elif ticket["resultado"] == "ERROR":
+        registro["detalleTicket"] = {
+            "codEstadoEnvio": "04",
+            "desEstadoEnvio": "Error en el proceso (simulado)",
+        }
+        registro["archivoReporte"] = []
+    else:
+        registro["detalleTicket"] = {
+            "codEstadoEnvio": "06",
+            "desEstadoEnvio": "Terminado",
+        }
+        registro["archivoReporte"] = [{
+            "nomArchivoReporte": _nombre_archivo(num_ticket, ticket),
+            "codTipoAchivoReporte": "01",
+        }]
+    return registro
+
+
+@app.get(_PREFIJO_SIRE + "/{libro}/gestionprocesosmasivos/web/masivo/consultaestadotickets")
+async def consultaestadotickets(
+    request: Request,
+    libro: str,
+    perIni: str,
+    perFin: str,
+    page: int = 1,
+    perPage: int = 20,
+    numTicket: Optional[str] = None,
+):
+    endpoint = "consultaestadotickets"
+    _llamadas[endpoint] += 1
+    await _latencia()
+    if falla := _falla_inyectada(endpoint):
+        return falla
+    ruc = _ruc_autenticado(request)
+    if ruc is None:
+        return _no_autorizado(endpoint)
+
+    ahora = time.time()
+    if numTicket:
+        ticket = _tickets.get(numTicket)
+        candidatos = [(numTicket, ticket)] if ticket and ticket["ruc"] == ruc else []
+    else:
+        candidatos = [
+            (num, t) for num, t in _tickets.items()
+            if t["ruc"] == ruc and perIni <= t["periodo"] <= perFin
+        ]
+
+    inicio = (page - 1) * perPage
+    registros = [_registro(num, t, ahora) for num, t in candidatos[inicio:inicio + perPage]]
+    _registrar(endpoint, 200)
+    return {
+        "paginacion": {
+            "page": page,
+            "perPage": perPage,
+            "totalRegistros": len(candidatos),
+        },
+        "registros": registros,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Descarga del reporte
+# ---------------------------------------------------------------------------
+def _generar_zip(nombre: str, tamano: int) -> bytes:
+    """ZIP sin compresión de aproximadamente 'tamano' bytes."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as zf:
+        zf.writestr(nombre.replace(".zip", ".txt"), random.randbytes(max(tamano, 64)))
+    return buffer.getvalue()
+
+
+@app.get(_PREFIJO_SIRE + "/{libro}/gestionprocesosmasivos/web/masivo/archivoreporte")
+async def archivoreporte(
+    request: Request,
+    libro: str,
+    numTicket: str,
+    nomArchivoReporte: str,
+):
+    endpoint = "archivoreporte"
+    _llamadas[endpoint] += 1
+    ticket = _tickets.get(numTicket)
+    tamano = ticket["bytes"] if ticket else 0
+    await _latencia(tamano / (config.DESCARGA_MBPS * 125_000))
+    if falla := _falla_inyectada(endpoint):
+        return falla
+    ruc = _ruc_autenticado(request)
+    if ruc is None:
+        return _no_autorizado(endpoint)
+    if not ticket or ticket["ruc"] != ruc or time.time() < ticket["listo_en"]:
+        _registrar(endpoint, 404)
+        return JSONResponse({"msg": "Archivo no encontrado"}, status_code=404)
+
+    _registrar(endpoint, 200)
+    return Response(
+        content=_generar_zip(nomArchivoReporte, tamano),
+        media_type="application/zip",
+    )
+
+
+# ---------------------------------------------------------------------------
+# Control del simulador
+# ---------------------------------------------------------------------------
+@app.get("/_sim/estadisticas")
+async def estadisticas():
+    return {
+        "llamadas": dict(_llamadas),
+        "total_llamadas": sum(_llamadas.values()),
+        "respuestas": dict(_respuestas),
+        "tickets": len(_tickets),
+        "tokens_activos": len(_tokens),
+        "config": config.model_dump(),
+    }
+
+
+@app.post("/_sim/reiniciar")
+async def reiniciar():
+    _llamadas.clear()
+    _respuestas.clear()
+    _tickets.clear()
+    _tokens.clear()
+    return {"ok": True}
@@ -0,0 +1,40 @@
+"""
+Receptor de webhooks para pruebas de carga.
+
+Hace las veces del orquestador: acepta los POST de _enviar_webhook y
+guarda cada payload con la hora de llegada (epoch), para que
+loadtest.driver calcule la latencia de punta a punta.
+
+Uso::
+
+    uvicorn loadtest.webhook_sink:app --port 8091
+
+- POST /webhook            recibe la notificación
+- GET  /_sink/recibidos    webhooks recibidos (?desde=N para paginar)
+- POST /_sink/reiniciar    descarta lo recibido
+"""
+
+import time
+
+from fastapi import FastAPI, Request
+
+app = FastAPI(title="Webhook sink", docs_url=None, redoc_url=None)
+
+_recibidos: list = []
+
+
+@app.post("/webhook")
+async def recibir(request: Request):
+    _recibidos.append({"recibido_en": time.time(), "payload": await request.json()})
+    return {"ok": True}
+
+
+@app.get("/_sink/recibidos")
+async def recibidos(desde: int = 0):
+    return {"total": len(_recibidos), "items": _recibidos[desde:]}
+
+
+@app.post("/_sink/reiniciar")
+async def reiniciar():
+    _recibidos.clear()
+    return {"ok": True}
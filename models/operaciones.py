@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, BigInteger, DateTime, Text, Enum as SAEnum
+from sqlalchemy import Column, Index, Integer, String, BigInteger, Boolean, DateTime, Text, Enum as SAEnum
 from sqlalchemy.sql import func
 import enum
 
@@ -14,6 +14,32 @@ class EstadoOperacion(str, enum.Enum):
     S3_UPLOADED = "S3_UPLOADED"
     ERROR = "ERROR"
     WEBHOOK_SENT = "WEBHOOK_SENT"
+    PAUSED = "PAUSED"  # SUNAT no disponible (circuito abierto); se reprograma sola
+
+
+# Estados en los que la operación ya no avanzará
+ESTADOS_FINALES = (
+    EstadoOperacion.COMPLETED,
+    EstadoOperacion.EMPTY,
+    EstadoOperacion.S3_UPLOADED,
+    EstadoOperacion.ERROR,
+    EstadoOperacion.WEBHOOK_SENT,
+)
+
+# Estados en los que la operación sigue (o volverá a estar) en curso
+ESTADOS_EN_CURSO = (
+    EstadoOperacion.PENDING,
+    EstadoOperacion.PROCESSING,
+    EstadoOperacion.PAUSED,
+)
+
+# Estados que indican que el archivo ya fue obtenido de SUNAT
+ESTADOS_DESCARGADOS = (
+    EstadoOperacion.COMPLETED,
+    EstadoOperacion.EMPTY,
+    EstadoOperacion.S3_UPLOADED,
+    EstadoOperacion.WEBHOOK_SENT,
+)
 
 
 class SireOperacion(Base):
@@ -21,17 +47,76 @@ class SireOperacion(Base):
     Modelo para la tabla driver.sire_operaciones.
 
     Almacena el estado y trazabilidad de cada operación SIRE procesada.
+    La tabla está particionada por mes sobre created_at (ver
+    core/particiones.py); su clave primaria en BD es (id, created_at),
+    pero id es único y sigue siendo la identidad del ORM. El historial de
+    mensajes vive en SireOperacionEvento.
     """
     __tablename__ = "sire_operaciones"
-    __table_args__ = {"schema": "driver"}
+    __table_args__ = (
+        # Filtros y paginación de GET /api/v1/sire/operaciones
+        Index(
+            "idx_sire_operaciones_ruc_periodo_tipo",
+            "ruc", "periodo", "tipo_operacion", "created_at",
+        ),
+        Index("idx_sire_operaciones_estado_updated", "estado", "updated_at"),
+        {"schema": "driver", "postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    ruc = Column(BigInteger, nullable=False, index=True)
+    ruc = Column(BigInteger, nullable=False)
     periodo = Column(String(6), nullable=False)
     tipo_operacion = Column(String(50), nullable=False)
     ticket = Column(String(100), nullable=True)
     s3_url = Column(String(500), nullable=True)
+    digest = Column(String(64), nullable=True)  # SHA-256 del ZIP descargado
+    backfill_id = Column(Integer, nullable=True, index=True)
+    estado = Column(SAEnum(EstadoOperacion), default=EstadoOperacion.PENDING)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class SireOperacionEvento(Base):
+    """
+    Modelo para la tabla driver.sire_operacion_eventos.
+
+    Historial append-only de una operación: una fila por transición de
+    estado con su mensaje. Reemplaza a la antigua columna log, que se
+    sobrescribía en cada cambio. Particionada por mes como sire_operaciones.
+    """
+    __tablename__ = "sire_operacion_eventos"
+    __table_args__ = (
+        Index("idx_sire_operacion_eventos_operacion", "operacion_id", "created_at"),
+        {"schema": "driver", "postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    operacion_id = Column(Integer, nullable=False)
+    estado = Column(SAEnum(EstadoOperacion), nullable=False)
+    mensaje = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class SireBackfill(Base):
+    """
+    Modelo para la tabla driver.sire_backfills.
+
+    Agrupa las operaciones generadas por una solicitud de backfill
+    (varios RUCs x rango de períodos x tipos) para poder consultar su avance.
+    """
+    __tablename__ = "sire_backfills"
+    __table_args__ = {"schema": "driver"}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    rucs = Column(Text, nullable=False)  # RUCs separados por coma
+    periodo_inicio = Column(String(6), nullable=False)
+    periodo_fin = Column(String(6), nullable=False)
+    tipos = Column(String(50), nullable=False)  # "ventas,compras"
+    webhook_url = Column(String(500), nullable=True)
+    forzar = Column(Boolean, default=False)
     estado = Column(SAEnum(EstadoOperacion), default=EstadoOperacion.PENDING)
+    total_operaciones = Column(Integer, default=0)
+    omitidas = Column(Integer, default=0)
     log = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
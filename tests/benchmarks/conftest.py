@@ -0,0 +1,59 @@
+"""
+Micro-benchmarks de las rutas calientes del cliente SIRE (pytest-benchmark).
+
+Requieren las dependencias de requirements-dev.txt; sin ellas los módulos
+se omiten. Redis se reemplaza por fakeredis y SUNAT por httpx.MockTransport,
+así que no necesitan servicios externos.
+
+Hay una sola línea base por máquina, en
+tests/benchmarks/baselines/<máquina>/0001_baseline.json::
+
+    # Comparar contra la línea base (falla si la media empeora >25%)
+    pytest tests/benchmarks --benchmark-storage=tests/benchmarks/baselines \\
+        --benchmark-compare --benchmark-compare-fail=mean:25%
+
+    # Actualizar la línea base: se sobrescribe en su lugar, en el mismo
+    # commit del cambio que mueve la ruta caliente (no con --benchmark-save,
+    # que acumula archivos numerados)
+    pytest tests/benchmarks \\
+        --benchmark-json=tests/benchmarks/baselines/Linux-CPython-3.11-64bit/0001_baseline.json
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+fakeredis = pytest.importorskip("fakeredis")
+
+import core.redis_client  # noqa: E402
+
+
+@pytest.fixture
+def redis_falso(monkeypatch):
+    """Redis en memoria como singleton de core.redis_client.get_redis()."""
+    r = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(core.redis_client, "_redis_client", r)
+    return r
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def registro_sunat(num_ticket: str, periodo: str = "202501", cod_estado: str = "06") -> dict:
+    """Registro de consultaestadotickets con el formato de SUNAT."""
+    return {
+        "numTicket": num_ticket,
+        "perTributario": periodo,
+        "codProceso": "10",
+        "codLibro": "140400",
+        "detalleTicket": {"codEstadoEnvio": cod_estado, "desEstadoEnvio": "Terminado"},
+        "archivoReporte": [{
+            "nomArchivoReporte": f"LE20100000001{periodo}010014040001EXP2.zip",
+            "codTipoAchivoReporte": "01",
+        }],
+    }
@@ -0,0 +1,98 @@
+"""
+Carga de contribuyentes de la BD local legacy (driver_sunat).
+
+Siembra una BD SQLite temporal con CONTRIBUYENTES filas y mide el loader
+iter_contribuyentes: lista completa descifrada, descifrado diferido y
+tiempo hasta el primer contribuyente (lo que espera un scheduler antes de
+empezar a trabajar).
+"""
+
+import os
+from datetime import datetime, timedelta
+from itertools import islice
+
+import pytest
+from cryptography.fernet import Fernet
+
+pytest.importorskip("psycopg2")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+
+from driver_sunat.config import config  # noqa: E402
+from driver_sunat.database import operations as db  # noqa: E402
+from driver_sunat.database.connection import close_local_db_connection, transaction  # noqa: E402
+from driver_sunat.database.contribuyentes import (  # noqa: E402
+    active,
+    iter_contribuyentes,
+    not_flagged_non_employer,
+    with_sire_creds,
+)
+from driver_sunat.security import get_crypto_service  # noqa: E402
+
+CONTRIBUYENTES = 10_000
+
+
+@pytest.fixture(scope="module")
+def bd_local(tmp_path_factory):
+    """BD local con CONTRIBUYENTES activos; la mitad con credenciales SIRE."""
+    path_original = config.DATABASE_PATH
+    config.DATABASE_PATH = str(tmp_path_factory.mktemp("bd") / "sunat_data.db")
+    db.initialize_local_db()
+
+    crypto = get_crypto_service()
+    rucs = [f"20{i:09d}" for i in range(CONTRIBUYENTES)]
+    reciente = (datetime.now() - timedelta(days=3)).isoformat()
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO contribuyentes (ruc, user_sol, password_sol_encrypted, is_active) VALUES (?, ?, ?, 1)",
+            [(ruc, f"USUARIO{i}", crypto.encrypt(f"clave{i}")) for i, ruc in enumerate(rucs)],
+        )
+        conn.executemany(
+            "INSERT INTO otras_credenciales (ruc, tipo, usuario, contrasena, observaciones) "
+            "VALUES (?, 'APISUNAT', 'id', 'secreto', 'SIRE')",
+            [(ruc,) for ruc in rucs[::2]],
+        )
+        conn.executemany(
+            "INSERT INTO observaciones (ruc, mensaje, timestamp, fecha_observacion) "
+            "VALUES (?, 'No es empleador', ?, ?)",
+            [(ruc, reciente, reciente) for ruc in rucs[::10]],
+        )
+    yield rucs
+
+    close_local_db_connection()
+    config.DATABASE_PATH = path_original
+
+
+def test_get_active_contribuyentes(benchmark, bd_local):
+    """Lista completa con todas las contraseñas descifradas."""
+    contribuyentes = benchmark(db.get_active_contribuyentes)
+
+    assert len(contribuyentes) == CONTRIBUYENTES
+    assert contribuyentes[0]["password_sol"] == "clave0"
+
+
+def test_get_active_contribuyentes_lazy(benchmark, bd_local):
+    """Lista completa sin descifrar hasta el acceso."""
+    contribuyentes = benchmark(db.get_active_contribuyentes, lazy=True)
+
+    assert len(contribuyentes) == CONTRIBUYENTES
+    assert contribuyentes[1]["password_sol"] == "clave1"
+
+
+def test_primer_contribuyente(benchmark, bd_local):
+    """Tiempo hasta el primer contribuyente descifrado del generador."""
+    primero = benchmark(lambda: next(iter_contribuyentes(active())))
+
+    assert primero["ruc"] == bd_local[0]
+
+
+def test_filtros_combinados(benchmark, bd_local):
+    """Activos, con credenciales SIRE y sin marca 'No es empleador' reciente."""
+    def cargar():
+        filtros = (active(), with_sire_creds(), not_flagged_non_employer(days=25))
+        return list(iter_contribuyentes(*filtros, lazy=True))
+
+    contribuyentes = benchmark(cargar)
+
+    # Pares con SIRE menos los múltiplos de 10 (marcados hace 3 días)
+    assert len(contribuyentes) == CONTRIBUYENTES // 2 - CONTRIBUYENTES // 10
+    assert not any(c["ruc"] in set(bd_local[::10]) for c in islice(contribuyentes, 100))
@@ -0,0 +1,80 @@
+"""
+Memoria y costo de construcción por ticket rastreado.
+
+Compara la representación interna (dataclasses con __slots__, ver
+api_clients/sire/schemas.py) con el modelo Pydantic que se usaba antes,
+al mantener en memoria los TicketStatus de un barrido grande.
+"""
+
+import gc
+import tracemalloc
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from api_clients.sire.estados import parsear_pagina
+from tests.benchmarks.conftest import registro_sunat
+
+TICKETS = 10_000
+
+
+class TicketStatusPydantic(BaseModel):
+    """TicketStatus anterior (Pydantic + dict de parámetros)."""
+    ticket: str
+    cod_estado: str
+    des_estado: str
+    status: str
+    mensaje: Optional[str] = None
+    parametros_descarga: Optional[dict] = None
+
+
+def _como_pydantic(registros: list) -> dict:
+    estados = {}
+    for ticket, estado in parsear_pagina(registros).items():
+        estados[ticket] = TicketStatusPydantic(
+            ticket=estado.ticket,
+            cod_estado=estado.cod_estado,
+            des_estado=estado.des_estado,
+            status=estado.status.value,
+            mensaje=estado.mensaje,
+            parametros_descarga=estado.parametros_descarga.como_params(),
+        )
+    return estados
+
+
+def _bytes_por_ticket(construir, registros: list) -> float:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        antes = tracemalloc.take_snapshot()
+        estados = construir(registros)
+        despues = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retenidos = sum(d.size_diff for d in despues.compare_to(antes, "filename"))
+    assert len(estados) == len(registros)
+    return retenidos / len(registros)
+
+
+@pytest.fixture(scope="module")
+def registros():
+    return [registro_sunat(str(10**12 + i)) for i in range(TICKETS)]
+
+
+@pytest.mark.parametrize(
+    "representacion, construir",
+    [("slots", parsear_pagina), ("pydantic", _como_pydantic)],
+    ids=["slots", "pydantic"],
+)
+def test_memoria_por_ticket(benchmark, registros, representacion, construir):
+    """bytes_por_ticket queda en extra_info de la línea base JSON."""
+    benchmark.extra_info["bytes_por_ticket"] = round(_bytes_por_ticket(construir, registros), 1)
+    benchmark.pedantic(construir, args=(registros,), rounds=5, iterations=1)
+
+
+def test_slots_usa_menos_memoria(registros):
+    slots = _bytes_por_ticket(parsear_pagina, registros)
+    pydantic = _bytes_por_ticket(_como_pydantic, registros)
+
+    assert slots < pydantic * 0.75
@@ -0,0 +1,138 @@
+"""Micro-benchmarks de SireClient y BaseSunatAPIClient."""
+
+import httpx
+import pytest
+
+from api_clients.sire.client import SireClient
+from api_clients.sire.estados import parsear_pagina
+from api_clients.sire.schemas import (
+    DownloadResponse,
+    EstadoTicket,
+    ParametrosDescarga,
+    TicketStatus,
+)
+from tests.benchmarks.conftest import registro_sunat
+
+URL_ESTADO = (
+    "https://sunat.test/v1/contribuyente/migeigv/libros/rvierce/"
+    "gestionprocesosmasivos/web/masivo/consultaestadotickets"
+)
+
+
+def _cliente(handler) -> SireClient:
+    """SireClient con token fijo y transporte simulado (sin autenticar)."""
+    client = SireClient(
+        ruc="20100000001",
+        client_id="cliente",
+        client_secret="secreto",
+        user_sol="USUARIO",
+        clave_sol="clave",
+    )
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client._access_token = "token"
+    return client
+
+
+@pytest.mark.parametrize("registros", [100, 1000])
+def test_consultar_estado_ticket_registros_grandes(benchmark, redis_falso, loop, registros):
+    """Parseo de una respuesta con muchos registros; el ticket buscado es el último."""
+    pagina = {"registros": [registro_sunat(str(i)) for i in range(registros)]}
+    client = _cliente(lambda request: httpx.Response(200, json=pagina))
+    ticket = str(registros - 1)
+
+    estado = benchmark(
+        lambda: loop.run_until_complete(client.consultar_estado_ticket(ticket, "202501"))
+    )
+
+    assert estado.status == "LISTO"
+    assert estado.parametros_descarga.num_ticket == ticket
+
+
+@pytest.mark.parametrize("registros", [100, 1000])
+def test_parsear_pagina(benchmark, registros):
+    """Página completa de un barrido en bloque: una sola pasada."""
+    pagina = [registro_sunat(str(i)) for i in range(registros)]
+
+    estados = benchmark(parsear_pagina, pagina)
+
+    assert len(estados) == registros
+
+
+def test_parsear_registro(benchmark):
+    registro = registro_sunat("123")
+
+    estado = benchmark(SireClient._parsear_registro, "123", registro)
+
+    assert estado.status == "LISTO"
+
+
+@pytest.mark.parametrize(
+    "nombre",
+    [
+        "LE2010000000120260430001404000EXP2.zip",
+        "20100000001-20260430-181929-propuesta.zip",
+        "reporte-sin-patron.zip",
+    ],
+)
+def test_renombrar_archivo(benchmark, nombre):
+    resultado = benchmark(SireClient._renombrar_archivo, nombre, "202501")
+
+    assert resultado
+
+
+def test_construir_ticket_status(benchmark):
+    parametros = ParametrosDescarga(
+        nom_archivo_reporte="LE201000000012025010014040001EXP2.zip",
+        cod_tipo_archivo_reporte="01",
+        cod_libro="140400",
+        per_tributario="202501",
+        cod_proceso="10",
+        num_ticket="123",
+    )
+
+    estado = benchmark(
+        TicketStatus,
+        ticket="123",
+        cod_estado="06",
+        des_estado="Terminado",
+        status=EstadoTicket.LISTO,
+        mensaje="Reporte listo para descargar",
+        parametros_descarga=parametros,
+    )
+
+    assert estado.status == "LISTO"
+
+
+def test_construir_download_response(benchmark):
+    contenido = b"PK" + bytes(200_000)
+
+    respuesta = benchmark(
+        DownloadResponse,
+        ticket="123",
+        contenido=contenido,
+        es_vacio=False,
+        nom_archivo="LE201000000012025010014040001EXP2.zip",
+    )
+
+    assert len(respuesta.contenido) == len(contenido)
+
+
+def test_make_request_overhead(benchmark, redis_falso, loop):
+    """Costo propio de _make_request (circuito, política, span, métricas) por llamada."""
+    client = _cliente(lambda request: httpx.Response(200, json={"registros": []}))
+
+    response = benchmark(
+        lambda: loop.run_until_complete(client._make_request("GET", URL_ESTADO))
+    )
+
+    assert response.status_code == 200
+
+
+def test_token_cache_round_trip(benchmark, redis_falso):
+    client = _cliente(lambda request: httpx.Response(200))
+
+    def round_trip():
+        client._set_cached_token("token-nuevo")
+        return client._get_cached_token()
+
+    assert benchmark(round_trip) == "token-nuevo"
@@ -0,0 +1,82 @@
+"""
+Refresco del token ante 401 (api_clients/base_client.py): un solo intento,
+compartido por las solicitudes de cobertura y contado una sola vez en el
+circuito de 'seguridad'.
+"""
+
+import asyncio
+import os
+
+import httpx
+import pytest
+from cryptography.fernet import Fernet
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("psycopg2")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+
+import core.redis_client  # noqa: E402
+from api_clients.base_client import SunatTokenRefreshError  # noqa: E402
+from api_clients.circuit_breaker import get_circuit_breaker  # noqa: E402
+from api_clients.sire.client import SireClient  # noqa: E402
+from core.config import settings  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def entorno(monkeypatch):
+    monkeypatch.setattr(core.redis_client, "_redis_client", fakeredis.FakeRedis(decode_responses=True))
+    monkeypatch.setitem(settings.SUNAT_RETRY_POLITICAS, "estado", {"espera_base": 0.0, "hedge_despues": 0.01})
+    monkeypatch.setitem(settings.SUNAT_RETRY_POLITICAS, "seguridad", {"espera_base": 0.0})
+
+
+def _consultar(handler):
+    client = SireClient(
+        ruc="20100000001", client_id="cliente", client_secret="secreto",
+        user_sol="USUARIO", clave_sol="clave",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    client._access_token = "vencido"
+
+    async def consultar():
+        # Familia 'estado': idempotente y con cobertura
+        return await client._make_request("GET", f"{client.BASE_URL_SIRE}/consultaestadotickets")
+    return asyncio.run(consultar())
+
+
+def test_cobertura_comparte_un_solo_refresco():
+    autenticaciones, rechazadas = [], []
+
+    async def handler(request):
+        if "oauth2/token" in request.url.path:
+            autenticaciones.append(request)
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={"access_token": "nuevo"})
+        if request.headers["Authorization"] == "Bearer vencido":
+            # Lento: dispara la solicitud de cobertura antes del 401
+            rechazadas.append(request)
+            await asyncio.sleep(0.03)
+            return httpx.Response(401)
+        return httpx.Response(200, json={"registros": []})
+
+    response = _consultar(handler)
+
+    assert response.status_code == 200
+    assert len(rechazadas) == 2
+    assert len(autenticaciones) == 1
+
+
+def test_refresco_fallido_es_un_intento_y_no_cuenta_en_la_familia():
+    autenticaciones = []
+
+    def handler(request):
+        if "oauth2/token" in request.url.path:
+            autenticaciones.append(request)
+            return httpx.Response(503)
+        return httpx.Response(401)
+
+    with pytest.raises(SunatTokenRefreshError):
+        _consultar(handler)
+
+    assert len(autenticaciones) == 1
+    assert get_circuit_breaker("seguridad").estado()["fallos"] == 1
+    assert get_circuit_breaker("estado").estado()["fallos"] == 0
@@ -0,0 +1,88 @@
+"""
+Circuit breaker de SUNAT (api_clients/circuit_breaker.py) sobre fakeredis:
+apertura por umbral en una ventana deslizante, sondas en HALF_OPEN y cierre ante cualquier respuesta.
+"""
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import core.redis_client  # noqa: E402
+from api_clients import circuit_breaker as cb  # noqa: E402
+
+
+@pytest.fixture
+def circuito(monkeypatch):
+    monkeypatch.setattr(core.redis_client, "_redis_client", fakeredis.FakeRedis(decode_responses=True))
+    circuito = cb.CircuitBreaker("propuesta")
+    circuito.umbral, circuito.max_sondas, circuito.enfriamiento = 2, 1, 60
+    return circuito
+
+
+def _enfriar(circuito, monkeypatch):
+    """Adelanta el reloj más allá del enfriamiento."""
+    ahora = cb.time.time() + circuito.enfriamiento + 1
+    monkeypatch.setattr(cb.time, "time", lambda: ahora)
+
+
+def test_abre_al_superar_el_umbral(circuito):
+    circuito.registrar_fallo()
+    circuito.verificar()
+    circuito.registrar_fallo()
+
+    with pytest.raises(cb.SunatCircuitOpenError) as e:
+        circuito.verificar()
+    assert circuito.estado()["estado"] == cb.OPEN
+    assert 1 <= e.value.retry_after <= 60
+
+
+def test_ventana_deslizante_cuenta_fallos_a_ambos_lados_del_limite(circuito, monkeypatch):
+    circuito.umbral, circuito.ventana = 3, 60
+    inicio = cb.time.time()
+
+    def fallar_en(segundos):
+        monkeypatch.setattr(cb.time, "time", lambda: inicio + segundos)
+        circuito.registrar_fallo()
+
+    fallar_en(0)
+    fallar_en(59)
+    fallar_en(61)  # el de t=0 ya salió de la ventana
+    assert circuito.estado() == {"estado": cb.CLOSED, "fallos": 2, "abierto_hasta": None}
+
+    fallar_en(61)
+    assert circuito.estado()["estado"] == cb.OPEN
+
+
+def test_half_open_limita_sondas_y_un_fallo_reabre(circuito, monkeypatch):
+    circuito.registrar_fallo()
+    circuito.registrar_fallo()
+    _enfriar(circuito, monkeypatch)
+
+    circuito.verificar()  # única sonda
+    assert circuito.estado()["estado"] == cb.HALF_OPEN
+    with pytest.raises(cb.SunatCircuitOpenError):
+        circuito.verificar()
+
+    circuito.registrar_fallo()
+    assert circuito.estado()["estado"] == cb.OPEN
+
+
+def test_sonda_con_error_4xx_cierra_el_circuito(circuito, monkeypatch):
+    circuito.registrar_fallo()
+    circuito.registrar_fallo()
+    _enfriar(circuito, monkeypatch)
+    circuito.verificar()
+
+    circuito.registrar_respuesta()
+
+    assert circuito.estado() == {"estado": cb.CLOSED, "fallos": 0, "abierto_hasta": None}
+    circuito.verificar()
+
+
+def test_respuesta_fuera_de_half_open_no_cierra(circuito):
+    circuito.registrar_fallo()
+    circuito.registrar_fallo()
+
+    circuito.registrar_respuesta()
+
+    assert circuito.estado()["estado"] == cb.OPEN
@@ -0,0 +1,83 @@
+"""
+Suscriptor pub/sub compartido de la API (core/eventos.py) sobre fakeredis:
+reparto por operación, cupo de suscripciones y rechazo con 503 sin Redis.
+"""
+
+import asyncio
+import os
+from contextlib import AsyncExitStack
+
+import pytest
+from cryptography.fernet import Fernet
+from fastapi import HTTPException
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("psycopg2")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+
+import core.redis_client  # noqa: E402
+from api.routes.sire import _suscribir  # noqa: E402
+from core import eventos  # noqa: E402
+
+
+@pytest.fixture
+def servidor(monkeypatch):
+    servidor = fakeredis.FakeServer()
+    monkeypatch.setattr(core.redis_client, "_redis_client", fakeredis.FakeRedis(server=servidor, decode_responses=True))
+    monkeypatch.setattr(
+        core.redis_client, "_redis_pubsub_client", fakeredis.FakeAsyncRedis(server=servidor, decode_responses=True)
+    )
+    monkeypatch.setattr(eventos, "_difusor", None)
+    monkeypatch.setattr(eventos.DifusorEventos, "ESPERA_CONEXION", 0.2)
+    return servidor
+
+
+def _correr(coro):
+    async def con_cierre():
+        try:
+            return await coro
+        finally:
+            await eventos.cerrar_difusor()
+    return asyncio.run(con_cierre())
+
+
+def test_un_solo_suscriptor_reparte_a_cada_operacion(servidor):
+    async def escenario():
+        async with eventos.suscripcion_operacion(1) as primera, \
+                eventos.suscripcion_operacion(1) as segunda, \
+                eventos.suscripcion_operacion(2) as otra:
+            eventos.publicar_cambio_estado([1], "PROCESSING", ticket="T-1")
+            recibidos = [await eventos.siguiente_cambio(c, 1) for c in (primera, segunda)]
+            return recibidos, await eventos.siguiente_cambio(otra, 0.1)
+
+    recibidos, otra = _correr(escenario())
+
+    assert [(m["id"], m["estado"], m["ticket"]) for m in recibidos] == [(1, "PROCESSING", "T-1")] * 2
+    assert otra is None
+
+
+def test_sin_cupo_rechaza_y_libera_al_salir(servidor, monkeypatch):
+    monkeypatch.setattr(eventos.settings, "EVENTOS_MAX_SUSCRIPCIONES", 1)
+
+    async def escenario():
+        async with eventos.suscripcion_operacion(1):
+            with pytest.raises(eventos.EventosNoDisponiblesError):
+                async with eventos.suscripcion_operacion(2):
+                    pass
+        async with eventos.suscripcion_operacion(2) as cola:
+            return cola
+
+    assert _correr(escenario()) is not None
+
+
+def test_sin_redis_la_api_responde_503(servidor):
+    servidor.connected = False
+
+    async def escenario():
+        async with AsyncExitStack() as pila:
+            await _suscribir(pila, 1)
+
+    with pytest.raises(HTTPException) as e:
+        _correr(escenario())
+    assert e.value.status_code == 503
+    assert e.value.headers["Retry-After"] == "5"
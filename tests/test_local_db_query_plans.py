@@ -0,0 +1,115 @@
+"""
+Regresión de planes de consulta de la BD local legacy (driver_sunat).
+
+Cada consulta frecuente se pasa por EXPLAIN QUERY PLAN sobre una BD recién
+migrada: ninguna tabla filtrada puede recorrerse completa (SCAN). Las
+excepciones son `contribuyentes c` en el loader, que la recorre a propósito
+para filtrar por is_active y resuelve el resto con subconsultas indexadas,
+y la lista de RUC de json_each en la sincronización del buzón.
+"""
+
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+
+pytest.importorskip("psycopg2")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+
+from driver_sunat.config import config  # noqa: E402
+from driver_sunat.database.connection import (  # noqa: E402
+    close_local_db_connection,
+    get_local_db_connection,
+)
+from driver_sunat.database.contribuyentes import (  # noqa: E402
+    active,
+    build_query,
+    not_flagged_non_employer,
+    with_pending_reports,
+    with_sire_creds,
+)
+from driver_sunat.database.migrations import (  # noqa: E402
+    LATEST_VERSION,
+    get_schema_version,
+    migrate,
+)
+from driver_sunat.database.sync import BUZON_LOCAL_QUERY  # noqa: E402
+
+# (nombre, sql, params, tablas que sí pueden recorrerse completas)
+HOT_QUERIES = [
+    ("get_messages_by_ruc_as_dict",
+     "SELECT id, leido FROM buzon_mensajes WHERE ruc = ?", ("1",), set()),
+    ("sync_buzones_to_central(rucs)",
+     BUZON_LOCAL_QUERY.format(where="WHERE ruc IN (SELECT value FROM json_each(?))"), ('["1", "2"]',), {"json_each"}),
+    ("get_pending_reports(ruc)",
+     "SELECT * FROM reportes_tregistro WHERE ruc = ? AND estado = 'SOLICITADO'", ("1",), set()),
+    ("get_pending_reports()",
+     "SELECT * FROM reportes_tregistro WHERE estado = 'SOLICITADO'", (), set()),
+    ("get_pending_sire_reports(ruc, tipo)",
+     "SELECT * FROM sire_reportes WHERE estado = 'SOLICITADO' AND ruc = ? AND tipo = ?", ("1", "ventas"), set()),
+    ("get_pending_sire_reports(tipo)",
+     "SELECT * FROM sire_reportes WHERE estado = 'SOLICITADO' AND tipo = ?", ("ventas",), set()),
+    ("sync_determinant_observations_to_central",
+     "SELECT id, ruc, mensaje FROM observaciones WHERE tipo = 'DETERMINANTE' AND estado = 'PENDIENTE'", (), set()),
+    ("get_sire_reports_for_period",
+     "SELECT * FROM sire_reportes WHERE periodo = ? ORDER BY id", ("202501",), set()),
+    ("get_otras_credenciales(ruc, tipo)",
+     "SELECT * FROM otras_credenciales WHERE ruc = ? AND tipo = ?", ("1", "APISUNAT"), set()),
+    ("get_sire_credentials",
+     """SELECT oc.usuario, oc.contrasena, c.user_sol
+        FROM otras_credenciales oc
+        JOIN contribuyentes c ON oc.ruc = c.ruc
+        WHERE oc.ruc = ? AND oc.tipo = 'APISUNAT' AND oc.observaciones LIKE '%SIRE%'""", ("1",), set()),
+    ("iter_contribuyentes(todos los filtros)",
+     *build_query(active(), with_sire_creds(), not_flagged_non_employer(25), with_pending_reports()), {"c"}),
+]
+
+
+@pytest.fixture
+def bd_local(tmp_path):
+    path_original = config.DATABASE_PATH
+    config.DATABASE_PATH = str(tmp_path / "sunat_data.db")
+    migrate()
+    yield get_local_db_connection()
+    close_local_db_connection()
+    config.DATABASE_PATH = path_original
+
+
+def test_migrate_es_idempotente(bd_local):
+    assert get_schema_version(bd_local) == LATEST_VERSION
+    assert migrate() == LATEST_VERSION
+
+
+def test_migrate_completa_bd_sin_version(tmp_path):
+    """Una BD anterior al versionado (user_version 0) recibe columnas e índices."""
+    path_original = config.DATABASE_PATH
+    config.DATABASE_PATH = str(tmp_path / "legacy.db")
+    try:
+        conn = get_local_db_connection()
+        conn.execute("""CREATE TABLE observaciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, ruc TEXT NOT NULL,
+            mensaje TEXT NOT NULL, timestamp TEXT NOT NULL)""")
+        conn.execute("INSERT INTO observaciones (ruc, mensaje, timestamp) VALUES ('1', 'm', '2025-01-01')")
+
+        assert migrate() == LATEST_VERSION
+        fila = conn.execute("SELECT tipo, estado, fecha_observacion FROM observaciones").fetchone()
+        assert tuple(fila) == ("LOCAL", "PENDIENTE", "2025-01-01")
+    finally:
+        close_local_db_connection()
+        config.DATABASE_PATH = path_original
+
+
+@pytest.mark.parametrize(
+    "sql, params, scans_permitidos",
+    [q[1:] for q in HOT_QUERIES],
+    ids=[q[0] for q in HOT_QUERIES],
+)
+def test_consulta_frecuente_sin_scan_completo(bd_local, sql, params, scans_permitidos):
+    plan = [row["detail"] for row in bd_local.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+    scans = {
+        detail.split()[1]
+        for detail in plan
+        if detail.startswith("SCAN ") and "USING" not in detail
+    }
+    assert scans <= scans_permitidos, plan
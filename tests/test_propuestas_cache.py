@@ -0,0 +1,94 @@
+"""
+Caché local de propuestas SIRE (core/propuestas_cache.py): frescura,
+desalojo LRU por tamaño, nivel S3 y contadores de aciertos/fallos.
+"""
+
+import os
+
+import pytest
+
+from core.metrics import SIRE_PROPUESTAS_CACHE
+from core.propuestas_cache import PropuestasCache
+
+KB = 1024
+
+
+def _contador(resultado: str) -> float:
+    return SIRE_PROPUESTAS_CACHE.labels(resultado=resultado)._value.get()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PropuestasCache(str(tmp_path / "cache"), max_bytes=25 * KB, frescura=3600)
+
+
+def test_acierto_y_fallo_se_cuentan(cache):
+    misses, hits = _contador("miss"), _contador("hit_disco")
+
+    assert cache.obtener("20100000001", "202501", "ventas") is None
+    guardada = cache.guardar("20100000001", "202501", "ventas", "LE.zip", contenido=b"z" * KB)
+    servida = cache.obtener("20100000001", "202501", "ventas")
+
+    assert servida.digest == guardada.digest
+    assert servida.leer() == b"z" * KB
+    assert _contador("miss") == misses + 1
+    assert _contador("hit_disco") == hits + 1
+
+
+def test_fuera_de_la_ventana_de_frescura_es_fallo(tmp_path):
+    cache = PropuestasCache(str(tmp_path), max_bytes=KB * KB, frescura=0)
+    cache.guardar("20100000001", "202501", "ventas", "LE.zip", contenido=b"z")
+
+    assert cache.obtener("20100000001", "202501", "ventas") is None
+
+
+def test_desalojo_lru_por_tamano(cache):
+    for periodo in ("202501", "202502"):
+        cache.guardar("20100000001", periodo, "ventas", "LE.zip", contenido=os.urandom(10 * KB))
+    # 202501 pasa a ser la más reciente en uso
+    cache.obtener("20100000001", "202501", "ventas")
+
+    cache.guardar("20100000001", "202503", "ventas", "LE.zip", contenido=os.urandom(10 * KB))
+
+    assert cache.obtener("20100000001", "202501", "ventas").ruta is not None
+    assert cache.obtener("20100000001", "202502", "ventas") is None
+    assert cache.obtener("20100000001", "202503", "ventas").ruta is not None
+    assert sum(os.path.getsize(os.path.join(cache.directorio, f))
+               for f in os.listdir(cache.directorio) if f.endswith(".zip")) <= 25 * KB
+
+
+def test_desalojada_con_url_s3_se_sirve_desde_s3(cache):
+    guardada = cache.guardar("20100000001", "202501", "ventas", "LE.zip", contenido=os.urandom(10 * KB))
+    cache.registrar_s3("20100000001", "202501", "ventas", guardada.digest, "s3://bucket/unparsed/LE.zip")
+    for periodo in ("202502", "202503"):
+        cache.guardar("20100000001", periodo, "ventas", "LE.zip", contenido=os.urandom(10 * KB))
+
+    servida = cache.obtener("20100000001", "202501", "ventas")
+
+    assert servida.ruta is None
+    assert servida.s3_url == "s3://bucket/unparsed/LE.zip"
+    assert cache.obtener("20100000001", "202501", "ventas", incluir_s3=False) is None
+
+
+def test_guardar_desde_ruta_y_publicar_copia(cache, tmp_path):
+    origen = tmp_path / "descarga.zip"
+    origen.write_bytes(b"propuesta")
+    cache.guardar("20100000001", "202501", "compras", "LE.zip", ruta=str(origen))
+    origen.unlink()
+
+    destino = tmp_path / "LE.zip"
+    cache.obtener("20100000001", "202501", "compras").copiar_a(str(destino))
+
+    assert destino.read_bytes() == b"propuesta"
+
+
+def test_escritura_fallida_no_deja_temporales(cache, monkeypatch):
+    def disco_lleno(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr("core.propuestas_cache.os.replace", disco_lleno)
+
+    with pytest.raises(OSError):
+        cache.guardar("20100000001", "202501", "ventas", "LE.zip", contenido=b"z")
+
+    assert [f for f in os.listdir(cache.directorio) if f.endswith(".part")] == []
@@ -0,0 +1,47 @@
+"""
+Cifrado de credenciales del paquete legacy (driver_sunat/security.py):
+descifrado por lotes y el dict con la contraseña descifrada a demanda.
+"""
+
+import json
+
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+
+from driver_sunat.security import CryptoService
+
+
+@pytest.fixture
+def crypto():
+    return CryptoService(Fernet.generate_key())
+
+
+def test_decrypt_many_conserva_orden_y_marca_invalidos(crypto):
+    tokens = [crypto.encrypt("uno"), b"no-es-un-token", crypto.encrypt("tres")]
+
+    assert crypto.decrypt_many(tokens) == ["uno", None, "tres"]
+
+
+def test_lazy_incluye_el_campo_en_todas_las_vistas(crypto):
+    def nuevo():
+        return crypto.lazy({"ruc": "20100000001", "user_sol": "USUARIO"}, "password_sol", crypto.encrypt("clave"))
+
+    esperado = {"ruc": "20100000001", "user_sol": "USUARIO", "password_sol": "clave"}
+
+    assert list(nuevo()) == list(esperado)
+    assert len(nuevo()) == 3 and "password_sol" in nuevo()
+    assert dict(nuevo()) == esperado
+    assert {**nuevo()} == esperado
+    assert nuevo() == esperado and nuevo() == nuevo()
+    assert json.loads(json.dumps(nuevo())) == esperado
+    assert dict(nuevo().items()) == esperado
+    assert nuevo().copy() == esperado
+
+
+def test_lazy_no_descifra_hasta_leer_el_valor(crypto):
+    contribuyente = crypto.lazy({"ruc": "20100000001"}, "password_sol", b"token-invalido")
+
+    assert contribuyente["ruc"] == "20100000001"
+    assert "<cifrado>" in repr(contribuyente)
+    with pytest.raises(InvalidToken):
+        contribuyente["password_sol"]
@@ -0,0 +1,160 @@
+"""
+Corrida SIRE por lotes del paquete legacy (driver_sunat.automation.sire.sire_batch).
+
+Cubre la reanudación desde sire_reportes sobre una BD SQLite temporal,
+con un SireClient simulado: lo terminado no se vuelve a tocar, los
+tickets SOLICITADO se siguen consultando sin pedir otro, los ERROR se
+solicitan de nuevo y lo que no termina a tiempo queda SOLICITADO.
+"""
+
+import logging
+import os
+from collections import Counter
+
+import pytest
+from cryptography.fernet import Fernet
+
+pytest.importorskip("psycopg2")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+
+from api_clients.sire.estados import estado_en_proceso  # noqa: E402
+from api_clients.sire.schemas import (  # noqa: E402
+    EstadoTicket,
+    ParametrosDescarga,
+    TicketStatus,
+)
+from core.propuestas_cache import PropuestasCache  # noqa: E402
+from driver_sunat.automation.sire import sire_batch  # noqa: E402
+from driver_sunat.config import config  # noqa: E402
+from driver_sunat.database import operations as db  # noqa: E402
+from driver_sunat.database.connection import (  # noqa: E402
+    close_local_db_connection,
+    get_local_db_connection,
+)
+from driver_sunat.database.migrations import migrate  # noqa: E402
+
+RUC = "20100000001"
+PERIODO = "202501"
+CONTRIBUYENTE = {"ruc": RUC, "user_sol": "USUARIO", "password_sol": "clave"}
+
+
+class ClienteSimulado:
+    """SireClient legacy en memoria: `estados` decide qué responde cada ticket."""
+
+    def __init__(self, estados):
+        self.estados = estados
+        self.solicitudes = []
+        self.consultas = []
+
+    def request_proposal(self, ruc, sol_user, sol_pass, tipo, periodo):
+        self.solicitudes.append(tipo)
+        return f"T-{tipo}-{len(self.solicitudes)}"
+
+    def query_ticket_status(self, ruc, sol_user, sol_pass, ticket, periodo):
+        self.consultas.append(ticket)
+        if self.estados.get(ticket, self.estados.get("*")) != "LISTO":
+            return estado_en_proceso(ticket, "En proceso")
+        params = ParametrosDescarga(f"LE{ticket}.zip", "01", "140400", periodo, "10", ticket)
+        return TicketStatus(ticket, "06", "Terminado", EstadoTicket.LISTO, parametros_descarga=params)
+
+    def download_file(self, ruc, sol_user, sol_pass, download_params, tipo=None):
+        ruta = os.path.join(config.DOWNLOAD_PATH, download_params["nomArchivoReporte"])
+        with open(ruta, "wb") as f:
+            f.write(b"PK\x05\x06" + b"\x00" * 18)
+        return ruta
+
+
+@pytest.fixture
+def entorno(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DATABASE_PATH", str(tmp_path / "sunat_data.db"))
+    monkeypatch.setattr(config, "DOWNLOAD_PATH", str(tmp_path / "descargas"))
+    os.makedirs(config.DOWNLOAD_PATH)
+    cache = PropuestasCache(str(tmp_path / "cache"), max_bytes=1 << 20, frescura=3600)
+    monkeypatch.setattr(sire_batch, "get_propuestas_cache", lambda: cache)
+    migrate()
+    yield
+    close_local_db_connection()
+
+
+def _registrar(tipo, estado, ticket=None):
+    return db.add_sire_request({
+        "ruc": RUC, "tipo": tipo, "periodo": PERIODO, "ticket": ticket,
+        "estado": estado, "fecha_solicitud": "2025-02-09T09:00:00",
+    })
+
+
+def _correr(monkeypatch, cliente, poll_max_wait=5.0) -> Counter:
+    monkeypatch.setattr(sire_batch, "SireClient", lambda logger, ruc: cliente)
+    runner = sire_batch.SireBatchRunner(
+        logging.getLogger("test"), PERIODO, max_workers=2, poll_interval=0, poll_max_wait=poll_max_wait,
+    )
+    return runner.run([CONTRIBUYENTE])
+
+
+def _filas():
+    return [
+        tuple(fila) for fila in get_local_db_connection().execute(
+            "SELECT tipo, estado, ticket FROM sire_reportes ORDER BY id"
+        )
+    ]
+
+
+def test_reportes_terminados_no_se_vuelven_a_pedir(entorno, monkeypatch):
+    _registrar("ventas", "DESCARGADO", "T-1")
+    _registrar("compras", "SIN_DATOS", "T-2")
+    cliente = ClienteSimulado({"*": "LISTO"})
+
+    resumen = _correr(monkeypatch, cliente)
+
+    assert resumen == Counter({"DESCARGADO": 1, "SIN_DATOS": 1})
+    assert cliente.solicitudes == [] and cliente.consultas == []
+
+
+def test_solicitado_se_retoma_y_error_se_vuelve_a_pedir(entorno, monkeypatch):
+    _registrar("ventas", "SOLICITADO", "T-previo")
+    _registrar("compras", "ERROR", "T-fallido")
+    cliente = ClienteSimulado({"*": "LISTO"})
+
+    resumen = _correr(monkeypatch, cliente)
+
+    assert resumen == Counter({"DESCARGADO": 2})
+    assert cliente.solicitudes == ["compras"]
+    assert "T-previo" in cliente.consultas and "T-fallido" not in cliente.consultas
+    assert _filas() == [
+        ("ventas", "DESCARGADO", "T-previo"),
+        ("compras", "ERROR", "T-fallido"),
+        ("compras", "DESCARGADO", "T-compras-1"),
+    ]
+
+
+def test_tickets_sin_terminar_quedan_solicitados_para_la_proxima_corrida(entorno, monkeypatch):
+    en_proceso = ClienteSimulado({})
+
+    assert _correr(monkeypatch, en_proceso, poll_max_wait=0) == Counter({"SOLICITADO": 2})
+    assert [estado for _, estado, _ in _filas()] == ["SOLICITADO", "SOLICITADO"]
+
+    listo = ClienteSimulado({"*": "LISTO"})
+    assert _correr(monkeypatch, listo) == Counter({"DESCARGADO": 2})
+    assert listo.solicitudes == []
+    assert [estado for _, estado, _ in _filas()] == ["DESCARGADO", "DESCARGADO"]
+
+
+def test_propuesta_desalojada_antes_de_copiar_se_pide_a_sunat(entorno, monkeypatch):
+    cache = sire_batch.get_propuestas_cache()
+    guardada = cache.guardar(RUC, PERIODO, "ventas", "LE.zip", contenido=b"propuesta")
+    # Otro proceso la desaloja entre obtener() y copiar_a()
+    obtener = cache.obtener
+
+    def obtener_y_desalojar(*args, **kwargs):
+        en_cache = obtener(*args, **kwargs)
+        if en_cache is not None:
+            os.remove(guardada.ruta)
+        return en_cache
+
+    monkeypatch.setattr(cache, "obtener", obtener_y_desalojar)
+    cliente = ClienteSimulado({"*": "LISTO"})
+
+    resumen = _correr(monkeypatch, cliente)
+
+    assert resumen == Counter({"DESCARGADO": 2})
+    assert sorted(cliente.solicitudes) == ["compras", "ventas"]
@@ -0,0 +1,139 @@
+"""
+Descarga SIRE en streaming a disco (driver_sunat.automation.sire.descarga).
+
+SUNAT se simula con httpx.MockTransport y Redis con fakeredis. Cubre la
+reanudación con Range tras un corte a mitad del archivo, el servidor que
+ignora el Range y las verificaciones de integridad del ZIP.
+"""
+
+import asyncio
+import io
+import os
+import zipfile
+
+import httpx
+import pytest
+from cryptography.fernet import Fernet
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("psycopg2")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+
+import core.redis_client  # noqa: E402
+from api_clients.sire.client import SireClient  # noqa: E402
+from core.config import settings  # noqa: E402
+from driver_sunat.automation.sire.descarga import (  # noqa: E402
+    ZipDownloadFile,
+    ZipIntegrityError,
+)
+
+PARAMS = {
+    "nomArchivoReporte": "LE20100000001202610010014040001EXP2.zip",
+    "codTipoArchivoReporte": "01",
+    "codLibro": "140400",
+    "perTributario": "202501",
+    "codProceso": "10",
+    "numTicket": "123",
+}
+
+
+class _CuerpoCortado(httpx.AsyncByteStream):
+    """Entrega `datos` y luego simula la caída de la conexión."""
+
+    def __init__(self, datos: bytes):
+        self.datos = datos
+
+    async def __aiter__(self):
+        yield self.datos
+        raise httpx.ReadError("conexión cerrada por el servidor")
+
+
+@pytest.fixture(autouse=True)
+def entorno(monkeypatch):
+    monkeypatch.setattr(core.redis_client, "_redis_client", fakeredis.FakeRedis(decode_responses=True))
+    # Sin esperas entre reintentos; la cobertura no debe usarse en streaming
+    monkeypatch.setitem(settings.SUNAT_RETRY_POLITICAS, "descarga", {"espera_base": 0.0, "hedge_despues": 0.001})
+
+
+@pytest.fixture
+def zip_reporte():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as z:
+        z.writestr("LE2010000000120250100140400001112.txt", os.urandom(300_000))
+    return buffer.getvalue()
+
+
+def _descargar(tmp_path, handler):
+    client = SireClient(
+        ruc="20100000001", client_id="cliente", client_secret="secreto",
+        user_sol="USUARIO", clave_sol="clave",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    client._access_token = "token"
+    with ZipDownloadFile(str(tmp_path)) as archivo:
+        respuesta = asyncio.run(client.descargar_archivo(PARAMS, receptor=archivo))
+        return archivo.finalizar(str(tmp_path / respuesta.nom_archivo))
+
+
+def test_reanuda_con_range_tras_corte(tmp_path, zip_reporte):
+    corte = len(zip_reporte) // 3
+    solicitudes = []
+
+    def handler(request):
+        solicitudes.append(request)
+        if len(solicitudes) == 1:
+            return httpx.Response(200, stream=_CuerpoCortado(zip_reporte[:corte]), headers={
+                "Content-Type": "application/zip", "Content-Length": str(len(zip_reporte)), "ETag": '"v1"',
+            })
+        return httpx.Response(206, content=zip_reporte[corte:], headers={
+            "Content-Type": "application/zip",
+            "Content-Range": f"bytes {corte}-{len(zip_reporte) - 1}/{len(zip_reporte)}",
+        })
+
+    ruta = _descargar(tmp_path, handler)
+
+    assert len(solicitudes) == 2
+    assert solicitudes[1].headers["Range"] == f"bytes={corte}-"
+    assert solicitudes[1].headers["If-Range"] == '"v1"'
+    with open(ruta, "rb") as f:
+        assert f.read() == zip_reporte
+    assert os.path.basename(ruta) == "LE20100000001202501000014040001EXP2.zip"
+    assert os.listdir(tmp_path) == [os.path.basename(ruta)]
+
+
+def test_servidor_sin_range_reinicia_el_archivo(tmp_path, zip_reporte):
+    solicitudes = []
+
+    def handler(request):
+        solicitudes.append(request)
+        if len(solicitudes) == 1:
+            return httpx.Response(200, stream=_CuerpoCortado(zip_reporte[:1000]))
+        return httpx.Response(200, content=zip_reporte)
+
+    ruta = _descargar(tmp_path, handler)
+
+    with open(ruta, "rb") as f:
+        assert f.read() == zip_reporte
+
+
+def test_zip_truncado_no_se_publica(tmp_path, zip_reporte):
+    truncado = zip_reporte[:-10]
+
+    with pytest.raises(ZipIntegrityError):
+        _descargar(tmp_path, lambda request: httpx.Response(200, content=truncado))
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_respuesta_que_no_es_zip_corta_sin_reintentar(tmp_path):
+    solicitudes = []
+
+    def handler(request):
+        solicitudes.append(request)
+        return httpx.Response(200, content=b"<html>" + b"x" * 1000, headers={"Content-Type": "text/html"})
+
+    with pytest.raises(ZipIntegrityError):
+        _descargar(tmp_path, handler)
+
+    assert len(solicitudes) == 1
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,93 @@
+"""
+Plan mensual SIRE (workers/sire_plan.py): clasificación contra el
+historial, prioridad, ritmo de encolado y proyección del dry-run.
+Solo las funciones puras; no requiere base de datos.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from core.config import settings
+from models.operaciones import EstadoOperacion
+from workers.sire_plan import (
+    DESACTUALIZADA,
+    FALLIDA,
+    FALTANTE,
+    calcular_countdowns,
+    clasificar,
+    periodos_del_plan,
+    priorizar,
+    proyectar,
+)
+
+AHORA = datetime(2025, 10, 9, 14, tzinfo=timezone.utc)
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_periodos_del_plan_son_los_meses_cerrados():
+    assert periodos_del_plan(3, AHORA) == ["202507", "202508", "202509"]
+    assert periodos_del_plan(2, _utc(2025, 1, 15)) == ["202411", "202412"]
+
+
+@pytest.mark.parametrize("estado, actualizada, esperado", [
+    (None, None, FALTANTE),
+    (EstadoOperacion.ERROR, _utc(2025, 10, 2), FALLIDA),
+    (EstadoOperacion.PROCESSING, _utc(2025, 10, 9), None),
+    (EstadoOperacion.PAUSED, _utc(2025, 10, 3), None),
+    # Descargada dos días después del cierre: pueden faltar comprobantes
+    (EstadoOperacion.S3_UPLOADED, _utc(2025, 10, 2), DESACTUALIZADA),
+    (EstadoOperacion.EMPTY, _utc(2025, 10, 2), DESACTUALIZADA),
+    (EstadoOperacion.WEBHOOK_SENT, _utc(2025, 10, 9, 10), None),
+])
+def test_clasificar(estado, actualizada, esperado):
+    assert clasificar("202509", estado, actualizada, AHORA, dias_asentamiento=8) == esperado
+
+
+def test_no_se_refresca_antes_de_que_el_periodo_se_asiente():
+    descargada = _utc(2025, 10, 2)
+
+    assert clasificar("202509", EstadoOperacion.COMPLETED, descargada, _utc(2025, 10, 5), 8) is None
+
+
+def test_priorizar_y_countdowns():
+    plan = priorizar({
+        1: [{"periodo": "202507", "tipo": "ventas", "motivo": DESACTUALIZADA}],
+        2: [
+            {"periodo": "202508", "tipo": "compras", "motivo": FALLIDA},
+            {"periodo": "202509", "tipo": "ventas", "motivo": FALTANTE},
+            {"periodo": "202508", "tipo": "ventas", "motivo": FALTANTE},
+        ],
+        3: [{"periodo": "202509", "tipo": "compras", "motivo": FALTANTE}],
+        4: [],
+    })
+
+    assert list(plan) == [2, 3, 1]
+    assert [(t["periodo"], t["motivo"]) for t in plan[2]] == [
+        ("202509", FALTANTE), ("202508", FALTANTE), ("202508", FALLIDA),
+    ]
+    # 3 tickets del RUC 2 a 6 por minuto → el RUC 3 sale a los 30 s
+    assert calcular_countdowns(plan, 6) == {2: 0, 3: 30, 1: 40}
+
+
+def test_proyeccion_del_dry_run(monkeypatch):
+    monkeypatch.setattr(settings, "SIRE_PLAN_ESPERA_TICKET", 90)
+    monkeypatch.setattr(settings, "SIRE_POLL_INTERVALO", 30)
+    monkeypatch.setattr(settings, "SIRE_BACKFILL_PAUSA_SOLICITUDES", 2.0)
+    plan = {
+        20100000001: [{"periodo": "202509", "tipo": t, "motivo": FALTANTE} for t in ("ventas", "compras")],
+        20100000002: [{"periodo": "202508", "tipo": "ventas", "motivo": FALLIDA}],
+    }
+
+    proyeccion = proyectar(plan, solicitudes_por_minuto=60)
+
+    assert proyeccion["por_motivo"] == {FALTANTE: 2, FALLIDA: 1, DESACTUALIZADA: 0}
+    # 2 tokens + 3 solicitudes + 3 rondas de estado por RUC + 3 descargas
+    assert proyeccion["llamadas_sunat"] == {
+        "token": 2, "solicitud": 3, "estado": 6, "descarga": 3, "total": 14,
+    }
+    # El segundo RUC sale a los 2 s y espera 3 rondas de 30 s
+    assert proyeccion["duracion_estimada_segundos"] == 92
@@ -2,17 +2,56 @@
 Configuración de Celery para el microservicio driver_sunat.
 
 Define la instancia de Celery que se conecta a Redis (broker y backend)
-e incluye automáticamente las tareas definidas en workers.sire_tasks.
+e incluye automáticamente las tareas definidas en workers.sire_tasks,
+workers.sire_backfill, workers.sire_plan_mensual y workers.mantenimiento
+(las dos últimas programadas con Celery beat).
+
+También inicia el exportador de métricas Prometheus del worker en
+METRICS_WORKER_PORT (ver core/metrics.py) y propaga el contexto de trazas
+OpenTelemetry en los headers de cada tarea (ver core/tracing.py).
 """
 
+import logging
+import os
+
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import (
+    before_task_publish,
+    task_failure,
+    task_postrun,
+    task_prerun,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_ready,
+)
+
 from core.config import settings
+from core.metrics import (
+    iniciar_exportador,
+    marcar_proceso_terminado,
+    registrar_rss_pico,
+)
+from core.tracing import (
+    celery_fallo_tarea,
+    celery_iniciar_tarea,
+    celery_publicar,
+    celery_terminar_tarea,
+    configurar_tracing,
+)
+
+logger = logging.getLogger(__name__)
 
 celery_app = Celery(
     "driver_sunat",
     broker=settings.REDIS_URL,
     backend=settings.REDIS_URL,
-    include=["workers.sire_tasks"],
+    include=[
+        "workers.sire_tasks",
+        "workers.sire_backfill",
+        "workers.sire_plan_mensual",
+        "workers.mantenimiento",
+    ],
 )
 
 # Configuración general
@@ -25,4 +64,69 @@ celery_app.conf.update(
     task_track_started=True,
     task_acks_late=True,
     worker_prefetch_multiplier=1,
-)
\ No newline at end of file
+    beat_schedule={
+        "mantener-particiones-sire": {
+            "task": "workers.mantenimiento.task_mantener_particiones",
+            "schedule": crontab(hour=3, minute=15),
+        },
+        # Mismo horario que SCHEDULE_CONFIG['sire_reports'] del paquete legacy
+        "plan-mensual-sire": {
+            "task": "workers.sire_plan_mensual.task_plan_mensual_sire",
+            "schedule": crontab(day_of_month=9, hour=9, minute=0),
+        },
+    },
+)
+
+
+# ---------------------------------------------------------------------------
+# Exportador de métricas del worker
+# ---------------------------------------------------------------------------
+@worker_ready.connect
+def _iniciar_metricas(**kwargs):
+    """Expone las métricas del worker (proceso principal) en METRICS_WORKER_PORT."""
+    if not settings.METRICS_WORKER_PORT:
+        return
+    try:
+        iniciar_exportador(settings.METRICS_WORKER_PORT)
+    except OSError as e:
+        # Otro worker en el mismo host ya ocupa el puerto
+        logger.warning(
+            "No se pudo iniciar el exportador de métricas en :%d: %s",
+            settings.METRICS_WORKER_PORT, e,
+        )
+
+
+@worker_process_shutdown.connect
+def _limpiar_metricas_proceso(pid=None, **kwargs):
+    """Descarta las métricas en vivo de un proceso hijo que terminó."""
+    marcar_proceso_terminado(pid or os.getpid())
+
+
+# ---------------------------------------------------------------------------
+# Trazas distribuidas
+# ---------------------------------------------------------------------------
+@worker_process_init.connect
+def _iniciar_tracing(**kwargs):
+    """Configura el exportador OTLP en cada proceso hijo (después del fork)."""
+    configurar_tracing("worker")
+
+
+@before_task_publish.connect
+def _propagar_traza(headers=None, **kwargs):
+    celery_publicar(headers)
+
+
+@task_prerun.connect
+def _abrir_span_tarea(task_id=None, task=None, kwargs=None, **extra):
+    celery_iniciar_tarea(task_id, task, kwargs)
+
+
+@task_failure.connect
+def _marcar_span_fallido(task_id=None, exception=None, **kwargs):
+    celery_fallo_tarea(task_id, exception)
+
+
+@task_postrun.connect
+def _cerrar_span_tarea(task_id=None, state=None, **kwargs):
+    celery_terminar_tarea(task_id, state)
+    registrar_rss_pico()
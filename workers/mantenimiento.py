@@ -0,0 +1,39 @@
+"""
+Tareas periódicas de mantenimiento (Celery beat).
+
+task_mantener_particiones (diaria):
+   - Crea por adelantado las particiones mensuales de driver.sire_operaciones
+     y driver.sire_operacion_eventos.
+   - Archiva en S3 y elimina las particiones fuera de la ventana de
+     retención (ver core/particiones.py).
+"""
+
+import logging
+
+from workers.celery_app import celery_app
+from core.database import engine_sync
+from core.particiones import aplicar_retencion, asegurar_particiones
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(
+    bind=True,
+    max_retries=0,
+    acks_late=True,
+)
+def task_mantener_particiones(self) -> dict:
+    """Crea las particiones próximas y aplica la retención."""
+    with engine_sync.begin() as conn:
+        creadas = asegurar_particiones(conn)
+
+    # La retención va en otra transacción: un fallo al archivar no debe
+    # impedir que existan las particiones de los próximos meses
+    with engine_sync.begin() as conn:
+        eliminadas = aplicar_retencion(conn)
+
+    logger.info(
+        "Mantenimiento de particiones: %d creadas, %d eliminadas",
+        creadas, len(eliminadas),
+    )
+    return {"creadas": creadas, "eliminadas": eliminadas}
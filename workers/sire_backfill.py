@@ -0,0 +1,551 @@
+"""
+Backfill de propuestas SIRE por rango de períodos.
+
+Permite encargar en una sola solicitud "RUCs X, períodos 202301–202512,
+ventas y compras". El flujo es:
+
+1. task_planificar_backfill_sire (una por backfill):
+   - Expande el rango en (RUC, período, tipo).
+   - Omite lo que ya fue descargado (salvo forzar=True) y los RUCs sin
+     credenciales SIRE.
+   - Crea las operaciones en PENDING enlazadas al backfill.
+   - Encola una tarea por RUC.
+
+2. task_backfill_ruc_sire (una por RUC):
+   - Ocupa el semáforo del RUC mientras solicita tickets (ver core.concurrency).
+   - Usa un solo SireClient (un solo token) para todos los períodos del RUC.
+   - Solicita los tickets de forma secuencial con una pausa entre ellos,
+     para no enviar ráfagas paralelas a SUNAT con el mismo token.
+   - Consulta el avance en bloque con perIni/perFin abarcando el rango,
+     en lugar de una consulta por ticket.
+   - Descarga, sube a S3 y notifica cada ticket terminado.
+   - Si el circuito de SUNAT se abre, la tarea se reprograma y al volver
+     retoma los tickets ya generados.
+
+El avance se consulta en GET /api/v1/sire/backfill/{id}.
+"""
+
+import asyncio
+import logging
+import time
+
+from sqlalchemy import func, select, update
+
+from workers.celery_app import celery_app
+from workers.sire_tasks import (
+    MAX_WAIT_SECONDS,
+    POLL_INTERVAL,
+    _actualizar_estado,
+    _diferir_tarea,
+    _obtener_credenciales,
+    _pausar_por_circuito,
+    _procesar_ticket_finalizado,
+    registrar_eventos,
+)
+from workers.sire_plan import expandir_periodos
+from core.concurrency import RucConcurrencyLimiter
+from core.config import settings
+from core.database import get_session_sync
+from core.eventos import publicar_cambio_estado
+from core.metrics import SIRE_POLLS_POR_TICKET, SIRE_TIEMPO_HASTA_LISTO
+from core.storage import S3StorageManager
+from core.tracing import span
+from models.operaciones import (
+    ESTADOS_DESCARGADOS,
+    ESTADOS_EN_CURSO,
+    EstadoOperacion,
+    SireBackfill,
+    SireOperacion,
+)
+from api_clients.circuit_breaker import SunatCircuitOpenError
+from api_clients.sire.client import SireClient
+from api_clients.sire.schemas import EstadoTicket
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# PLANIFICACIÓN
+# ============================================================================
+
+def _obtener_ya_descargados(session, ruc: int, periodos: list) -> set:
+    """
+    Retorna los (período, tipo) del RUC que ya tienen una descarga exitosa.
+    Una sola consulta por RUC en lugar de una por período.
+    """
+    filas = (
+        session.query(SireOperacion.periodo, SireOperacion.tipo_operacion)
+        .filter(
+            SireOperacion.ruc == ruc,
+            SireOperacion.periodo.in_(periodos),
+            SireOperacion.estado.in_(ESTADOS_DESCARGADOS),
+        )
+        .distinct()
+        .all()
+    )
+    return {(periodo, tipo) for periodo, tipo in filas}
+
+
+def planificar_backfill(session, backfill: SireBackfill) -> dict:
+    """
+    Expande un backfill en operaciones SIRE y las persiste en PENDING.
+
+    Returns:
+        dict: ruc → lista de IDs de operación creadas para ese RUC.
+    """
+    periodos = expandir_periodos(backfill.periodo_inicio, backfill.periodo_fin)
+    tipos = backfill.tipos.split(",")
+    rucs = [int(r) for r in backfill.rucs.split(",")]
+
+    plan = {}
+    omitidas = 0
+    sin_credenciales = []
+
+    for ruc in rucs:
+        if not _obtener_credenciales(session, ruc):
+            sin_credenciales.append(str(ruc))
+            omitidas += len(periodos) * len(tipos)
+            continue
+
+        ya_descargados = (
+            set() if backfill.forzar
+            else _obtener_ya_descargados(session, ruc, periodos)
+        )
+
+        operaciones = []
+        for periodo in periodos:
+            for tipo in tipos:
+                if (periodo, tipo) in ya_descargados:
+                    omitidas += 1
+                    continue
+                operaciones.append(
+                    SireOperacion(
+                        ruc=ruc,
+                        periodo=periodo,
+                        tipo_operacion=tipo,
+                        backfill_id=backfill.id,
+                        estado=EstadoOperacion.PENDING,
+                    )
+                )
+
+        if operaciones:
+            session.add_all(operaciones)
+            session.flush()
+            plan[ruc] = [op.id for op in operaciones]
+            registrar_eventos(
+                session, plan[ruc], EstadoOperacion.PENDING,
+                f"Operación creada por backfill {backfill.id}.",
+            )
+
+    log = (
+        f"{sum(len(ids) for ids in plan.values())} operaciones planificadas "
+        f"para {len(plan)} RUC(s); {omitidas} omitidas."
+    )
+    if sin_credenciales:
+        log += f" RUCs sin credenciales SIRE: {', '.join(sin_credenciales)}."
+
+    backfill.total_operaciones = sum(len(ids) for ids in plan.values())
+    backfill.omitidas = omitidas
+    backfill.estado = EstadoOperacion.PROCESSING
+    backfill.log = log
+    session.commit()
+
+    logger.info("Backfill %s: %s", backfill.id, log)
+    return plan
+
+
+# ============================================================================
+# TAREA 1: PLANIFICAR BACKFILL
+# ============================================================================
+
+@celery_app.task(
+    bind=True,
+    max_retries=0,
+    acks_late=True,
+    task_track_started=True,
+)
+def task_planificar_backfill_sire(self, backfill_id: int) -> dict:
+    """
+    Expande un backfill en operaciones y encola una tarea por RUC.
+    """
+    logger.info("Planificando backfill SIRE %s", backfill_id)
+
+    session = next(get_session_sync())
+
+    try:
+        backfill = session.get(SireBackfill, backfill_id)
+        if not backfill:
+            logger.error("Backfill %s no encontrado", backfill_id)
+            return {"status": "error", "message": "Backfill no encontrado"}
+
+        plan = planificar_backfill(session, backfill)
+
+        for ruc, operacion_ids in plan.items():
+            task_backfill_ruc_sire.delay(
+                backfill_id=backfill_id,
+                ruc=ruc,
+                operacion_ids=operacion_ids,
+                webhook_url=backfill.webhook_url or "",
+            )
+
+        return {
+            "status": "planificado",
+            "rucs": len(plan),
+            "operaciones": backfill.total_operaciones,
+            "omitidas": backfill.omitidas,
+        }
+
+    except Exception as e:
+        logger.exception("Error planificando backfill %s", backfill_id)
+        session.rollback()
+        session.execute(
+            update(SireBackfill)
+            .where(SireBackfill.id == backfill_id)
+            .values(estado=EstadoOperacion.ERROR, log=str(e))
+        )
+        session.commit()
+        return {"status": "error", "message": str(e)}
+
+    finally:
+        session.close()
+
+
+# ============================================================================
+# TAREA 2: EJECUTAR BACKFILL DE UN RUC
+# ============================================================================
+
+@celery_app.task(
+    bind=True,
+    max_retries=0,
+    acks_late=True,
+    task_track_started=True,
+)
+def task_backfill_ruc_sire(
+    self,
+    backfill_id: int,
+    ruc: int,
+    operacion_ids: list,
+    webhook_url: str = "",
+    diferimientos: int = 0,
+) -> dict:
+    """
+    Procesa todas las operaciones de un RUC dentro de un backfill
+    con un único cliente SIRE.
+
+    Ocupa un cupo del semáforo del RUC solo durante la fase de solicitud de
+    tickets; el polling posterior no lo retiene.
+    """
+    # ---- Semáforo por RUC: el lease cubre toda la fase de solicitudes ----
+    limiter = RucConcurrencyLimiter()
+    lease = limiter.acquire(
+        ruc,
+        ttl=settings.SIRE_SEMAFORO_TTL
+        + int(len(operacion_ids) * (settings.SIRE_BACKFILL_PAUSA_SOLICITUDES + 5)),
+    )
+    if lease is None:
+        return _diferir_tarea(
+            self,
+            ruc,
+            dict(
+                backfill_id=backfill_id,
+                ruc=ruc,
+                operacion_ids=operacion_ids,
+                webhook_url=webhook_url,
+            ),
+            diferimientos,
+        )
+
+    logger.info(
+        "Backfill %s: procesando %d operaciones para RUC %s",
+        backfill_id, len(operacion_ids), ruc,
+    )
+
+    session = next(get_session_sync())
+
+    try:
+        cred = _obtener_credenciales(session, ruc)
+        if not cred:
+            error_msg = (
+                f"No se encontraron credenciales SIRE completas para RUC {ruc}."
+            )
+            for operacion_id in operacion_ids:
+                _actualizar_estado(
+                    operacion_id, session, EstadoOperacion.ERROR, error_msg
+                )
+            return {"status": "error", "message": error_msg}
+
+        operaciones = (
+            session.query(SireOperacion)
+            .filter(
+                SireOperacion.id.in_(operacion_ids),
+                SireOperacion.estado.in_(ESTADOS_EN_CURSO),
+            )
+            .order_by(SireOperacion.periodo, SireOperacion.tipo_operacion)
+            .all()
+        )
+        # Solo datos planos: los objetos ORM se expiran en cada commit.
+        # Las operaciones que ya tienen ticket (tarea reanudada) no se
+        # vuelven a solicitar.
+        pendientes = [
+            {
+                "id": op.id,
+                "periodo": op.periodo,
+                "tipo": op.tipo_operacion,
+                "ticket": op.ticket,
+            }
+            for op in operaciones
+        ]
+
+        return asyncio.run(
+            _ejecutar_backfill_ruc(
+                ruc=str(ruc),
+                cred=cred,
+                operaciones=pendientes,
+                session=session,
+                storage=S3StorageManager(),
+                webhook_url=webhook_url,
+                liberar_cupo=lambda: limiter.release(ruc, lease),
+            )
+        )
+
+    except SunatCircuitOpenError as e:
+        # Las operaciones sin ticket quedan en PAUSED; las que ya tienen
+        # ticket siguen en PROCESSING y se retoman al reprogramar la tarea.
+        session.rollback()
+        pausadas = session.execute(
+            update(SireOperacion)
+            .where(
+                SireOperacion.id.in_(operacion_ids),
+                SireOperacion.estado == EstadoOperacion.PENDING,
+            )
+            .values(estado=EstadoOperacion.PAUSED)
+            .returning(SireOperacion.id)
+        ).scalars().all()
+        registrar_eventos(
+            session, pausadas, EstadoOperacion.PAUSED,
+            f"SUNAT no disponible (circuito '{e.familia}' abierto).",
+        )
+        session.commit()
+        publicar_cambio_estado(pausadas, EstadoOperacion.PAUSED.value)
+        return _pausar_por_circuito(
+            self,
+            e,
+            None,
+            session,
+            dict(
+                backfill_id=backfill_id,
+                ruc=ruc,
+                operacion_ids=operacion_ids,
+                webhook_url=webhook_url,
+            ),
+        )
+
+    except Exception as e:
+        logger.exception("Error en backfill %s para RUC %s", backfill_id, ruc)
+        session.rollback()
+        fallidas = session.execute(
+            update(SireOperacion)
+            .where(
+                SireOperacion.id.in_(operacion_ids),
+                SireOperacion.estado.in_(ESTADOS_EN_CURSO),
+            )
+            .values(estado=EstadoOperacion.ERROR)
+            .returning(SireOperacion.id)
+        ).scalars().all()
+        registrar_eventos(session, fallidas, EstadoOperacion.ERROR, str(e))
+        session.commit()
+        publicar_cambio_estado(fallidas, EstadoOperacion.ERROR.value)
+        return {"status": "error", "message": str(e)}
+
+    finally:
+        limiter.release(ruc, lease)
+        session.close()
+
+
+async def _ejecutar_backfill_ruc(
+    ruc: str,
+    cred: dict,
+    operaciones: list,
+    session,
+    storage: S3StorageManager,
+    webhook_url: str,
+    liberar_cupo=None,
+) -> dict:
+    """
+    Solicita los tickets de un RUC en serie y luego hace polling en bloque
+    hasta que todos terminen o se agote el tiempo.
+
+    liberar_cupo se invoca al terminar las solicitudes, para que otras
+    tareas del mismo RUC puedan avanzar mientras este backfill espera.
+    """
+    resumen = {"success": 0, "empty": 0, "error": 0}
+
+    async with SireClient(
+        ruc=ruc,
+        client_id=cred["client_id"],
+        client_secret=cred["client_secret"],
+        user_sol=cred["user_sol"],
+        clave_sol=cred["clave_sol"],
+    ) as client:
+
+        # ---- Solicitar tickets (serializado por RUC) ----
+        en_curso = {op["ticket"]: op for op in operaciones if op["ticket"]}
+        por_solicitar = [op for op in operaciones if not op["ticket"]]
+
+        for indice, op in enumerate(por_solicitar):
+            if indice:
+                await asyncio.sleep(settings.SIRE_BACKFILL_PAUSA_SOLICITUDES)
+            client.reiniciar_presupuesto_reintentos()
+            try:
+                ticket = await client.solicitar_descarga_propuesta(
+                    op["periodo"], op["tipo"]
+                )
+            except SunatCircuitOpenError:
+                raise
+            except Exception as e:
+                logger.error(
+                    "RUC %s, periodo %s, tipo %s: error solicitando ticket: %s",
+                    ruc, op["periodo"], op["tipo"], e,
+                )
+                _actualizar_estado(op["id"], session, EstadoOperacion.ERROR, str(e))
+                resumen["error"] += 1
+                continue
+
+            _actualizar_estado(
+                op["id"],
+                session,
+                EstadoOperacion.PROCESSING,
+                log=f"Ticket generado: {ticket}",
+                ticket=ticket,
+            )
+            op["solicitado_en"] = time.monotonic()
+            en_curso[str(ticket)] = op
+
+        if liberar_cupo:
+            liberar_cupo()
+
+        if not en_curso:
+            return {"status": "completed", "ruc": ruc, **resumen}
+
+        # ---- Polling en bloque sobre el rango ----
+        periodos = [op["periodo"] for op in en_curso.values()]
+        per_ini, per_fin = min(periodos), max(periodos)
+        # El tiempo máximo crece con la cantidad de tickets del RUC
+        inicio_polling = time.monotonic()
+        limite = inicio_polling + MAX_WAIT_SECONDS + POLL_INTERVAL * len(en_curso)
+        rondas = 0
+
+        while en_curso and time.monotonic() < limite:
+            await asyncio.sleep(POLL_INTERVAL)
+            rondas += 1
+
+            with span("sire.poll_rango", {
+                "sire.ruc": ruc,
+                "sire.per_ini": per_ini,
+                "sire.per_fin": per_fin,
+                "sire.ronda": rondas,
+                "sire.tickets_en_curso": len(en_curso),
+            }):
+                estados = await client.consultar_estados_tickets(
+                    per_ini, per_fin, tickets=set(en_curso)
+                )
+            logger.info(
+                "Backfill RUC %s: %d/%d tickets con estado final",
+                ruc,
+                sum(
+                    1 for t in en_curso
+                    if t in estados and estados[t].status != EstadoTicket.PROCESANDO
+                ),
+                len(en_curso),
+            )
+
+            for ticket, estado in estados.items():
+                if estado.status == EstadoTicket.PROCESANDO or ticket not in en_curso:
+                    continue
+
+                op = en_curso.pop(ticket)
+                SIRE_POLLS_POR_TICKET.observe(rondas)
+                SIRE_TIEMPO_HASTA_LISTO.labels(resultado=estado.status).observe(
+                    time.monotonic() - op.get("solicitado_en", inicio_polling)
+                )
+                client.reiniciar_presupuesto_reintentos()
+                try:
+                    if estado.status == EstadoTicket.ERROR:
+                        raise Exception(
+                            f"SUNAT reportó error en ticket {ticket}: {estado.mensaje}"
+                        )
+                    result = await _procesar_ticket_finalizado(
+                        client=client,
+                        estado_ticket=estado,
+                        ruc=ruc,
+                        periodo=op["periodo"],
+                        tipo=op["tipo"],
+                        operacion_id=op["id"],
+                        session=session,
+                        storage=storage,
+                        webhook_url=webhook_url,
+                    )
+                    resumen[result["status"]] += 1
+                except SunatCircuitOpenError:
+                    raise
+                except Exception as e:
+                    logger.error("Backfill RUC %s, ticket %s: %s", ruc, ticket, e)
+                    _actualizar_estado(op["id"], session, EstadoOperacion.ERROR, str(e))
+                    resumen["error"] += 1
+
+        # ---- Tickets que no terminaron a tiempo ----
+        for ticket, op in en_curso.items():
+            _actualizar_estado(
+                op["id"],
+                session,
+                EstadoOperacion.ERROR,
+                f"Ticket {ticket} no se completó dentro del tiempo máximo del backfill.",
+            )
+            resumen["error"] += 1
+
+    return {"status": "completed", "ruc": ruc, **resumen}
+
+
+def consulta_conteo_por_estado(backfill_id: int):
+    """SELECT estado, count(*) de las operaciones de un backfill."""
+    return (
+        select(SireOperacion.estado, func.count(SireOperacion.id))
+        .where(SireOperacion.backfill_id == backfill_id)
+        .group_by(SireOperacion.estado)
+    )
+
+
+def obtener_progreso_backfill(session, backfill: SireBackfill) -> dict:
+    """Resume el avance de un backfill agrupando sus operaciones por estado."""
+    filas = session.execute(consulta_conteo_por_estado(backfill.id)).all()
+    return resumir_progreso_backfill(backfill, filas)
+
+
+def resumir_progreso_backfill(backfill: SireBackfill, filas) -> dict:
+    """
+    Arma el avance de un backfill a partir del conteo por estado.
+    Separado de la consulta para usarlo tanto con sesiones sync como async.
+    """
+    por_estado = {
+        (estado.value if isinstance(estado, EstadoOperacion) else str(estado)): total
+        for estado, total in filas
+    }
+    total = backfill.total_operaciones or 0
+    pendientes = sum(por_estado.get(e.value, 0) for e in ESTADOS_EN_CURSO)
+    finalizadas = total - pendientes if total else 0
+
+    estado = EstadoOperacion(backfill.estado)
+    if estado == EstadoOperacion.PROCESSING and not pendientes:
+        estado = EstadoOperacion.COMPLETED
+
+    return {
+        "backfill_id": str(backfill.id),
+        "estado": estado.value,
+        "total_operaciones": total,
+        "omitidas": backfill.omitidas or 0,
+        "finalizadas": finalizadas,
+        "pendientes": pendientes,
+        "porcentaje": round(100.0 * finalizadas / total, 1) if total else 100.0,
+        "por_estado": por_estado,
+        "log": backfill.log,
+    }
@@ -0,0 +1,174 @@
+"""
+Planificación SIRE sin Celery ni base de datos.
+
+Funciones puras que usan el backfill (workers/sire_backfill.py) y el plan
+mensual (workers/sire_plan_mensual.py): expansión de períodos,
+clasificación de (RUC, período, tipo) contra su última operación,
+prioridad, ritmo de encolado y proyección de llamadas a SUNAT.
+"""
+
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from core.config import settings
+from models.operaciones import ESTADOS_DESCARGADOS, EstadoOperacion
+
+TIPOS = ("ventas", "compras")
+
+FALTANTE = "faltante"
+FALLIDA = "fallida"
+DESACTUALIZADA = "desactualizada"
+# Orden de prioridad dentro del plan
+MOTIVOS = (FALTANTE, FALLIDA, DESACTUALIZADA)
+
+
+def expandir_periodos(periodo_inicio: str, periodo_fin: str) -> list:
+    """
+    Expande un rango AAAAMM..AAAAMM (inclusive) en la lista de períodos.
+
+    Ej: expandir_periodos("202311", "202402")
+        → ["202311", "202312", "202401", "202402"]
+    """
+    año, mes = int(periodo_inicio[:4]), int(periodo_inicio[4:6])
+    año_fin, mes_fin = int(periodo_fin[:4]), int(periodo_fin[4:6])
+
+    periodos = []
+    while (año, mes) <= (año_fin, mes_fin):
+        periodos.append(f"{año:04d}{mes:02d}")
+        mes += 1
+        if mes > 12:
+            año, mes = año + 1, 1
+    return periodos
+
+
+def periodos_del_plan(meses: int, hoy: Optional[datetime] = None) -> list:
+    """
+    Los `meses` últimos períodos cerrados, del más antiguo al más reciente.
+
+    Ej: periodos_del_plan(3, hoy=2025-10-09) → ["202507", "202508", "202509"]
+    """
+    hoy = hoy or datetime.now(timezone.utc)
+    año, mes = hoy.year, hoy.month - 1
+    if mes == 0:
+        año, mes = año - 1, 12
+    indice_inicio = año * 12 + (mes - 1) - (meses - 1)
+    inicio = f"{indice_inicio // 12:04d}{indice_inicio % 12 + 1:02d}"
+    return expandir_periodos(inicio, f"{año:04d}{mes:02d}")
+
+
+def fin_de_periodo(periodo: str) -> datetime:
+    """Instante en que cierra el período AAAAMM (inicio del mes siguiente, UTC)."""
+    año, mes = int(periodo[:4]), int(periodo[4:6])
+    if mes == 12:
+        año, mes = año + 1, 0
+    return datetime(año, mes + 1, 1, tzinfo=timezone.utc)
+
+
+def clasificar(
+    periodo: str,
+    estado: Optional[EstadoOperacion],
+    actualizada: Optional[datetime],
+    ahora: datetime,
+    dias_asentamiento: int,
+) -> Optional[str]:
+    """
+    Motivo por el que (RUC, período, tipo) entra al plan, o None si se omite.
+
+    Args:
+        estado: Estado de la última operación (None si nunca se solicitó).
+        actualizada: Último cambio de esa operación.
+    """
+    if estado is None:
+        return FALTANTE
+    if estado == EstadoOperacion.ERROR:
+        return FALLIDA
+    if estado in ESTADOS_DESCARGADOS and actualizada is not None:
+        asentado = fin_de_periodo(periodo) + timedelta(days=dias_asentamiento)
+        if actualizada < asentado <= ahora:
+            return DESACTUALIZADA
+    return None
+
+
+def priorizar(trabajos: dict) -> dict:
+    """
+    Ordena el trabajo de cada RUC y los RUC entre sí.
+
+    Dentro de un RUC: por motivo (MOTIVOS) y del período más reciente al
+    más antiguo. Entre RUC: por su trabajo más urgente y, a igualdad, los
+    que tienen más trabajo primero (su cola es la más larga).
+
+    Args:
+        trabajos: ruc → lista de {"periodo", "tipo", "motivo"}.
+    """
+    def clave(trabajo):
+        return (MOTIVOS.index(trabajo["motivo"]), -int(trabajo["periodo"]), trabajo["tipo"])
+
+    ordenados = {ruc: sorted(lista, key=clave) for ruc, lista in trabajos.items() if lista}
+    orden = sorted(
+        ordenados,
+        key=lambda ruc: (clave(ordenados[ruc][0])[:2], -len(ordenados[ruc]), ruc),
+    )
+    return {ruc: ordenados[ruc] for ruc in orden}
+
+
+def calcular_countdowns(plan: dict, solicitudes_por_minuto: float) -> dict:
+    """
+    Segundos de espera antes de encolar cada RUC para respetar el ritmo global.
+
+    Cada RUC solicita sus tickets en serie; el siguiente RUC sale cuando los
+    tickets acumulados hasta él caben en el ritmo configurado.
+    """
+    countdowns, acumuladas = {}, 0
+    for ruc, trabajos in plan.items():
+        countdowns[ruc] = math.floor(acumuladas * 60 / solicitudes_por_minuto)
+        acumuladas += len(trabajos)
+    return countdowns
+
+
+def proyectar(plan: dict, solicitudes_por_minuto: float) -> dict:
+    """
+    Llamadas a SUNAT y duración estimadas para ejecutar el plan.
+
+    Por RUC: un token, una solicitud y una descarga por reporte (cota
+    superior: los reportes sin datos no se descargan) y las consultas de
+    estado en bloque (ver _ejecutar_backfill_ruc) hasta que los tickets
+    estén listos, según SIRE_PLAN_ESPERA_TICKET.
+    """
+    por_motivo = {motivo: 0 for motivo in MOTIVOS}
+    for trabajos in plan.values():
+        for trabajo in trabajos:
+            por_motivo[trabajo["motivo"]] += 1
+
+    rondas_por_ruc = max(1, math.ceil(settings.SIRE_PLAN_ESPERA_TICKET / settings.SIRE_POLL_INTERVALO))
+    solicitudes = sum(por_motivo.values())
+    tokens = len(plan)
+    consultas = sum(
+        rondas_por_ruc * math.ceil(len(trabajos) / settings.SIRE_ESTADO_POR_PAGINA)
+        for trabajos in plan.values()
+    )
+
+    countdowns = calcular_countdowns(plan, solicitudes_por_minuto)
+    duracion = max(
+        (
+            countdowns[ruc]
+            + (len(trabajos) - 1) * settings.SIRE_BACKFILL_PAUSA_SOLICITUDES
+            + rondas_por_ruc * settings.SIRE_POLL_INTERVALO
+            for ruc, trabajos in plan.items()
+        ),
+        default=0,
+    )
+
+    return {
+        "rucs": len(plan),
+        "operaciones": solicitudes,
+        "por_motivo": por_motivo,
+        "llamadas_sunat": {
+            "token": tokens,
+            "solicitud": solicitudes,
+            "estado": consultas,
+            "descarga": solicitudes,
+            "total": tokens + 2 * solicitudes + consultas,
+        },
+        "duracion_estimada_segundos": int(duracion),
+    }
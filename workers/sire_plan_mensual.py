@@ -0,0 +1,270 @@
+"""
+Plan mensual de descargas SIRE: solo lo que falta, calculado de antemano.
+
+La corrida mensual (Config.SCHEDULE_CONFIG['sire_reports'] del paquete
+legacy, día 9 a las 9:00) pedía a SUNAT todos los reportes de todos los
+RUC. task_plan_mensual_sire cruza en cambio los RUC activos con
+credenciales SIRE contra el historial de driver.sire_operaciones (una
+consulta por cada lado, no una por RUC) y para cada (RUC, período, tipo)
+de los últimos SIRE_PLAN_MESES meses cerrados decide:
+
+- FALTANTE: nunca se solicitó.
+- FALLIDA: la última operación terminó en ERROR.
+- DESACTUALIZADA: se descargó antes de que el período se asentara
+  (menos de SIRE_PLAN_DIAS_ASENTAMIENTO días después del cierre de mes,
+  cuando aún pueden llegar comprobantes) y ese plazo ya pasó.
+- Se omite lo que está en curso (PENDING/PROCESSING/PAUSED) y lo ya
+  descargado con el período asentado.
+
+El plan se ejecuta con la maquinaria del backfill (workers/sire_backfill.py):
+se registra como un SireBackfill con solo las operaciones planificadas y
+se encola una task_backfill_ruc_sire por RUC, en orden de prioridad
+(primero el período más reciente faltante, luego fallidas, luego
+desactualizadas) y con un countdown por RUC para no superar
+SIRE_PLAN_SOLICITUDES_POR_MINUTO solicitudes de ticket a SUNAT.
+
+Con dry_run=True no se crea nada: la tarea devuelve la proyección de
+llamadas a SUNAT y la duración estimada de la corrida.
+
+La clasificación, la prioridad y la proyección son funciones puras de
+workers/sire_plan.py; aquí quedan las consultas y la tarea Celery.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import func, select, true
+
+from workers.celery_app import celery_app
+from workers.sire_backfill import task_backfill_ruc_sire
+from workers.sire_plan import (
+    MOTIVOS,
+    TIPOS,
+    calcular_countdowns,
+    clasificar,
+    periodos_del_plan,
+    priorizar,
+    proyectar,
+)
+from workers.sire_tasks import registrar_eventos
+from core.config import settings
+from core.database import get_session_sync
+from models.entities import EntityCredencial
+from models.otras_credenciales import OtraCredencial
+from models.operaciones import EstadoOperacion, SireBackfill, SireOperacion
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# PLANIFICACIÓN
+# ============================================================================
+
+def _rucs_con_credenciales(session) -> list:
+    """RUC activos con credenciales SIRE completas (API + usuario/clave SOL)."""
+    consulta = (
+        select(OtraCredencial.ruc)
+        .join(EntityCredencial, EntityCredencial.ruc == OtraCredencial.ruc)
+        .where(
+            OtraCredencial.tipo == "APISUNAT",
+            OtraCredencial.notas == "SIRE",
+            EntityCredencial.activo.is_(true()),
+            EntityCredencial.usuario_sol.isnot(None),
+            EntityCredencial.clave_sol.isnot(None),
+        )
+        .distinct()
+        .order_by(OtraCredencial.ruc)
+    )
+    return list(session.execute(consulta).scalars())
+
+
+def _ultimas_operaciones(session, periodos: list, tipos: tuple) -> dict:
+    """
+    Última operación de cada (ruc, período, tipo) en los períodos dados.
+
+    Una sola consulta con DISTINCT ON sobre el índice
+    (ruc, periodo, tipo_operacion, created_at).
+    """
+    consulta = (
+        select(
+            SireOperacion.ruc,
+            SireOperacion.periodo,
+            SireOperacion.tipo_operacion,
+            SireOperacion.estado,
+            func.coalesce(SireOperacion.updated_at, SireOperacion.created_at),
+        )
+        .where(
+            SireOperacion.periodo.in_(periodos),
+            SireOperacion.tipo_operacion.in_(tipos),
+        )
+        .distinct(SireOperacion.ruc, SireOperacion.periodo, SireOperacion.tipo_operacion)
+        .order_by(
+            SireOperacion.ruc,
+            SireOperacion.periodo,
+            SireOperacion.tipo_operacion,
+            SireOperacion.created_at.desc(),
+            SireOperacion.id.desc(),
+        )
+    )
+    return {
+        (ruc, periodo, tipo): (EstadoOperacion(estado), actualizada)
+        for ruc, periodo, tipo, estado, actualizada in session.execute(consulta)
+    }
+
+
+def planificar_mes(
+    session,
+    meses: Optional[int] = None,
+    tipos: tuple = TIPOS,
+    ahora: Optional[datetime] = None,
+) -> dict:
+    """
+    Calcula el trabajo mínimo de la corrida mensual.
+
+    Returns:
+        dict: {"periodos", "tipos", "omitidas", "plan"}; "plan" es
+        ruc → lista priorizada de {"periodo", "tipo", "motivo"}.
+    """
+    ahora = ahora or datetime.now(timezone.utc)
+    periodos = periodos_del_plan(meses or settings.SIRE_PLAN_MESES, ahora)
+    rucs = _rucs_con_credenciales(session)
+    historial = _ultimas_operaciones(session, periodos, tipos)
+
+    trabajos, omitidas = {}, 0
+    for ruc in rucs:
+        for periodo in periodos:
+            for tipo in tipos:
+                estado, actualizada = historial.get((ruc, periodo, tipo), (None, None))
+                motivo = clasificar(
+                    periodo, estado, actualizada, ahora, settings.SIRE_PLAN_DIAS_ASENTAMIENTO
+                )
+                if motivo is None:
+                    omitidas += 1
+                    continue
+                trabajos.setdefault(ruc, []).append(
+                    {"periodo": periodo, "tipo": tipo, "motivo": motivo}
+                )
+
+    return {
+        "periodos": periodos,
+        "tipos": list(tipos),
+        "omitidas": omitidas,
+        "plan": priorizar(trabajos),
+    }
+
+
+def registrar_plan(session, plan_mensual: dict) -> tuple:
+    """
+    Persiste el plan como un backfill con sus operaciones en PENDING.
+
+    Returns:
+        tuple: (backfill, ruc → lista de IDs de operación en orden de prioridad).
+    """
+    plan = plan_mensual["plan"]
+    periodos = plan_mensual["periodos"]
+    total = sum(len(trabajos) for trabajos in plan.values())
+
+    backfill = SireBackfill(
+        rucs=",".join(str(ruc) for ruc in plan),
+        periodo_inicio=periodos[0],
+        periodo_fin=periodos[-1],
+        tipos=",".join(plan_mensual["tipos"]),
+        webhook_url=settings.ORCHESTRATOR_WEBHOOK_URL or None,
+        forzar=False,
+        estado=EstadoOperacion.PROCESSING,
+        total_operaciones=total,
+        omitidas=plan_mensual["omitidas"],
+    )
+    session.add(backfill)
+    session.flush()
+
+    operaciones = {}
+    for ruc, trabajos in plan.items():
+        filas = [
+            SireOperacion(
+                ruc=ruc,
+                periodo=trabajo["periodo"],
+                tipo_operacion=trabajo["tipo"],
+                backfill_id=backfill.id,
+                estado=EstadoOperacion.PENDING,
+            )
+            for trabajo in trabajos
+        ]
+        session.add_all(filas)
+        session.flush()
+        operaciones[ruc] = [op.id for op in filas]
+        registrar_eventos(
+            session, operaciones[ruc], EstadoOperacion.PENDING,
+            f"Operación creada por el plan mensual (backfill {backfill.id}).",
+        )
+
+    por_motivo = {motivo: 0 for motivo in MOTIVOS}
+    for trabajos in plan.values():
+        for trabajo in trabajos:
+            por_motivo[trabajo["motivo"]] += 1
+    backfill.log = (
+        f"Plan mensual {periodos[0]}–{periodos[-1]}: {total} operaciones para "
+        f"{len(plan)} RUC(s) ({', '.join(f'{n} {m}s' for m, n in por_motivo.items())}); "
+        f"{plan_mensual['omitidas']} omitidas."
+    )
+    session.commit()
+
+    logger.info("Backfill %s: %s", backfill.id, backfill.log)
+    return backfill, operaciones
+
+
+# ============================================================================
+# TAREA: PLAN MENSUAL
+# ============================================================================
+
+@celery_app.task(
+    bind=True,
+    max_retries=0,
+    acks_late=True,
+    task_track_started=True,
+)
+def task_plan_mensual_sire(self, dry_run: bool = False, meses: Optional[int] = None) -> dict:
+    """
+    Planifica la corrida mensual SIRE y, salvo dry_run, la encola.
+
+    Devuelve siempre la proyección (RUC, operaciones por motivo, llamadas
+    a SUNAT y duración estimada).
+    """
+    session = next(get_session_sync())
+
+    try:
+        plan_mensual = planificar_mes(session, meses=meses)
+        ritmo = settings.SIRE_PLAN_SOLICITUDES_POR_MINUTO
+        resultado = {
+            "periodos": plan_mensual["periodos"],
+            "omitidas": plan_mensual["omitidas"],
+            **proyectar(plan_mensual["plan"], ritmo),
+        }
+
+        if dry_run or not plan_mensual["plan"]:
+            logger.info("Plan mensual SIRE (%s): %s", "dry-run" if dry_run else "sin trabajo", resultado)
+            return {"status": "dry_run" if dry_run else "sin_trabajo", **resultado}
+
+        backfill, operaciones = registrar_plan(session, plan_mensual)
+        countdowns = calcular_countdowns(plan_mensual["plan"], ritmo)
+        for ruc, operacion_ids in operaciones.items():
+            task_backfill_ruc_sire.apply_async(
+                kwargs=dict(
+                    backfill_id=backfill.id,
+                    ruc=ruc,
+                    operacion_ids=operacion_ids,
+                    webhook_url=backfill.webhook_url or "",
+                ),
+                countdown=countdowns[ruc],
+            )
+
+        return {"status": "planificado", "backfill_id": backfill.id, **resultado}
+
+    except Exception as e:
+        logger.exception("Error planificando la corrida mensual SIRE")
+        session.rollback()
+        return {"status": "error", "message": str(e)}
+
+    finally:
+        session.close()
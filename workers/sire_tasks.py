@@ -4,6 +4,7 @@ Tareas background de Celery para operaciones SIRE.
 Define dos tareas que se encadenan automáticamente:
 
 1. task_solicitar_descarga_sire (RÁPIDA, ~1-2s):
+   - Ocupa un cupo del semáforo por RUC (si no hay, se re-encola)
    - Obtiene credenciales
    - Solicita descarga a SUNAT → ticket
    - Actualiza BD: PROCESSING + ticket
@@ -20,28 +21,46 @@ rápidamente, dejando las consultas para después (priorización FIFO natural).
 """
 
 import asyncio
+import hashlib
 import logging
+import random
+import time
 from datetime import datetime, timezone
 from typing import Optional
 
 import httpx
-from sqlalchemy import update
+from opentelemetry.trace import SpanKind
+from sqlalchemy import insert, update
 
 from workers.celery_app import celery_app
+from api_clients.circuit_breaker import SunatCircuitOpenError
+from core.concurrency import RucConcurrencyLimiter, calcular_espera_diferimiento
+from core.config import settings
 from core.database import get_session_sync
+from core.eventos import publicar_cambio_estado
+from core.metrics import (
+    DB_ESCRITURA_LATENCIA,
+    SIRE_POLLS_POR_TICKET,
+    SIRE_TIEMPO_HASTA_LISTO,
+    WEBHOOK_LATENCIA,
+    medir,
+)
+from core.propuestas_cache import get_propuestas_cache
 from core.storage import S3StorageManager
+from core.tracing import inyectar_contexto, span
 from models.entities import EntityCredencial
 from models.otras_credenciales import OtraCredencial
-from models.operaciones import SireOperacion, EstadoOperacion
+from models.operaciones import SireOperacion, SireOperacionEvento, EstadoOperacion
 from api_clients.sire.client import SireClient
+from api_clients.sire.schemas import EstadoTicket
 
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
 # Constantes de polling
 # ---------------------------------------------------------------------------
-POLL_INTERVAL = 30           # segundos entre cada consulta de estado
-MAX_WAIT_SECONDS = 600       # 10 minutos máximo de espera
+POLL_INTERVAL = settings.SIRE_POLL_INTERVALO        # segundos entre cada consulta de estado
+MAX_WAIT_SECONDS = settings.SIRE_POLL_ESPERA_MAX    # 10 minutos máximo de espera
 MAX_POLL_ATTEMPTS = MAX_WAIT_SECONDS // POLL_INTERVAL  # ~20 intentos
 
 
@@ -62,15 +81,19 @@ def task_solicitar_descarga_sire(
     tipo: str,
     webhook_url: str = "",
     operacion_id: Optional[int] = None,
+    diferimientos: int = 0,
 ) -> dict:
     """
     Tarea RÁPIDA que solo solicita la descarga a SUNAT.
 
     Flujo:
-    1. Obtiene credenciales SIRE del RUC.
-    2. Solicita descarga a SUNAT → ticket.
-    3. Actualiza BD a PROCESSING con el ticket.
-    4. Encola la tarea de consulta+descarga para este ticket.
+    0. Si la propuesta está en la caché local y fresca, se publica sin
+       tocar SUNAT (ver core/propuestas_cache.py).
+    1. Ocupa un cupo del semáforo del RUC; si no hay, se difiere.
+    2. Obtiene credenciales SIRE del RUC.
+    3. Solicita descarga a SUNAT → ticket.
+    4. Actualiza BD a PROCESSING con el ticket.
+    5. Encola la tarea de consulta+descarga para este ticket.
 
     Al ser rápida, los workers pueden procesar muchas solicitudes
     en poco tiempo, dejando las consultas para después.
@@ -80,6 +103,28 @@ def task_solicitar_descarga_sire(
         ruc, periodo, tipo,
     )
 
+    # ---- Caché local: dentro de la ventana de frescura no se vuelve a SUNAT ----
+    resultado_cache = _servir_desde_cache(ruc, periodo, tipo, operacion_id, webhook_url)
+    if resultado_cache is not None:
+        return resultado_cache
+
+    # ---- Semáforo por RUC: sin cupo → re-encolar, no bloquear el worker ----
+    limiter = RucConcurrencyLimiter()
+    lease = limiter.acquire(ruc)
+    if lease is None:
+        return _diferir_tarea(
+            self,
+            ruc,
+            dict(
+                ruc=ruc,
+                periodo=periodo,
+                tipo=tipo,
+                webhook_url=webhook_url,
+                operacion_id=operacion_id,
+            ),
+            diferimientos,
+        )
+
     session = next(get_session_sync())
 
     try:
@@ -139,12 +184,28 @@ def task_solicitar_descarga_sire(
 
         return {"status": "solicitado", "ticket": ticket}
 
+    except SunatCircuitOpenError as e:
+        return _pausar_por_circuito(
+            self,
+            e,
+            operacion_id,
+            session,
+            dict(
+                ruc=ruc,
+                periodo=periodo,
+                tipo=tipo,
+                webhook_url=webhook_url,
+                operacion_id=operacion_id,
+            ),
+        )
+
     except Exception as e:
         logger.exception("Error solicitando descarga SIRE para RUC %s", ruc)
         _actualizar_estado(operacion_id, session, EstadoOperacion.ERROR, str(e))
         return {"status": "error", "message": str(e)}
 
     finally:
+        limiter.release(ruc, lease)
         session.close()
 
 
@@ -236,6 +297,26 @@ def task_consultar_descarga_sire(
         )
         return result
 
+    except SunatCircuitOpenError as e:
+        return _pausar_por_circuito(
+            self,
+            e,
+            operacion_id,
+            session,
+            dict(
+                ruc=ruc,
+                periodo=periodo,
+                tipo=tipo,
+                ticket=ticket,
+                webhook_url=webhook_url,
+                operacion_id=operacion_id,
+                client_id=client_id,
+                client_secret=client_secret,
+                user_sol=user_sol,
+                clave_sol=clave_sol,
+            ),
+        )
+
     except TimeoutError as e:
         logger.error("Timeout en descarga SIRE: %s", e)
         _actualizar_estado(operacion_id, session, EstadoOperacion.ERROR, str(e))
@@ -278,116 +359,274 @@ async def _ejecutar_consulta_descarga(
         # ---- Polling de estado ----
         estado_ticket = await _polling_estado_ticket(client, ticket, periodo)
 
-        if estado_ticket.status == "SIN_DATOS":
-            _actualizar_estado(
-                operacion_id,
-                session,
-                EstadoOperacion.EMPTY,
-                log="Reporte generado correctamente pero sin datos.",
-            )
-            _enviar_webhook(
-                webhook_url,
-                ruc=ruc,
-                periodo=periodo,
-                tipo=tipo,
-                estado="EMPTY",
-                s3_url=None,
-            )
-            return {"status": "empty", "ticket": ticket}
-
-        if estado_ticket.status != "LISTO":
-            error_msg = (
-                f"Ticket {ticket} finalizó con estado inesperado: "
-                f"{estado_ticket.status} - {estado_ticket.mensaje}"
-            )
-            raise Exception(error_msg)
+        return await _procesar_ticket_finalizado(
+            client=client,
+            estado_ticket=estado_ticket,
+            ruc=ruc,
+            periodo=periodo,
+            tipo=tipo,
+            operacion_id=operacion_id,
+            session=session,
+            storage=storage,
+            webhook_url=webhook_url,
+        )
 
-        # ---- Descargar archivo ----
-        download = await client.descargar_archivo(estado_ticket.parametros_descarga)
 
-        if download.es_vacio:
-            _actualizar_estado(
-                operacion_id,
-                session,
-                EstadoOperacion.EMPTY,
-                log="Archivo descargado vacío (sin registros).",
-            )
-            _enviar_webhook(
-                webhook_url,
-                ruc=ruc,
-                periodo=periodo,
-                tipo=tipo,
-                estado="EMPTY",
-                s3_url=None,
-            )
-            return {"status": "empty", "ticket": ticket}
+async def _procesar_ticket_finalizado(
+    client: SireClient,
+    estado_ticket,
+    ruc: str,
+    periodo: str,
+    tipo: str,
+    operacion_id: Optional[int],
+    session,
+    storage: S3StorageManager,
+    webhook_url: str,
+) -> dict:
+    """
+    Descarga, sube a S3 y notifica un ticket que SUNAT ya terminó de procesar.
 
-        # ---- Subir a S3 ----
-        nom_archivo = download.nom_archivo or f"{periodo}_{tipo}_{ticket}.zip"
-        s3_key = f"unparsed/{nom_archivo}"
-        s3_url = storage.upload_file_bytes(download.contenido, s3_key)
+    Compartido por el flujo individual y por el backfill. Si el ZIP
+    descargado tiene el mismo digest que la última descarga exitosa del
+    mismo RUC/período/tipo, se reutiliza la URL de S3 sin volver a subirlo.
+    """
+    ticket = estado_ticket.ticket
 
-        logger.info(
-            "Archivo subido a S3: %s (tamaño: %d bytes, nombre: %s)",
-            s3_url,
-            len(download.contenido),
-            nom_archivo,
-        )
+    if estado_ticket.status == EstadoTicket.SIN_DATOS:
         _actualizar_estado(
             operacion_id,
             session,
-            EstadoOperacion.S3_UPLOADED,
-            log=f"Subido a S3: {s3_url} (archivo: {nom_archivo})",
-            s3_url=s3_url,
+            EstadoOperacion.EMPTY,
+            log="Reporte generado correctamente pero sin datos.",
         )
-
-        # ---- Enviar webhook ----
         _enviar_webhook(
             webhook_url,
             ruc=ruc,
             periodo=periodo,
             tipo=tipo,
-            estado="COMPLETED",
-            s3_url=s3_url,
+            estado="EMPTY",
+            s3_url=None,
+        )
+        return {"status": "empty", "ticket": ticket}
+
+    if estado_ticket.status != EstadoTicket.LISTO:
+        error_msg = (
+            f"Ticket {ticket} finalizó con estado inesperado: "
+            f"{estado_ticket.status} - {estado_ticket.mensaje}"
         )
+        raise Exception(error_msg)
 
+    # ---- Descargar archivo ----
+    download = await client.descargar_archivo(estado_ticket.parametros_descarga)
+
+    if download.es_vacio:
         _actualizar_estado(
             operacion_id,
             session,
-            EstadoOperacion.WEBHOOK_SENT,
-            log="Webhook enviado correctamente al orquestador.",
+            EstadoOperacion.EMPTY,
+            log="Archivo descargado vacío (sin registros).",
+        )
+        _enviar_webhook(
+            webhook_url,
+            ruc=ruc,
+            periodo=periodo,
+            tipo=tipo,
+            estado="EMPTY",
+            s3_url=None,
+        )
+        return {"status": "empty", "ticket": ticket}
+
+    # ---- Subir a S3 (salvo que el contenido no haya cambiado) ----
+    nom_archivo = download.nom_archivo or f"{periodo}_{tipo}_{ticket}.zip"
+    digest = hashlib.sha256(download.contenido).hexdigest()
+    previo = _obtener_descarga_previa(session, int(ruc), periodo, tipo, operacion_id)
+
+    if previo and previo.digest == digest and previo.s3_url:
+        s3_url = previo.s3_url
+        logger.info(
+            "Contenido sin cambios respecto a la operación %s (digest %s). "
+            "Se reutiliza %s",
+            previo.id, digest[:12], s3_url,
+        )
+        log_subida = f"Sin cambios, se reutiliza {s3_url} (archivo: {nom_archivo})"
+    else:
+        s3_key = f"unparsed/{nom_archivo}"
+        s3_url = storage.upload_file_bytes(download.contenido, s3_key)
+        logger.info(
+            "Archivo subido a S3: %s (tamaño: %d bytes, nombre: %s)",
+            s3_url,
+            len(download.contenido),
+            nom_archivo,
         )
+        log_subida = f"Subido a S3: {s3_url} (archivo: {nom_archivo})"
 
-        return {
-            "status": "success",
-            "ticket": ticket,
-            "s3_url": s3_url,
-            "nom_archivo": nom_archivo,
-        }
+    _guardar_en_cache(ruc, periodo, tipo, nom_archivo, download.contenido, digest, s3_url)
+
+    return _registrar_y_notificar(
+        ruc=ruc,
+        periodo=periodo,
+        tipo=tipo,
+        ticket=ticket,
+        nom_archivo=nom_archivo,
+        s3_url=s3_url,
+        digest=digest,
+        log_subida=log_subida,
+        operacion_id=operacion_id,
+        session=session,
+        webhook_url=webhook_url,
+    )
+
+
+def _registrar_y_notificar(
+    ruc: str,
+    periodo: str,
+    tipo: str,
+    ticket: Optional[str],
+    nom_archivo: str,
+    s3_url: str,
+    digest: str,
+    log_subida: str,
+    operacion_id: Optional[int],
+    session,
+    webhook_url: str,
+) -> dict:
+    """Marca S3_UPLOADED, envía el webhook y marca WEBHOOK_SENT."""
+    _actualizar_estado(
+        operacion_id,
+        session,
+        EstadoOperacion.S3_UPLOADED,
+        log=log_subida,
+        s3_url=s3_url,
+        digest=digest,
+    )
+
+    # ---- Enviar webhook ----
+    _enviar_webhook(
+        webhook_url,
+        ruc=ruc,
+        periodo=periodo,
+        tipo=tipo,
+        estado="COMPLETED",
+        s3_url=s3_url,
+    )
+
+    _actualizar_estado(
+        operacion_id,
+        session,
+        EstadoOperacion.WEBHOOK_SENT,
+        log="Webhook enviado correctamente al orquestador.",
+    )
+
+    return {
+        "status": "success",
+        "ticket": ticket,
+        "s3_url": s3_url,
+        "nom_archivo": nom_archivo,
+    }
+
+
+def _guardar_en_cache(ruc, periodo, tipo, nom_archivo, contenido, digest, s3_url):
+    """Guarda la propuesta en la caché local; un fallo de disco no afecta la tarea."""
+    try:
+        get_propuestas_cache().guardar(
+            str(ruc), periodo, tipo, nom_archivo,
+            contenido=contenido, digest=digest, s3_url=s3_url,
+        )
+    except OSError as e:
+        logger.warning("No se pudo guardar la propuesta en la caché local: %s", e)
+
+
+def _servir_desde_cache(
+    ruc: int,
+    periodo: str,
+    tipo: str,
+    operacion_id: Optional[int],
+    webhook_url: str,
+) -> Optional[dict]:
+    """
+    Publica la propuesta desde la caché local si está fresca.
+
+    Si solo está en disco (la descargó el paquete legacy en este host) se
+    sube a S3; si ya tiene URL de S3 se reutiliza. Retorna None si no hay
+    entrada o si servirla falla (se sigue con el flujo normal contra SUNAT).
+    """
+    en_cache = get_propuestas_cache().obtener(str(ruc), periodo, tipo)
+    if en_cache is None:
+        return None
+
+    session = next(get_session_sync())
+    try:
+        s3_url = en_cache.s3_url
+        if s3_url is None:
+            s3_url = S3StorageManager().upload_file_bytes(
+                en_cache.leer(), f"unparsed/{en_cache.nom_archivo}"
+            )
+            get_propuestas_cache().registrar_s3(
+                en_cache.ruc, periodo, tipo, en_cache.digest, s3_url
+            )
+        nivel = "disco" if en_cache.ruta else "S3"
+        logger.info(
+            "Propuesta RUC=%s periodo=%s tipo=%s servida desde la caché (%s): %s",
+            ruc, periodo, tipo, nivel, s3_url,
+        )
+        return _registrar_y_notificar(
+            ruc=str(ruc),
+            periodo=periodo,
+            tipo=tipo,
+            ticket=None,
+            nom_archivo=en_cache.nom_archivo,
+            s3_url=s3_url,
+            digest=en_cache.digest,
+            log_subida=f"Servido desde la caché local ({nivel}): {s3_url} (archivo: {en_cache.nom_archivo})",
+            operacion_id=operacion_id,
+            session=session,
+            webhook_url=webhook_url,
+        )
+    except Exception:
+        logger.exception("No se pudo servir la propuesta desde la caché; se consulta a SUNAT")
+        return None
+    finally:
+        session.close()
 
 
 async def _polling_estado_ticket(
     client: SireClient, ticket: str, periodo: str
 ):
     """Realiza polling al estado del ticket cada POLL_INTERVAL segundos."""
+    inicio = time.monotonic()
     for intento in range(1, MAX_POLL_ATTEMPTS + 1):
         await asyncio.sleep(POLL_INTERVAL)
 
-        estado = await client.consultar_estado_ticket(ticket, periodo)
+        with span(
+            "sire.poll",
+            {"sire.ticket": ticket, "sire.periodo": periodo, "sire.intento": intento},
+        ) as s:
+            estado = await client.consultar_estado_ticket(ticket, periodo)
+            s.set_attribute("sire.status", estado.status.value)
         logger.info(
             "Polling ticket %s: intento %d/%d, status=%s (cod=%s)",
             ticket, intento, MAX_POLL_ATTEMPTS,
             estado.status, estado.cod_estado,
         )
 
-        if estado.status in ("LISTO", "SIN_DATOS"):
+        if estado.status != EstadoTicket.PROCESANDO:
+            SIRE_POLLS_POR_TICKET.observe(intento)
+            SIRE_TIEMPO_HASTA_LISTO.labels(resultado=estado.status).observe(
+                time.monotonic() - inicio
+            )
+
+        if estado.status in (EstadoTicket.LISTO, EstadoTicket.SIN_DATOS):
             return estado
 
-        if estado.status == "ERROR":
+        if estado.status == EstadoTicket.ERROR:
             raise Exception(
                 f"SUNAT reportó error en ticket {ticket}: {estado.mensaje}"
             )
 
+    SIRE_POLLS_POR_TICKET.observe(MAX_POLL_ATTEMPTS)
+    SIRE_TIEMPO_HASTA_LISTO.labels(resultado="TIMEOUT").observe(
+        time.monotonic() - inicio
+    )
     raise TimeoutError(
         f"Ticket {ticket} no se completó en {MAX_WAIT_SECONDS}s "
         f"({MAX_POLL_ATTEMPTS} intentos)"
@@ -436,6 +675,78 @@ def _obtener_credenciales(session, ruc: int) -> Optional[dict]:
     }
 
 
+def _diferir_tarea(task, ruc, kwargs: dict, diferimientos: int) -> dict:
+    """
+    Re-encola una tarea que no obtuvo cupo en el semáforo de su RUC.
+
+    El worker queda libre de inmediato; la tarea vuelve a la cola con un
+    countdown creciente (con jitter) según cuántas veces ya fue diferida.
+    """
+    espera = calcular_espera_diferimiento(diferimientos)
+    logger.info(
+        "RUC %s sin cupo de concurrencia. %s diferida %ds (diferimiento #%d)",
+        ruc, task.name, espera, diferimientos + 1,
+    )
+    task.apply_async(
+        kwargs={**kwargs, "diferimientos": diferimientos + 1},
+        countdown=espera,
+    )
+    return {"status": "diferido", "countdown": espera}
+
+
+def _pausar_por_circuito(
+    task,
+    error: SunatCircuitOpenError,
+    operacion_id: Optional[int],
+    session,
+    kwargs: dict,
+) -> dict:
+    """
+    Estaciona una operación mientras el circuito de SUNAT está abierto.
+
+    La operación queda en PAUSED (no ERROR) y la tarea se re-encola para
+    cuando termine el enfriamiento, con jitter para no despertar a toda la
+    flota a la vez.
+    """
+    espera = error.retry_after + int(random.uniform(0, max(1, error.retry_after) / 2))
+    logger.warning(
+        "%s estacionada %ds: circuito SUNAT '%s' abierto",
+        task.name, espera, error.familia,
+    )
+    session.rollback()
+    _actualizar_estado(
+        operacion_id,
+        session,
+        EstadoOperacion.PAUSED,
+        log=f"SUNAT no disponible (circuito '{error.familia}' abierto). "
+            f"Reintento programado en {espera}s.",
+    )
+    task.apply_async(kwargs=kwargs, countdown=espera)
+    return {"status": "pausado", "countdown": espera}
+
+
+def _obtener_descarga_previa(
+    session,
+    ruc: int,
+    periodo: str,
+    tipo: str,
+    excluir_id: Optional[int] = None,
+) -> Optional[SireOperacion]:
+    """
+    Retorna la última operación con archivo subido para RUC/período/tipo.
+    Se usa para detectar descargas cuyo contenido no cambió (mismo digest).
+    """
+    query = session.query(SireOperacion).filter(
+        SireOperacion.ruc == ruc,
+        SireOperacion.periodo == periodo,
+        SireOperacion.tipo_operacion == tipo,
+        SireOperacion.digest.isnot(None),
+    )
+    if excluir_id:
+        query = query.filter(SireOperacion.id != excluir_id)
+    return query.order_by(SireOperacion.id.desc()).first()
+
+
 def _actualizar_estado(
     operacion_id: Optional[int],
     session,
@@ -443,26 +754,55 @@ def _actualizar_estado(
     log: Optional[str] = None,
     ticket: Optional[str] = None,
     s3_url: Optional[str] = None,
+    digest: Optional[str] = None,
 ):
-    """Actualiza el estado de una operación en la BD."""
+    """
+    Actualiza el estado de una operación en la BD, agrega el evento con el
+    mensaje (log) a su historial y publica el cambio (ver core/eventos.py)
+    para los clientes en long-poll/SSE.
+    """
     if not operacion_id:
         return
 
     updates = {"estado": estado}
-    if log is not None:
-        updates["log"] = log
     if ticket is not None:
         updates["ticket"] = ticket
     if s3_url is not None:
         updates["s3_url"] = s3_url
+    if digest is not None:
+        updates["digest"] = digest
 
     stmt = update(SireOperacion).where(SireOperacion.id == operacion_id).values(**updates)
-    session.execute(stmt)
-    session.commit()
+    with medir(DB_ESCRITURA_LATENCIA, operacion="actualizar_estado"):
+        session.execute(stmt)
+        registrar_eventos(session, [operacion_id], estado, log)
+        session.commit()
 
+    publicar_cambio_estado([operacion_id], estado.value, ticket=ticket, s3_url=s3_url)
     logger.info("Operación %s actualizada a %s", operacion_id, estado.value)
 
 
+def registrar_eventos(
+    session,
+    operacion_ids: list,
+    estado: EstadoOperacion,
+    mensaje: Optional[str] = None,
+):
+    """
+    Agrega un evento al historial de cada operación (sin commit).
+    driver.sire_operacion_eventos es append-only: nunca se actualiza.
+    """
+    if not operacion_ids:
+        return
+    session.execute(
+        insert(SireOperacionEvento),
+        [
+            {"operacion_id": operacion_id, "estado": estado, "mensaje": mensaje}
+            for operacion_id in operacion_ids
+        ],
+    )
+
+
 def _enviar_webhook(
     webhook_url: str,
     ruc: str,
@@ -485,12 +825,30 @@ def _enviar_webhook(
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
 
+    inicio = time.perf_counter()
+    resultado = "ok"
     try:
-        response = httpx.post(webhook_url, json=payload, timeout=30)
-        response.raise_for_status()
+        with span(
+            "webhook.send",
+            {"http.url": webhook_url, "sire.estado": estado},
+            kind=SpanKind.CLIENT,
+        ):
+            # El orquestador puede continuar la traza con traceparent
+            response = httpx.post(
+                webhook_url,
+                json=payload,
+                headers=inyectar_contexto({}),
+                timeout=30,
+            )
+            response.raise_for_status()
         logger.info(
             "Webhook enviado a %s: estado=%s, ruc=%s",
             webhook_url, estado, ruc,
         )
     except Exception as e:
-        logger.error("Error al enviar webhook a %s: %s", webhook_url, e)
\ No newline at end of file
+        resultado = "error"
+        logger.error("Error al enviar webhook a %s: %s", webhook_url, e)
+    finally:
+        WEBHOOK_LATENCIA.labels(resultado=resultado).observe(
+            time.perf_counter() - inicio
+        )
\ No newline at end of file